@@ -0,0 +1,98 @@
+"""Version embeddings by model and track per-tenant re-embedding migrations
+
+Revision ID: a6e1d8c3f5b9
+Revises: f2c7d4b9e6a3
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6e1d8c3f5b9'
+down_revision: Union[str, None] = 'f2c7d4b9e6a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every row names the model that produced it. Image descriptions and chat messages were
+    # embedded by the API's SentenceTransformer; unlabelled document chunks by nomic-embed-text
+    op.execute("""
+        UPDATE embeddings SET embedding_model = 'all-mpnet-base-v2'
+        WHERE embedding_model = 'default' OR (embedding_model IS NULL AND source_id IS NULL)
+    """)
+    op.execute("UPDATE embeddings SET embedding_model = 'nomic-embed-text' WHERE embedding_model IS NULL")
+    op.execute("UPDATE image_analyses SET embedding_model = 'all-mpnet-base-v2' WHERE embedding_model = 'default'")
+    op.alter_column('embeddings', 'embedding_model', existing_type=sa.String(length=100), nullable=False)
+
+    # A chunk position holds one row per model, so a new model's vectors sit alongside the old ones
+    op.drop_index('idx_embeddings_source_chunk_index', table_name='embeddings')
+    op.create_index(
+        'idx_embeddings_source_chunk_model',
+        'embeddings',
+        ['source_id', 'chunk_index', 'embedding_model'],
+        unique=True
+    )
+    op.create_index('idx_embeddings_org_model', 'embeddings', ['organization_id', 'embedding_model'], unique=False)
+
+    # The model a tenant's searches read; switched once its vectors in the new model are complete
+    op.add_column('organizations', sa.Column('embedding_model', sa.String(length=100), nullable=True))
+    op.execute("UPDATE organizations SET embedding_model = 'nomic-embed-text'")
+
+    op.create_table(
+        'embedding_migrations',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source_model', sa.String(length=100), nullable=False),
+        sa.Column('target_model', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='running', nullable=False),
+        sa.Column('total_chunks', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('embedded_chunks', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('started_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('completed_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'idx_embedding_migrations_org_running',
+        'embedding_migrations',
+        ['organization_id'],
+        unique=True,
+        postgresql_where=sa.text("status = 'running'")
+    )
+
+
+def downgrade() -> None:
+    # Chunk positions must be unique again: keep each tenant's active model, then any one row
+    op.execute("""
+        DELETE FROM embeddings e
+        USING organizations o
+        WHERE o.id = e.organization_id
+        AND e.embedding_model <> o.embedding_model
+        AND EXISTS (
+            SELECT 1 FROM embeddings d
+            WHERE d.source_id = e.source_id
+            AND d.chunk_index = e.chunk_index
+            AND d.embedding_model = o.embedding_model
+        )
+    """)
+    op.execute("""
+        DELETE FROM embeddings e
+        USING embeddings d
+        WHERE e.source_id = d.source_id
+        AND e.chunk_index = d.chunk_index
+        AND e.ctid < d.ctid
+    """)
+
+    op.drop_index('idx_embedding_migrations_org_running', table_name='embedding_migrations')
+    op.drop_table('embedding_migrations')
+    op.drop_column('organizations', 'embedding_model')
+    op.drop_index('idx_embeddings_org_model', table_name='embeddings')
+    op.drop_index('idx_embeddings_source_chunk_model', table_name='embeddings')
+    op.create_index('idx_embeddings_source_chunk_index', 'embeddings', ['source_id', 'chunk_index'], unique=True)
+    op.alter_column('embeddings', 'embedding_model', existing_type=sa.String(length=100), nullable=True)
@@ -0,0 +1,39 @@
+"""Add lease and heartbeat columns to file_processing_jobs
+
+Revision ID: b7d2e41c9a10
+Revises: 3422c731986c
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e41c9a10'
+down_revision: Union[str, None] = '3422c731986c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('file_processing_jobs', sa.Column('worker_id', sa.String(length=100), nullable=True))
+    op.add_column('file_processing_jobs', sa.Column('lease_expires_at', sa.TIMESTAMP(), nullable=True))
+    op.add_column('file_processing_jobs', sa.Column('heartbeat_at', sa.TIMESTAMP(), nullable=True))
+    # Claim query scans pending / lease-expired jobs in creation order
+    op.create_index(
+        'idx_file_processing_jobs_claimable',
+        'file_processing_jobs',
+        ['status', 'created_at'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_processing_jobs_claimable', table_name='file_processing_jobs')
+    op.drop_column('file_processing_jobs', 'heartbeat_at')
+    op.drop_column('file_processing_jobs', 'lease_expires_at')
+    op.drop_column('file_processing_jobs', 'worker_id')
@@ -0,0 +1,50 @@
+"""Scope the chunk store per organization and scraped page
+
+Revision ID: b9c4f7e2a8d6
+Revises: a6e1d8c3f5b9
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c4f7e2a8d6'
+down_revision: Union[str, None] = 'a6e1d8c3f5b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Global counts can't be attributed to tenants or pages, so they start over.
+    # One row per (tenant, block hash, page): a page counts once however often it is
+    # recrawled, and deleting the page (or its connector) releases its blocks.
+    op.drop_table('chunk_store')
+    op.create_table(
+        'chunk_store',
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('source_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('first_seen_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['source_id'], ['crawled_pages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('organization_id', 'content_hash', 'source_id')
+    )
+    op.create_index('idx_chunk_store_source_id', 'chunk_store', ['source_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_chunk_store_source_id', table_name='chunk_store')
+    op.drop_table('chunk_store')
+    op.create_table(
+        'chunk_store',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('source_count', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('first_seen_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_seen_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
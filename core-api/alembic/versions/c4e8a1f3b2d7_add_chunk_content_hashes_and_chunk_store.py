@@ -0,0 +1,42 @@
+"""Add chunk content hashes and the global chunk store
+
+Revision ID: c4e8a1f3b2d7
+Revises: b7d2e41c9a10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f3b2d7'
+down_revision: Union[str, None] = 'b7d2e41c9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # sha256 of the normalized chunk text; embeddings are reused within a tenant by hash
+    op.add_column('embeddings', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('idx_embeddings_org_content_hash', 'embeddings', ['organization_id', 'content_hash'], unique=False)
+    op.create_index('idx_embeddings_source_id', 'embeddings', ['source_id'], unique=False)
+
+    # Block hashes seen across all documents, used to recognise boilerplate (no text stored)
+    op.create_table(
+        'chunk_store',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('source_count', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('first_seen_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_seen_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('chunk_store')
+    op.drop_index('idx_embeddings_source_id', table_name='embeddings')
+    op.drop_index('idx_embeddings_org_content_hash', table_name='embeddings')
+    op.drop_column('embeddings', 'content_hash')
@@ -0,0 +1,27 @@
+"""Add organization weights for the LLM generation queue
+
+Revision ID: c7e2a9d4f1b3
+Revises: b9c4f7e2a8d6
+Create Date: 2026-10-18 18:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2a9d4f1b3'
+down_revision: Union[str, None] = 'b9c4f7e2a8d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Relative share of LLM generation slots when several organizations are queued
+    op.add_column('organizations', sa.Column('generation_weight', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'generation_weight')
@@ -0,0 +1,27 @@
+"""Add a retry delay to file_processing_jobs
+
+Revision ID: d3f8b6a2c5e9
+Revises: c7e2a9d4f1b3
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f8b6a2c5e9'
+down_revision: Union[str, None] = 'c7e2a9d4f1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A failed job isn't claimed again before this time (exponential backoff)
+    op.add_column('file_processing_jobs', sa.Column('retry_after', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('file_processing_jobs', 'retry_after')
@@ -0,0 +1,41 @@
+"""Add checkpoints to file_processing_jobs and make chunk positions unique
+
+Revision ID: d5a9c2e7f4b1
+Revises: c4e8a1f3b2d7
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9c2e7f4b1'
+down_revision: Union[str, None] = 'c4e8a1f3b2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Last page / chunk committed by a job, so a retry resumes instead of starting over
+    op.add_column('file_processing_jobs', sa.Column('checkpoint', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('file_processing_jobs', sa.Column('checkpoint_at', sa.TIMESTAMP(), nullable=True))
+
+    # Chunk upserts are keyed by (source_id, chunk_index); drop duplicates left by earlier re-runs first
+    op.execute("""
+        DELETE FROM embeddings e
+        USING embeddings d
+        WHERE e.source_id = d.source_id
+        AND e.chunk_index = d.chunk_index
+        AND e.ctid < d.ctid
+    """)
+    op.create_index('idx_embeddings_source_chunk_index', 'embeddings', ['source_id', 'chunk_index'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_embeddings_source_chunk_index', table_name='embeddings')
+    op.drop_column('file_processing_jobs', 'checkpoint_at')
+    op.drop_column('file_processing_jobs', 'checkpoint')
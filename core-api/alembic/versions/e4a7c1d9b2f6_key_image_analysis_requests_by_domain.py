@@ -0,0 +1,42 @@
+"""Key image analysis requests by domain as well as organization
+
+Revision ID: e4a7c1d9b2f6
+Revises: d3f8b6a2c5e9
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c1d9b2f6'
+down_revision: Union[str, None] = 'd3f8b6a2c5e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Searches filter on domain, so every domain showing an image needs its own description row
+    op.drop_constraint('uq_image_analysis_requests_hash_org', 'image_analysis_requests', type_='unique')
+    op.create_unique_constraint(
+        'uq_image_analysis_requests_hash_org_domain',
+        'image_analysis_requests',
+        ['content_hash', 'organization_id', 'domain_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_image_analysis_requests_hash_org_domain', 'image_analysis_requests', type_='unique')
+    op.execute(sa.text("""
+        DELETE FROM image_analysis_requests r
+        USING image_analysis_requests k
+        WHERE r.content_hash = k.content_hash AND r.organization_id = k.organization_id AND r.id > k.id
+    """))
+    op.create_unique_constraint(
+        'uq_image_analysis_requests_hash_org',
+        'image_analysis_requests',
+        ['content_hash', 'organization_id']
+    )
@@ -0,0 +1,69 @@
+"""Add the image analysis queue and result cache
+
+Revision ID: e8b3f6a1c9d2
+Revises: d5a9c2e7f4b1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f6a1c9d2'
+down_revision: Union[str, None] = 'd5a9c2e7f4b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # One row per distinct image (sha256 of its bytes): queue entry while pending, cached result once done
+    op.create_table(
+        'image_analyses',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('context_hint', sa.Text(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('content_type_detected', sa.String(length=50), nullable=True),
+        sa.Column('context_tags', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('ui_elements', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('embedding', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('embedding_model', sa.String(length=100), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('completed_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.create_index(
+        'idx_image_analyses_claimable',
+        'image_analyses',
+        ['status', 'created_at'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')")
+    )
+
+    # Tenants waiting for a description embedding of an image
+    op.create_table(
+        'image_analysis_requests',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('domain_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['content_hash'], ['image_analyses.content_hash'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', 'organization_id', name='uq_image_analysis_requests_hash_org')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('image_analysis_requests')
+    op.drop_index('idx_image_analyses_claimable', table_name='image_analyses')
+    op.drop_table('image_analyses')
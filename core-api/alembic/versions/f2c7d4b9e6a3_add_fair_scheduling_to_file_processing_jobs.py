@@ -0,0 +1,42 @@
+"""Add priority classes and organization weights for fair job scheduling
+
+Revision ID: f2c7d4b9e6a3
+Revises: e8b3f6a1c9d2
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7d4b9e6a3'
+down_revision: Union[str, None] = 'e8b3f6a1c9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # interactive | bulk | recrawl
+    op.add_column(
+        'file_processing_jobs',
+        sa.Column('priority_class', sa.String(length=20), server_default='interactive', nullable=False)
+    )
+    # Relative share of ingestion workers when several organizations have queued jobs
+    op.add_column('organizations', sa.Column('ingest_weight', sa.Integer(), server_default='1', nullable=False))
+    # Claim query counts running and queued jobs per organization
+    op.create_index(
+        'idx_file_processing_jobs_org_active',
+        'file_processing_jobs',
+        ['organization_id', 'status'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_processing_jobs_org_active', table_name='file_processing_jobs')
+    op.drop_column('organizations', 'ingest_weight')
+    op.drop_column('file_processing_jobs', 'priority_class')
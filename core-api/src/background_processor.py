@@ -10,6 +10,8 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 import logging
 import os
+import socket
+import tempfile
 from pathlib import Path
 import json
 
@@ -30,6 +32,8 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
+from chunk_dedup import get_chunk_deduplicator
+from chunking import Block, Chunk, blocks_from_docx, blocks_from_text, get_chunker
 from database import SessionLocal
 # from search.embedding_service import EmbeddingService
 # from search.vector_store import MultiDomainVectorStore
@@ -85,6 +89,8 @@ class FileProcessor:
             else:
                 logger.warning(f"Unsupported file type: {content_type}")
                 return ""
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting text from {content_type}: {e}")
             return ""
@@ -101,6 +107,8 @@ class FileProcessor:
             for page in pdf_reader.pages:
                 text += page.extract_text() + "\n"
             return text.strip()
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting PDF text: {e}")
             return ""
@@ -117,39 +125,435 @@ class FileProcessor:
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
             return text.strip()
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting DOCX text: {e}")
             return ""
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
-        """Split text into overlapping chunks"""
-        if len(text) <= chunk_size:
-            return [text]
+    def extract_blocks_from_file(self, file_path: str, content_type: str, content: bytes) -> list[Block]:
+        """Extract structural blocks (headings, paragraphs, lists, tables) for chunking"""
+        try:
+            if content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" and DOCX_AVAILABLE:
+                return blocks_from_docx(docx.Document(io.BytesIO(content)))
+            if content_type == "application/pdf" and PDF_AVAILABLE:
+                pdf_reader = pypdf.PdfReader(io.BytesIO(content))
+                blocks = []
+                for page in pdf_reader.pages:
+                    blocks.extend(blocks_from_text(page.extract_text() or ""))
+                return blocks
+        except MemoryError:
+            raise
+        except Exception as e:
+            logger.error(f"Error extracting document structure from {content_type}, falling back to plain text: {e}")
+        return blocks_from_text(self.extract_text_from_file(file_path, content_type, content))
+    
+    def _build_embedding_records(self, chunks: list[Chunk], file_result, visual_content: Dict[str, Any],
+                                 reuse: Optional[Dict[str, Any]] = None) -> list[Dict[str, Any]]:
+        """Embed chunks, taking embeddings from ``reuse`` (content hash -> embedding) where present
+
+        Chunks that fail to embed are skipped.
+        """
+        embedding_records = []
+        for chunk in chunks:
+            i = chunk.index
+            try:
+                embedding = reuse.get(chunk.content_hash) if reuse else None
+                if embedding is None:
+                    if not (self.embeddings_service and self.embeddings_service.is_available()):
+                        logger.warning(f"Embeddings service not available for chunk {i}")
+                        continue
+                    embedding = self.embeddings_service.generate_embedding(chunk.text)
+                    if embedding is None:
+                        continue
+                    embedding = embedding.tolist()
+                
+                # Enhanced metadata including visual content for relevant chunks
+                chunk_metadata = {
+                    "title": file_result.original_filename,
+                    "content_type": file_result.content_type,
+                    "chunk_index": i,
+                    "chunk_size": len(chunk.text),
+                    "token_count": chunk.token_count,
+                    "section": chunk.heading,
+                    "word_count": len(chunk.text.split()),
+                    "domain": file_result.domain,
+                    "organization_id": str(file_result.organization_id),
+                    "uploaded_by": str(file_result.uploaded_by),
+                    "file_size": file_result.size_bytes,
+                    "upload_date": file_result.created_at.isoformat()
+                }
+                
+                # Add visual content info if available
+                if visual_content.get("has_visual_content"):
+                    chunk_metadata.update({
+                        "has_images": len(visual_content.get("images", [])) > 0,
+                        "has_screenshots": len(visual_content.get("screenshots", [])) > 0,
+                        "image_count": len(visual_content.get("images", [])),
+                        "screenshot_count": len(visual_content.get("screenshots", [])),
+                        "visual_content_summary": f"{len(visual_content.get('images', []))} images, {len(visual_content.get('screenshots', []))} screenshots"
+                    })
+                    
+                    # For the first chunk, include actual visual content for search results
+                    if i == 0:
+                        chunk_metadata["images"] = visual_content.get("images", [])
+                        chunk_metadata["screenshots"] = visual_content.get("screenshots", [])
+                
+                embedding_records.append({
+                    "id": chunk.id,
+                    "embedding": embedding,
+                    "content_text": chunk.text,
+                    "content_hash": chunk.content_hash,
+                    "metadata": chunk_metadata
+                })
+                
+            except Exception as e:
+                logger.error(f"Failed to generate embedding for chunk {i}: {e}")
+                continue
+        return embedding_records
+    
+    def _write_embedding_records(self, db: Session, file_id: str, file_result, embedding_records: list[Dict[str, Any]]) -> int:
+        """Bulk upsert embedding records on ``db``; the caller commits"""
+        from config import get_settings
+        from embedding_writer import EmbeddingBulkWriter
+        writer = EmbeddingBulkWriter(
+            [
+                "id", "source_id", "domain_id", "organization_id", "chunk_index",
+                "content_text", "content_hash", "embedding", "embedding_model", "created_at"
+            ],
+            # Idempotent per (file, chunk_index, model): a retried or resumed run overwrites in place
+            on_conflict="""
+                ON CONFLICT (source_id, chunk_index, embedding_model) DO UPDATE SET id = EXCLUDED.id,
+                    content_text = EXCLUDED.content_text, content_hash = EXCLUDED.content_hash,
+                    embedding = EXCLUDED.embedding
+            """
+        )
+        created_at = datetime.utcnow()
+        embedding_model = get_settings().embedding_current_model
+        for record in embedding_records:
+            embedding = record["embedding"]
+            writer.add({
+                "id": record["id"],
+                "source_id": file_id,
+                "domain_id": file_result.domain_id,
+                "organization_id": file_result.organization_id,
+                "chunk_index": record["metadata"]["chunk_index"],
+                "content_text": record["content_text"],
+                "content_hash": record["content_hash"],
+                # Reused embeddings come back from the database already serialized
+                "embedding": embedding if isinstance(embedding, str) else json.dumps(embedding),
+                "embedding_model": embedding_model,
+                "created_at": created_at
+            })
+        return writer.write(db)
+    
+    def _index_chunks(self, db: Session, file_id: str, file_result, chunks: list[Chunk],
+                      existing: Dict[str, int], visual_content: Dict[str, Any]) -> int:
+        """Write the chunks that changed since the last run, embedding only unseen content"""
+        from config import get_settings
+        dedup = get_chunk_deduplicator()
+        plan = dedup.plan(db, file_result.organization_id, get_settings().embedding_current_model, chunks, existing)
+        if plan["unchanged"]:
+            logger.debug(f"{len(plan['unchanged'])} chunks of {file_result.original_filename} unchanged")
+        dedup.remove_chunks(db, file_id, plan["moved_ids"])
+        records = self._build_embedding_records(plan["new"], file_result, visual_content, plan["reuse"])
+        return self._write_embedding_records(db, file_id, file_result, records) + len(plan["unchanged"])
+    
+    def _index_batch(self, db: Session, job_id: Optional[str], file_id: str, file_result, chunks: list[Chunk],
+                     existing: Dict[str, int], visual_content: Dict[str, Any], checkpoint: Dict[str, Any]) -> int:
+        """Index a batch of chunks and commit it with its checkpoint
+
+        ``checkpoint`` is saved with this batch's embeddings already counted.
+        """
+        written = self._index_chunks(db, file_id, file_result, chunks, existing, visual_content)
+        self._save_checkpoint(db, job_id, {**checkpoint, "embeddings_created": checkpoint["embeddings_created"] + written})
+        db.commit()
+        return written
+    
+    @staticmethod
+    async def _in_thread(func, *args):
+        """Run blocking embedding, database or storage work in a thread
         
-        chunks = []
-        start = 0
+        Keeps the event loop free for the worker's other jobs and the lease heartbeat.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    
+    def _queue_image_analysis(self, db: Session, file_id: str, file_result, visual_content: Dict[str, Any]):
+        """Hand the file's stored images to the vision stage; the caller commits"""
+        images = visual_content.get("images", []) + visual_content.get("screenshots", []) if visual_content else []
+        if not images:
+            return
+        from vision_queue import get_vision_queue
+        queued = get_vision_queue().enqueue_images(
+            db,
+            images,
+            file_result.organization_id,
+            file_result.domain_id,
+            source_metadata={
+                "file_id": str(file_id),
+                "filename": file_result.original_filename,
+                "title": file_result.original_filename,
+                "domain": file_result.domain
+            }
+        )
+        if queued:
+            logger.info(f"Queued {queued} images from {file_result.original_filename} for vision analysis")
+    
+    def _load_checkpoint(self, db: Session, job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Checkpoint left by an earlier attempt of this job, if any"""
+        if job_id is None:
+            return None
+        row = db.execute(
+            text("SELECT checkpoint FROM file_processing_jobs WHERE id = :job_id"),
+            {"job_id": job_id}
+        ).fetchone()
+        checkpoint = row.checkpoint if row else None
+        if isinstance(checkpoint, str):
+            checkpoint = json.loads(checkpoint)
+        return checkpoint or None
+    
+    def _save_checkpoint(self, db: Session, job_id: Optional[str], checkpoint: Dict[str, Any]):
+        """Record progress in the same transaction as the chunks it covers; the caller commits"""
+        if job_id is None:
+            return
+        db.execute(
+            text("""
+                UPDATE file_processing_jobs
+                SET checkpoint = :checkpoint, checkpoint_at = NOW()
+                WHERE id = :job_id
+            """),
+            {"job_id": job_id, "checkpoint": json.dumps(checkpoint)}
+        )
+    
+    def _copy_to_local_path(self, file_result, tmp_dir: str) -> Optional[str]:
+        """Local path of the file's content, downloading MinIO objects to ``tmp_dir``"""
+        if file_result.storage_type == 'minio' and file_result.object_key:
+            from storage_utils import minio_storage
+            local_path = os.path.join(tmp_dir, "document")
+            if not minio_storage.download_to_file(file_result.object_key, local_path):
+                logger.error(f"Failed to download file from MinIO: {file_result.object_key}")
+                return None
+            return local_path
+        
+        path = file_result.file_path if file_result.storage_type == 'local' else file_result.object_key
+        if path and Path(path).exists():
+            return str(path)
+        logger.error(f"No storage location found for file {file_result.id}")
+        return None
+    
+    def _index_pdf_window(self, db: Session, job_id: Optional[str], file_id: str, file_result, chunks: list[Chunk],
+                          existing: Dict[str, int], visual_content: Dict[str, Any], progress: Dict[str, Any],
+                          metadata: Dict[str, Any]) -> int:
+        """Index a window's chunks and commit them with the checkpoint and page progress
+        
+        ``progress`` is saved as the checkpoint with this window's embeddings already counted.
+        """
+        written = self._index_chunks(db, file_id, file_result, chunks, existing, visual_content)
+        self._save_checkpoint(db, job_id, {**progress, "embeddings_created": progress["embeddings_created"] + written})
+        db.execute(
+            text("""
+                UPDATE files 
+                SET processing_status = 'processing', metadata = :metadata, updated_at = :updated_at
+                WHERE id = :file_id
+            """),
+            {
+                "file_id": file_id,
+                "metadata": json.dumps(metadata),
+                "updated_at": datetime.utcnow()
+            }
+        )
+        db.commit()
+        return written
+    
+    async def _process_pdf_streaming(self, file_id: str, file_result, db: Session, job_id: Optional[str] = None) -> bool:
+        """Extract, chunk, embed and commit a PDF one window of pages at a time
+        
+        Memory stays bounded by the page window rather than the document size, and
+        chunks become searchable as each window is committed. Each commit records a
+        checkpoint on the job, so a retried job resumes at the next unprocessed window.
+        """
+        from config import get_settings
+        from extraction_pool import get_extraction_pool
+        
+        pool = get_extraction_pool()
+        filename = file_result.original_filename
+        base_metadata = json.loads(file_result.metadata) if file_result.metadata else {}
         
-        while start < len(text):
-            end = start + chunk_size
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = await self._in_thread(self._copy_to_local_path, file_result, tmp_dir)
+            if not local_path:
+                return False
+            
+            visual_content = {}
+            if self.visual_extractor is not None:
+                try:
+                    visual_content = await pool.extract_visual(local_path, file_result.content_type, filename)
+                except Exception as e:
+                    logger.warning(f"Failed to extract visual content from {filename}: {e}")
             
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for i in range(end, max(start + chunk_size - 200, start), -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
+            page_count = await pool.count_pdf_pages(local_path, filename)
+            # Committed with the first window
+            self._queue_image_analysis(db, file_id, file_result, visual_content)
             
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
+            # Chunks from an earlier run are kept where unchanged and the rest removed at the end
+            dedup = get_chunk_deduplicator()
+            existing = await self._in_thread(dedup.existing_chunks, db, file_id)
+            chunk_stream = get_chunker().stream(file_id)
+            
+            checkpoint = self._load_checkpoint(db, job_id)
+            if checkpoint and checkpoint.get("kind") == "pdf" and checkpoint.get("page_count") == page_count:
+                progress = checkpoint
+                emitted = await self._in_thread(dedup.emitted_hashes, db, file_id, progress["stream"]["index"])
+                chunk_stream.restore(progress["stream"], emitted)
+                logger.info(f"Resuming {filename} at page {progress['next_page'] + 1}/{page_count} ({chunk_stream.index} chunks already indexed)")
+            else:
+                progress = {
+                    "kind": "pdf",
+                    "page_count": page_count,
+                    "next_page": 0,
+                    "text_length": 0,
+                    "word_count": 0,
+                    "embeddings_created": 0,
+                    "sample_chunks": []
+                }
+                logger.info(f"Streaming {page_count} pages from {filename}")
+            resume_index = chunk_stream.index
+            chunk_ids: list[str] = []
+            
+            async for first_page, pages in pool.iter_pdf_pages(local_path, filename, page_count,
+                                                                get_settings().ingest_pdf_page_window, start_page=progress["next_page"]):
+                blocks = []
+                for page_text in pages:
+                    blocks.extend(blocks_from_text(page_text))
+                    progress["text_length"] += len(page_text)
+                    progress["word_count"] += len(page_text.split())
+                
+                # The chunk still being filled carries over to the next window (and into the checkpoint)
+                ready = chunk_stream.feed(blocks)
+                progress["sample_chunks"].extend(chunk.text for chunk in ready[:3 - len(progress["sample_chunks"])])
+                pages_processed = first_page + len(pages)
+                progress["next_page"] = pages_processed
+                progress["stream"] = chunk_stream.get_state()
+                progress["embeddings_created"] += await self._in_thread(
+                    self._index_pdf_window, db, job_id, file_id, file_result, ready, existing, visual_content,
+                    progress, {**base_metadata, "pages_processed": pages_processed, "page_count": page_count}
+                )
+                chunk_ids.extend(chunk.id for chunk in ready)
+                logger.info(f"Indexed pages {first_page + 1}-{pages_processed}/{page_count} of {filename} ({chunk_stream.index} chunks)")
             
-            start = end - overlap
+            # Flush the final chunk
+            final_chunks = chunk_stream.finish()
+            progress["embeddings_created"] += await self._in_thread(
+                self._index_chunks, db, file_id, file_result, final_chunks, existing, visual_content
+            )
+            chunk_ids.extend(chunk.id for chunk in final_chunks)
+            # Rows below resume_index were reconciled by the attempt that wrote the checkpoint
+            await self._in_thread(dedup.remove_stale_chunks, db, file_id, chunk_ids, resume_index)
+            progress["sample_chunks"].extend(chunk.text for chunk in final_chunks[:3 - len(progress["sample_chunks"])])
+            chunk_index = chunk_stream.index
+        
+        embeddings_created = progress["embeddings_created"]
+        text_length = progress["text_length"]
+        word_count = progress["word_count"]
+        sample_chunks = progress["sample_chunks"]
+        final_metadata = {
+            **base_metadata,
+            "processing_completed_at": datetime.utcnow().isoformat(),
+            "page_count": page_count,
+            "pages_processed": page_count,
+            "chunks_created": chunk_index,
+            "embeddings_created": embeddings_created,
+            "visual_content": visual_content,
+            "text_length": text_length,
+            "word_count": word_count
+        }
+        if not chunk_index:
+            logger.warning(f"No text content extracted from {filename}")
+        
+        db.execute(
+            text("""
+                UPDATE files 
+                SET processed = true, processing_status = 'completed', 
+                    processing_error = :processing_error,
+                    metadata = :metadata, updated_at = :updated_at
+                WHERE id = :file_id
+            """),
+            {
+                "file_id": file_id,
+                "processing_error": None if chunk_index else 'No text content extracted',
+                "metadata": json.dumps(final_metadata),
+                "updated_at": datetime.utcnow()
+            }
+        )
+        db.commit()
+        logger.info(f"Successfully processed file: {filename} (Org: {file_result.org_slug})")
+        
+        await self._update_cache_after_processing(file_result, sample_chunks, db)
+        return True
+    
+    async def _update_cache_after_processing(self, file_result, chunks: list[str], db: Session):
+        """Smart cache update for this domain since new embeddings were generated"""
+        rag_processor = None
+        try:
+            # Import here to avoid circular imports
+            from main import rag_processor
+            if rag_processor:
+                # Use smart cache update instead of full invalidation
+                await rag_processor.smart_cache_update_for_new_content(
+                    domain=file_result.domain,
+                    new_file_id=str(file_result.id),
+                    new_content_chunks=chunks,
+                    db=db
+                )
+                logger.info(f"Smart cache update completed for domain '{file_result.domain}' after processing file {file_result.original_filename}")
+        except Exception as e:
+            logger.warning(f"Failed to update cache after file processing: {e}")
+            # Fallback to domain invalidation if smart update fails
+            try:
+                if rag_processor:
+                    rag_processor.invalidate_cache_for_domain(file_result.domain)
+                    logger.info(f"Fallback: Cache invalidated for domain '{file_result.domain}'")
+            except:
+                pass
+    
+    def _read_file_content(self, file_result) -> Optional[bytes]:
+        """File content from MinIO or local storage, or None when it can't be found"""
+        if file_result.storage_type == 'minio' and file_result.object_key:
+            # Download file content from MinIO
+            from storage_utils import minio_storage
+            file_content = minio_storage.download_file(file_result.object_key)
+            if not file_content:
+                logger.error(f"Failed to download file from MinIO: {file_result.object_key}")
+                return None
+        elif file_result.storage_type == 'local' and file_result.file_path:
+            # Read file from local storage
+            file_path = Path(file_result.file_path)
+            if not file_path.exists():
+                logger.error(f"Local file not found: {file_path}")
+                return None
             
-        return chunks
+            with open(file_path, 'rb') as f:
+                file_content = f.read()
+        else:
+            # Legacy fallback - try object_key as file path
+            if file_result.object_key:
+                file_path = Path(file_result.object_key)
+                if file_path.exists():
+                    with open(file_path, 'rb') as f:
+                        file_content = f.read()
+                else:
+                    logger.error(f"Neither MinIO object nor local file found for {file_result.id}")
+                    return None
+            else:
+                logger.error(f"No storage location found for file {file_result.id}")
+                return None
+        return file_content
     
-    async def process_file(self, file_id: str, db: Session) -> bool:
-        """Process a single file with multi-tenant isolation and MinIO support"""
+    async def process_file(self, file_id: str, db: Session, job_id: Optional[str] = None) -> bool:
+        """Process a single file with multi-tenant isolation and MinIO support
+        
+        With ``job_id`` progress is checkpointed on the job so a retry resumes where it stopped.
+        """
         try:
             # Get file record with organization context
             file_result = db.execute(
@@ -169,64 +573,30 @@ class FileProcessor:
             
             logger.info(f"Processing file: {file_result.original_filename} (Org: {file_result.org_slug}, Domain: {file_result.domain})")
             
-            # Get file content from storage
+            if file_result.content_type == "application/pdf" and PDF_AVAILABLE:
+                return await self._process_pdf_streaming(file_id, file_result, db, job_id)
+            
+            # Get file content from storage (downloads run in a thread)
             try:
-                if file_result.storage_type == 'minio' and file_result.object_key:
-                    # Download file content from MinIO
-                    from storage_utils import minio_storage
-                    file_content = minio_storage.download_file(file_result.object_key)
-                    if not file_content:
-                        logger.error(f"Failed to download file from MinIO: {file_result.object_key}")
-                        return False
-                elif file_result.storage_type == 'local' and file_result.file_path:
-                    # Read file from local storage
-                    file_path = Path(file_result.file_path)
-                    if not file_path.exists():
-                        logger.error(f"Local file not found: {file_path}")
-                        return False
-                    
-                    with open(file_path, 'rb') as f:
-                        file_content = f.read()
-                else:
-                    # Legacy fallback - try object_key as file path
-                    if file_result.object_key:
-                        file_path = Path(file_result.object_key)
-                        if file_path.exists():
-                            with open(file_path, 'rb') as f:
-                                file_content = f.read()
-                        else:
-                            logger.error(f"Neither MinIO object nor local file found for {file_id}")
-                            return False
-                    else:
-                        logger.error(f"No storage location found for file {file_id}")
-                        return False
-                        
+                file_content = await self._in_thread(self._read_file_content, file_result)
+                if file_content is None:
+                    return False
             except Exception as e:
                 logger.error(f"Failed to read file content for {file_id}: {e}")
                 return False
             
-            # Extract text based on content type
-            text_content = self.extract_text_from_file(
-                file_result.object_key or file_result.file_path, 
-                file_result.content_type, 
-                file_content
+            # Extract text and visual content (images, screenshots) in the extraction process pool
+            from extraction_pool import get_extraction_pool
+            blocks, visual_content = await get_extraction_pool().extract(
+                file_content,
+                file_result.content_type,
+                file_result.original_filename,
+                with_visual=self.visual_extractor is not None
             )
+            if visual_content:
+                logger.info(f"Extracted {len(visual_content.get('images', []))} images and {len(visual_content.get('screenshots', []))} screenshots from {file_result.original_filename}")
             
-            # Extract visual content (images, screenshots)
-            visual_content = {}
-            if self.visual_extractor:
-                try:
-                    visual_content = self.visual_extractor.extract_visual_content(
-                        file_content, 
-                        file_result.content_type, 
-                        file_result.original_filename
-                    )
-                    logger.info(f"Extracted {len(visual_content.get('images', []))} images and {len(visual_content.get('screenshots', []))} screenshots from {file_result.original_filename}")
-                except Exception as e:
-                    logger.warning(f"Failed to extract visual content from {file_result.original_filename}: {e}")
-                    visual_content = {"images": [], "screenshots": [], "has_visual_content": False}
-            
-            if not text_content.strip():
+            if not blocks:
                 # Update metadata even if no text content
                 updated_metadata = {
                     **(json.loads(file_result.metadata) if file_result.metadata else {}),
@@ -235,6 +605,8 @@ class FileProcessor:
                 }
                 
                 logger.warning(f"No text content extracted from {file_result.original_filename}")
+                # Image-only files become searchable once their description is written
+                self._queue_image_analysis(db, file_id, file_result, visual_content)
                 # Still mark as processed to avoid infinite retries
                 db.execute(
                     text("""
@@ -254,94 +626,42 @@ class FileProcessor:
                 return True
             
             # Chunk the text
-            chunks = self.chunk_text(text_content)
+            dedup = get_chunk_deduplicator()
+            existing = await self._in_thread(dedup.existing_chunks, db, file_id)
+            chunks = await self._in_thread(get_chunker().chunk, blocks, file_id)
             logger.info(f"Created {len(chunks)} chunks from {file_result.original_filename}")
             
-            # Generate embeddings for each chunk
-            embedding_records = []
-            for i, chunk in enumerate(chunks):
-                try:
-                    if self.embeddings_service and self.embeddings_service.is_available():
-                        embedding = self.embeddings_service.generate_embedding(chunk)
-                        if embedding is not None:
-                            # Enhanced metadata including visual content for relevant chunks
-                            chunk_metadata = {
-                                "title": file_result.original_filename,
-                                "content_type": file_result.content_type,
-                                "chunk_index": i,
-                                "chunk_size": len(chunk),
-                                "word_count": len(chunk.split()),
-                                "domain": file_result.domain,
-                                "organization_id": str(file_result.organization_id),
-                                "uploaded_by": str(file_result.uploaded_by),
-                                "file_size": file_result.size_bytes,
-                                "upload_date": file_result.created_at.isoformat()
-                            }
-                            
-                            # Add visual content info if available
-                            if visual_content.get("has_visual_content"):
-                                chunk_metadata.update({
-                                    "has_images": len(visual_content.get("images", [])) > 0,
-                                    "has_screenshots": len(visual_content.get("screenshots", [])) > 0,
-                                    "image_count": len(visual_content.get("images", [])),
-                                    "screenshot_count": len(visual_content.get("screenshots", [])),
-                                    "visual_content_summary": f"{len(visual_content.get('images', []))} images, {len(visual_content.get('screenshots', []))} screenshots"
-                                })
-                                
-                                # For the first chunk, include actual visual content for search results
-                                if i == 0:
-                                    chunk_metadata["images"] = visual_content.get("images", [])
-                                    chunk_metadata["screenshots"] = visual_content.get("screenshots", [])
-                            
-                            embedding_records.append({
-                                "embedding": embedding.tolist(),
-                                "content_text": chunk,
-                                "metadata": chunk_metadata
-                            })
-                    else:
-                        logger.warning(f"Embeddings service not available for chunk {i}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to generate embedding for chunk {i}: {e}")
-                    continue
-            
-            # Store embeddings in the database
-            for record in embedding_records:
-                try:
-                    embedding_id = str(uuid.uuid4())
-                    db.execute(
-                        text("""
-                            INSERT INTO embeddings (
-                                id, source_id, domain_id, organization_id, chunk_index, 
-                                content_text, embedding, created_at
-                            ) VALUES (
-                                :id, :source_id, :domain_id, :organization_id, :chunk_index,
-                                :content_text, :embedding, :created_at
-                            )
-                        """),
-                        {
-                            "id": embedding_id,
-                            "source_id": file_id,
-                            "domain_id": file_result.domain_id,
-                            "organization_id": file_result.organization_id,
-                            "chunk_index": record["metadata"]["chunk_index"],
-                            "content_text": record["content_text"],
-                            "embedding": json.dumps(record["embedding"]),
-                            "created_at": datetime.utcnow()
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error storing embedding: {e}")
+            # Embed only chunks whose content is new to this tenant and store them with
+            # multi-row upserts, committing a checkpoint every batch. A retry skips the batches
+            # an interrupted attempt committed, as long as chunking produced the same chunks.
+            from config import get_settings
+            self._queue_image_analysis(db, file_id, file_result, visual_content)
+            start_chunk, embeddings_created = 0, 0
+            checkpoint = self._load_checkpoint(db, job_id)
+            if checkpoint and checkpoint.get("kind") == "document" and checkpoint.get("chunk_count") == len(chunks):
+                next_chunk = checkpoint.get("next_chunk", 0)
+                if 0 < next_chunk <= len(chunks) and chunks[next_chunk - 1].id == checkpoint.get("last_chunk_id"):
+                    start_chunk, embeddings_created = next_chunk, checkpoint.get("embeddings_created", 0)
+                    logger.info(f"Resuming {file_result.original_filename} after chunk {next_chunk}/{len(chunks)}")
+            batch_size = max(1, get_settings().ingest_checkpoint_chunks)
+            for start in range(start_chunk, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                embeddings_created += await self._in_thread(
+                    self._index_batch, db, job_id, file_id, file_result, batch, existing, visual_content,
+                    {"kind": "document", "next_chunk": start + len(batch), "chunk_count": len(chunks),
+                     "last_chunk_id": batch[-1].id, "embeddings_created": embeddings_created}
+                )
+            await self._in_thread(dedup.remove_stale_chunks, db, file_id, [chunk.id for chunk in chunks])
             
             # Update file status and metadata with visual content
             final_metadata = {
                 **(json.loads(file_result.metadata) if file_result.metadata else {}),
                 "processing_completed_at": datetime.utcnow().isoformat(),
                 "chunks_created": len(chunks),
-                "embeddings_created": len(embedding_records),
+                "embeddings_created": embeddings_created,
                 "visual_content": visual_content,
-                "text_length": len(text_content),
-                "word_count": len(text_content.split())
+                "text_length": sum(len(block.text) for block in blocks),
+                "word_count": sum(len(block.text.split()) for block in blocks)
             }
             
             db.execute(
@@ -361,28 +681,7 @@ class FileProcessor:
             db.commit()
             logger.info(f"Successfully processed file: {file_result.original_filename} (Org: {file_result.org_slug})")
             
-            # Smart cache update for this domain since new embeddings were generated
-            try:
-                # Import here to avoid circular imports
-                from main import rag_processor
-                if rag_processor:
-                    # Use smart cache update instead of full invalidation
-                    await rag_processor.smart_cache_update_for_new_content(
-                        domain=file_result.domain,
-                        new_file_id=str(file_result.id),
-                        new_content_chunks=chunks,
-                        db=db
-                    )
-                    logger.info(f"Smart cache update completed for domain '{file_result.domain}' after processing file {file_result.original_filename}")
-            except Exception as e:
-                logger.warning(f"Failed to update cache after file processing: {e}")
-                # Fallback to domain invalidation if smart update fails
-                try:
-                    if rag_processor:
-                        rag_processor.invalidate_cache_for_domain(file_result.domain)
-                        logger.info(f"Fallback: Cache invalidated for domain '{file_result.domain}'")
-                except:
-                    pass
+            await self._update_cache_after_processing(file_result, [chunk.text for chunk in chunks], db)
             
             return True
             
@@ -390,11 +689,12 @@ class FileProcessor:
             logger.error(f"Error processing file {file_id}: {e}")
             db.rollback()
             
-            # Update job status to failed
+            # A queued job's file is only failed once the job is out of retries (see _mark_failed)
+            status_sql = "processing_status = 'failed', " if job_id is None else ""
             db.execute(
-                text("""
+                text(f"""
                     UPDATE files 
-                    SET processing_status = 'failed', processing_error = :error_message, updated_at = :updated_at
+                    SET {status_sql}processing_error = :error_message, updated_at = :updated_at
                     WHERE id = :file_id
                 """),
                 {
@@ -408,12 +708,44 @@ class FileProcessor:
 
 
 class BackgroundJobProcessor:
-    """Background job processor for handling file processing tasks"""
+    """Background job processor for handling file processing tasks
+
+    Jobs are claimed with ``FOR UPDATE SKIP LOCKED`` under a lease that a heartbeat
+    keeps extending, so any number of workers can share the queue and jobs from a
+    crashed worker are picked up again once their lease expires. Workers LISTEN on
+    the ``file_processing_jobs`` channel and wake as soon as a job is queued.
+    
+    Claiming is fair across organizations: each organization's next job is ranked by
+    (running + queued-ahead) / ``organizations.ingest_weight``, so a tenant with a
+    large backlog can't starve others, and no organization runs more than
+    ``ingest_org_max_concurrent_jobs`` at once. Within that, interactive uploads go
+    before bulk syncs and recrawls, and every job gains one class per
+    ``ingest_priority_step_seconds`` it waits.
+    """
+    
+    NOTIFY_CHANNEL = "file_processing_jobs"
+    
+    # Priority classes, most urgent first
+    PRIORITY_CLASSES = ("interactive", "bulk", "recrawl")
     
     def __init__(self):
         # self.settings = settings
+        from config import get_settings
+        settings = get_settings()
+        
         self.file_processor = FileProcessor()
         self.running = False
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.max_concurrent_jobs = max(1, settings.ingest_max_concurrent_jobs)
+        self.lease_seconds = settings.ingest_job_lease_seconds
+        self.poll_interval = settings.ingest_poll_interval
+        self.org_max_concurrent_jobs = max(1, settings.ingest_org_max_concurrent_jobs)
+        self.priority_step_seconds = max(1, settings.ingest_priority_step_seconds)
+        self.retry_backoff_seconds = max(0, settings.ingest_retry_backoff_seconds)
+        
+        self._active_jobs: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._listen_conn = None
         
     async def initialize(self):
         """Initialize the processor"""
@@ -422,125 +754,311 @@ class BackgroundJobProcessor:
     async def start(self):
         """Start the background job processor"""
         self.running = True
-        logger.info("Background job processor started")
+        self._wakeup = asyncio.Event()
+        self._start_listening()
+        logger.info(f"Background job processor {self.worker_id} started (max {self.max_concurrent_jobs} concurrent jobs)")
         
         while self.running:
             try:
+                self._wakeup.clear()
                 await self.process_pending_jobs()
-                await asyncio.sleep(5)  # Check for new jobs every 5 seconds
+                # Sleep until NOTIFY, a finished job frees a slot, or the fallback poll interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if self._listen_conn is None:
+                    self._start_listening()
             except Exception as e:
                 logger.error(f"Error in background processor: {e}")
                 await asyncio.sleep(10)  # Wait longer on error
+        
+        self._stop_listening()
     
     def stop(self):
         """Stop the background job processor"""
         self.running = False
+        if self._wakeup:
+            self._wakeup.set()
         logger.info("Background job processor stopped")
     
+    def _start_listening(self):
+        """LISTEN for job notifications on a dedicated connection"""
+        try:
+            import psycopg2
+            import psycopg2.extensions
+            from database import DATABASE_URL
+            
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.NOTIFY_CHANNEL}")
+            asyncio.get_running_loop().add_reader(conn.fileno(), self._on_notify)
+            self._listen_conn = conn
+            logger.info(f"Listening for job notifications on '{self.NOTIFY_CHANNEL}'")
+        except Exception as e:
+            logger.warning(f"LISTEN unavailable, falling back to polling every {self.poll_interval}s: {e}")
+            self._listen_conn = None
+    
+    def _stop_listening(self):
+        if self._listen_conn is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._listen_conn.fileno())
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+    
+    def _on_notify(self):
+        try:
+            self._listen_conn.poll()
+            if self._listen_conn.notifies:
+                self._listen_conn.notifies.clear()
+                self._wakeup.set()
+        except Exception as e:
+            logger.warning(f"Job notification connection lost: {e}")
+            self._stop_listening()
+            self._wakeup.set()
+    
     async def process_pending_jobs(self):
-        """Process pending file processing jobs with multi-tenant isolation"""
+        """Claim as many pending jobs as there are free slots and start them"""
+        free_slots = self.max_concurrent_jobs - len(self._active_jobs)
+        if free_slots <= 0:
+            return
+        
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(None, self._claim_jobs, free_slots)
+        
+        for job in jobs:
+            logger.info(f"Processing job {job.id} for file {job.original_filename} (Org: {job.org_slug}, Domain: {job.domain}, {job.priority_class}, attempt {job.attempts})")
+            task = asyncio.create_task(self._run_job(job))
+            self._active_jobs[str(job.id)] = task
+    
+    def _claim_jobs(self, limit: int) -> list:
+        """Atomically lease up to ``limit`` pending or lease-expired jobs, fairly across organizations"""
         db = SessionLocal()
         try:
-            # Get pending jobs with organization context
-            pending_jobs = db.execute(
+            self._reap_exhausted_jobs(db)
+            # Claims are serialized so per-organization caps hold across workers
+            db.execute(text("SELECT pg_advisory_xact_lock(hashtext('file_processing_jobs_claim'))"))
+            jobs = db.execute(
                 text("""
-                    SELECT fpj.id, fpj.file_id, fpj.job_type, fpj.attempts, fpj.organization_id, fpj.domain_id,
-                           f.original_filename, o.slug as org_slug, od.domain_name as domain
-                    FROM file_processing_jobs fpj
-                    JOIN files f ON fpj.file_id = f.id
-                    JOIN organizations o ON fpj.organization_id = o.id
-                    JOIN organization_domains od ON fpj.domain_id = od.id
-                    WHERE fpj.status = 'pending' 
-                    AND fpj.attempts < fpj.max_attempts
-                    AND o.is_active = true
-                    ORDER BY fpj.created_at ASC
-                    LIMIT 10
-                """)
+                    WITH running AS (
+                        SELECT organization_id, COUNT(*) AS running_count
+                        FROM file_processing_jobs
+                        WHERE status = 'running'
+                        AND COALESCE(lease_expires_at, started_at + make_interval(secs => :lease_seconds)) >= NOW()
+                        GROUP BY organization_id
+                    ),
+                    queued AS (
+                        SELECT fpj.id, fpj.organization_id,
+                               COALESCE(r.running_count, 0) AS running_count,
+                               GREATEST(COALESCE(o.ingest_weight, 1), 1) AS weight,
+                               -- Aging: waiting one step is worth one priority class
+                               EXTRACT(EPOCH FROM NOW() - fpj.created_at) / :priority_step_seconds
+                                   - CASE fpj.priority_class WHEN 'interactive' THEN 0 WHEN 'bulk' THEN 1 ELSE 2 END
+                                   AS urgency
+                        FROM file_processing_jobs fpj
+                        JOIN organizations o ON fpj.organization_id = o.id
+                        LEFT JOIN running r ON r.organization_id = fpj.organization_id
+                        WHERE (
+                            (fpj.status = 'pending' AND (fpj.retry_after IS NULL OR fpj.retry_after <= NOW()))
+                            OR (fpj.status = 'running' AND COALESCE(
+                                fpj.lease_expires_at, fpj.started_at + make_interval(secs => :lease_seconds)
+                            ) < NOW())
+                        )
+                        AND fpj.attempts < fpj.max_attempts
+                        AND o.is_active = true
+                    ),
+                    candidates AS (
+                        SELECT q.*, ROW_NUMBER() OVER (PARTITION BY q.organization_id ORDER BY q.urgency DESC) AS org_rank
+                        FROM queued q
+                    ),
+                    claimable AS (
+                        SELECT fpj.id
+                        FROM file_processing_jobs fpj
+                        JOIN candidates c ON c.id = fpj.id
+                        WHERE c.running_count + c.org_rank <= :org_max_jobs
+                        -- Weighted round-robin: the organization with the least (weighted) work in flight goes next
+                        ORDER BY (c.running_count + c.org_rank)::float / c.weight ASC, c.urgency DESC
+                        LIMIT :limit
+                        FOR UPDATE OF fpj SKIP LOCKED
+                    )
+                    UPDATE file_processing_jobs j
+                    SET status = 'running', started_at = NOW(), attempts = j.attempts + 1,
+                        worker_id = :worker_id, heartbeat_at = NOW(), updated_at = NOW(), retry_after = NULL,
+                        lease_expires_at = NOW() + make_interval(secs => :lease_seconds)
+                    FROM claimable c, files f, organizations o, organization_domains od
+                    WHERE j.id = c.id
+                    AND f.id = j.file_id
+                    AND o.id = j.organization_id
+                    AND od.id = j.domain_id
+                    RETURNING j.id, j.file_id, j.job_type, j.attempts, j.max_attempts, j.organization_id, j.domain_id,
+                              j.priority_class, f.original_filename, o.slug as org_slug, od.domain_name as domain
+                """),
+                {
+                    "limit": limit,
+                    "worker_id": self.worker_id,
+                    "lease_seconds": self.lease_seconds,
+                    "org_max_jobs": self.org_max_concurrent_jobs,
+                    "priority_step_seconds": self.priority_step_seconds
+                }
             ).fetchall()
-            
-            for job in pending_jobs:
-                logger.info(f"Processing job {job.id} for file {job.original_filename} (Org: {job.org_slug}, Domain: {job.domain})")
-                await self.process_job(job, db)
-                
+            db.commit()
+            return jobs
         except Exception as e:
-            logger.error(f"Error processing pending jobs: {e}")
+            db.rollback()
+            logger.error(f"Error claiming pending jobs: {e}")
+            return []
         finally:
             db.close()
     
-    async def process_job(self, job, db: Session):
-        """Process a single job"""
-        job_id = job.id
-        file_id = job.file_id
+    def _reap_exhausted_jobs(self, db: Session):
+        """Fail jobs whose worker died on the last allowed attempt
         
+        They can't be claimed again, so without this they would stay 'running' forever.
+        """
+        reaped = db.execute(
+            text("""
+                WITH reaped AS (
+                    UPDATE file_processing_jobs
+                    SET status = 'failed', completed_at = NOW(), lease_expires_at = NULL, updated_at = NOW(),
+                        error_message = 'Worker lost on final attempt'
+                    WHERE status = 'running'
+                    AND attempts >= max_attempts
+                    AND COALESCE(lease_expires_at, started_at + make_interval(secs => :lease_seconds)) < NOW()
+                    RETURNING file_id
+                )
+                UPDATE files
+                SET processing_status = 'failed', processing_error = 'Worker lost on final attempt', updated_at = NOW()
+                WHERE id IN (SELECT file_id FROM reaped)
+            """),
+            {"lease_seconds": self.lease_seconds}
+        ).rowcount
+        if reaped:
+            logger.warning(f"Failed {reaped} jobs abandoned on their final attempt")
+    
+    async def _run_job(self, job):
+        """Process a claimed job while a heartbeat keeps its lease alive"""
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        db = SessionLocal()
         try:
-            # Update job status to running
-            db.execute(
+            await self.process_job(job, db)
+        finally:
+            heartbeat.cancel()
+            db.close()
+            self._active_jobs.pop(str(job.id), None)
+            if self._wakeup:
+                self._wakeup.set()  # A slot is free - look for more work
+    
+    async def _heartbeat(self, job_id):
+        """Extend the job's lease every third of the lease period"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await loop.run_in_executor(None, self._renew_lease, job_id)
+                if not renewed:
+                    logger.warning(f"Lost lease on job {job_id}; another worker may pick it up")
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+    
+    def _renew_lease(self, job_id) -> bool:
+        db = SessionLocal()
+        try:
+            result = db.execute(
                 text("""
-                    UPDATE file_processing_jobs 
-                    SET status = 'running', started_at = :started_at, attempts = attempts + 1
-                    WHERE id = :job_id
+                    UPDATE file_processing_jobs
+                    SET heartbeat_at = NOW(), lease_expires_at = NOW() + make_interval(secs => :lease_seconds)
+                    WHERE id = :job_id AND worker_id = :worker_id AND status = 'running'
                 """),
-                {
-                    "job_id": job_id,
-                    "started_at": datetime.utcnow()
-                }
+                {"job_id": job_id, "worker_id": self.worker_id, "lease_seconds": self.lease_seconds}
             )
             db.commit()
-            
+            return result.rowcount > 0
+        finally:
+            db.close()
+    
+    async def process_job(self, job, db: Session):
+        """Process a single claimed job"""
+        job_id = job.id
+        file_id = job.file_id
+        
+        try:
             # Process the file
-            success = await self.file_processor.process_file(file_id, db)
+            success = await self.file_processor.process_file(file_id, db, job_id=job_id)
             
             if success:
-                # Mark job as completed
+                # Mark job as completed; the checkpoint is only needed for retries
                 db.execute(
                     text("""
                         UPDATE file_processing_jobs 
-                        SET status = 'completed', completed_at = :completed_at
-                        WHERE id = :job_id
+                        SET status = 'completed', completed_at = :completed_at, lease_expires_at = NULL,
+                            checkpoint = NULL
+                        WHERE id = :job_id AND worker_id = :worker_id
                     """),
                     {
                         "job_id": job_id,
+                        "worker_id": self.worker_id,
                         "completed_at": datetime.utcnow()
                     }
                 )
+                db.commit()
             else:
-                # Mark job as failed
-                db.execute(
-                    text("""
-                        UPDATE file_processing_jobs 
-                        SET status = 'failed', completed_at = :completed_at,
-                            error_message = 'File processing failed'
-                        WHERE id = :job_id
-                    """),
-                    {
-                        "job_id": job_id,
-                        "completed_at": datetime.utcnow()
-                    }
-                )
-            
-            db.commit()
+                self._mark_failed(db, job, 'File processing failed')
             
         except Exception as e:
             logger.error(f"Error processing job {job_id}: {e}")
-            
-            # Mark job as failed
+            db.rollback()
+            self._mark_failed(db, job, str(e))
+    
+    def _mark_failed(self, db: Session, job, error_message: str):
+        """Return the job to the queue for a delayed retry, or fail it (and its file) for good
+
+        Retries back off exponentially from ``retry_backoff_seconds`` so a file that always
+        fails doesn't burn through its attempts in seconds.
+        """
+        retry = job.attempts < job.max_attempts
+        updated = db.execute(
+            text("""
+                UPDATE file_processing_jobs 
+                SET status = :status, completed_at = :completed_at,
+                    error_message = :error_message, lease_expires_at = NULL,
+                    retry_after = CASE WHEN :retry THEN NOW() + make_interval(secs => :retry_delay) ELSE NULL END
+                WHERE id = :job_id AND worker_id = :worker_id
+            """),
+            {
+                "job_id": job.id,
+                "worker_id": self.worker_id,
+                "status": "pending" if retry else "failed",
+                "completed_at": None if retry else datetime.utcnow(),
+                "error_message": error_message,
+                "retry": retry,
+                "retry_delay": self.retry_backoff_seconds * 2 ** max(job.attempts - 1, 0)
+            }
+        ).rowcount
+        if not retry and updated:
+            # Keep the error process_file recorded; it is more specific than ours
             db.execute(
                 text("""
-                    UPDATE file_processing_jobs 
-                    SET status = 'failed', completed_at = :completed_at,
-                        error_message = :error_message
-                    WHERE id = :job_id
+                    UPDATE files
+                    SET processing_status = 'failed', processing_error = COALESCE(processing_error, :error_message),
+                        updated_at = NOW()
+                    WHERE id = :file_id
                 """),
-                {
-                    "job_id": job_id,
-                    "completed_at": datetime.utcnow(),
-                    "error_message": str(e)
-                }
+                {"file_id": job.file_id, "error_message": error_message}
             )
-            db.commit()
+        db.commit()
 
-    async def queue_file_processing(self, file_id: str, content: bytes, content_type: str, domain: str, organization_id: str):
-        """Queue a file for processing by creating a job record"""
+    async def queue_file_processing(self, file_id: str, content: Optional[bytes], content_type: str, domain: str, organization_id: str,
+                                    priority_class: str = "interactive"):
+        """Queue a file for processing by creating a job record
+        
+        ``priority_class`` is one of ``PRIORITY_CLASSES``: interactive for user uploads,
+        bulk for syncs and imports, recrawl for refreshing content that is already indexed.
+        """
+        if priority_class not in self.PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class '{priority_class}'")
         db = SessionLocal()
         try:
             # Get domain_id from domain name
@@ -563,10 +1081,10 @@ class BackgroundJobProcessor:
             db.execute(
                 text("""
                     INSERT INTO file_processing_jobs (
-                        id, file_id, job_type, status, attempts, max_attempts,
+                        id, file_id, job_type, status, attempts, max_attempts, priority_class,
                         organization_id, domain_id, created_at, updated_at
                     ) VALUES (
-                        :id, :file_id, :job_type, :status, :attempts, :max_attempts,
+                        :id, :file_id, :job_type, :status, :attempts, :max_attempts, :priority_class,
                         :organization_id, :domain_id, :created_at, :updated_at
                     )
                 """),
@@ -577,6 +1095,7 @@ class BackgroundJobProcessor:
                     "status": "pending",
                     "attempts": 0,
                     "max_attempts": 3,
+                    "priority_class": priority_class,
                     "organization_id": organization_id,
                     "domain_id": domain_id,
                     "created_at": datetime.utcnow(),
@@ -584,6 +1103,12 @@ class BackgroundJobProcessor:
                 }
             )
             
+            # Wake listening workers; delivered when the transaction commits
+            db.execute(
+                text("SELECT pg_notify(:channel, :job_id)"),
+                {"channel": self.NOTIFY_CHANNEL, "job_id": job_id}
+            )
+            
             db.commit()
             logger.info(f"Queued file processing job {job_id} for file {file_id} in domain {domain}")
             return True
@@ -0,0 +1,217 @@
+"""
+Chunk Deduplication - Content-hash reuse of embeddings during ingestion
+Skips chunks that are unchanged since the last run, reuses embeddings for text the
+tenant has already embedded and drops site-wide boilerplate from scraped pages
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+
+from chunking import Block, Chunk, content_hash
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkDeduplicator:
+    """Decides which chunks of a document actually need an embedding
+
+    Boilerplate (navigation, footers) is only dropped from scraped pages. ``chunk_store``
+    holds one row per tenant, block hash and page, so a page counts once however often
+    it is recrawled and deleting the page releases its blocks. Uploaded documents are
+    never filtered: their repeated text is indexed and only its embedding is reused.
+    Embedding reuse only looks at the tenant's own rows.
+    """
+
+    def __init__(self, boilerplate_min_sources: int = 5, min_block_chars: int = 40):
+        self.boilerplate_min_sources = boilerplate_min_sources
+        self.min_block_chars = min_block_chars
+
+        self.unchanged_count = 0
+        self.reused_count = 0
+        self.embedded_count = 0
+        self.boilerplate_block_count = 0
+
+    def existing_chunks(self, db, source_id: str) -> Dict[str, int]:
+        """Chunk id -> chunk_index for rows already stored for a source"""
+        rows = db.execute(
+            text("SELECT id, chunk_index FROM embeddings WHERE source_id = :source_id"),
+            {"source_id": str(source_id)}
+        ).fetchall()
+        return {str(row.id): row.chunk_index for row in rows}
+
+    def emitted_hashes(self, db, source_id: str, before_index: int) -> List[str]:
+        """Content hashes of a source's chunks below ``before_index``, for resuming a chunk stream"""
+        # One row per position: a chunk can have a vector in more than one model
+        rows = db.execute(
+            text("""
+                SELECT DISTINCT ON (chunk_index) content_hash FROM embeddings
+                WHERE source_id = :source_id AND chunk_index < :before_index AND content_hash IS NOT NULL
+                ORDER BY chunk_index
+            """),
+            {"source_id": str(source_id), "before_index": before_index}
+        ).fetchall()
+        return [row.content_hash for row in rows]
+
+    def filter_boilerplate(self, blocks: List[Block], organization_id: str, source_id: str) -> List[Block]:
+        """Record a scraped page's blocks and drop those on many of the tenant's pages
+
+        ``source_id`` is the committed ``crawled_pages`` row; its previously recorded
+        blocks are replaced, so a recrawled page isn't counted twice.
+        """
+        hashes_by_block = {}
+        for i, block in enumerate(blocks):
+            if block.kind != 'heading' and len(block.text) >= self.min_block_chars:
+                hashes_by_block[i] = content_hash(block.text)
+
+        # Sorted so concurrent upserts lock rows in the same order
+        hashes = sorted(set(hashes_by_block.values()))
+        boilerplate = self._update_chunk_store(str(organization_id), str(source_id), hashes)
+        if not boilerplate:
+            return blocks
+
+        kept = [block for i, block in enumerate(blocks) if hashes_by_block.get(i) not in boilerplate]
+        self.boilerplate_block_count += len(blocks) - len(kept)
+        return kept
+
+    def _update_chunk_store(self, organization_id: str, source_id: str, hashes: List[str]) -> Set[str]:
+        """Replace a page's block hashes and return those that are boilerplate for the tenant
+
+        Runs in its own short transaction so hot boilerplate rows aren't locked for the
+        length of a crawl.
+        """
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("DELETE FROM chunk_store WHERE source_id = :source_id AND NOT (content_hash = ANY(:hashes))"),
+                {"source_id": source_id, "hashes": hashes}
+            )
+            if not hashes:
+                db.commit()
+                return set()
+            db.execute(
+                text("""
+                    INSERT INTO chunk_store (organization_id, content_hash, source_id, first_seen_at)
+                    SELECT :organization_id, h, :source_id, NOW() FROM unnest(CAST(:hashes AS text[])) AS h
+                    ON CONFLICT DO NOTHING
+                """),
+                {"organization_id": organization_id, "source_id": source_id, "hashes": hashes}
+            )
+            rows = db.execute(
+                text("""
+                    SELECT content_hash FROM chunk_store
+                    WHERE organization_id = :organization_id AND content_hash = ANY(:hashes)
+                    GROUP BY content_hash
+                    HAVING COUNT(*) >= :min_sources
+                """),
+                {"organization_id": organization_id, "hashes": hashes, "min_sources": self.boilerplate_min_sources}
+            ).fetchall()
+            db.commit()
+            return {row.content_hash for row in rows}
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Chunk store update failed, keeping all blocks: {e}")
+            return set()
+        finally:
+            db.close()
+
+    def plan(self, db, organization_id: str, embedding_model: Optional[str], chunks: List[Chunk],
+             existing: Dict[str, int]) -> Dict[str, Any]:
+        """Split chunks into unchanged, reusable and to-embed
+
+        Returns ``{"new": [Chunk], "reuse": {content_hash: embedding}, "unchanged": [Chunk],
+        "moved_ids": [str]}``; every chunk in ``new`` is written, those whose hash is in
+        ``reuse`` without calling the embedding model.
+        """
+        unchanged = [chunk for chunk in chunks if existing.get(chunk.id) == chunk.index]
+        new = [chunk for chunk in chunks if existing.get(chunk.id) != chunk.index]
+        # Same content at a different position: the old row has to go before the upsert
+        moved_ids = [chunk.id for chunk in new if chunk.id in existing]
+        reuse = self.reusable_embeddings(db, organization_id, embedding_model, {chunk.content_hash for chunk in new})
+
+        self.unchanged_count += len(unchanged)
+        reused = sum(1 for chunk in new if chunk.content_hash in reuse)
+        self.reused_count += reused
+        self.embedded_count += len(new) - reused
+        return {"new": new, "reuse": reuse, "unchanged": unchanged, "moved_ids": moved_ids}
+
+    def reusable_embeddings(self, db, organization_id: str, embedding_model: Optional[str], hashes: Iterable[str]) -> Dict[str, Any]:
+        """Stored embeddings for content hashes the tenant has already embedded with this model"""
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        rows = db.execute(
+            text("""
+                SELECT DISTINCT ON (content_hash) content_hash, embedding
+                FROM embeddings
+                WHERE organization_id = :organization_id
+                AND content_hash = ANY(:hashes)
+                AND embedding_model IS NOT DISTINCT FROM :embedding_model
+                AND embedding IS NOT NULL
+            """),
+            {"organization_id": str(organization_id), "hashes": hashes, "embedding_model": embedding_model}
+        ).fetchall()
+        return {row.content_hash: row.embedding for row in rows}
+
+    def remove_chunks(self, db, source_id: str, chunk_ids: List[str]) -> int:
+        """Delete specific chunk rows of a source; the caller commits"""
+        if not chunk_ids:
+            return 0
+        return db.execute(
+            text("DELETE FROM embeddings WHERE source_id = :source_id AND id::text = ANY(:chunk_ids)"),
+            {"source_id": str(source_id), "chunk_ids": list(chunk_ids)}
+        ).rowcount
+
+    def remove_stale_chunks(self, db, source_id: str, keep_ids: Iterable[str], from_index: int = 0) -> int:
+        """Delete a source's rows from ``from_index`` on that the latest run no longer produced; the caller commits
+
+        Other models' vectors of a kept chunk (same position and text) are kept too.
+        """
+        return db.execute(
+            text("""
+                DELETE FROM embeddings e
+                WHERE e.source_id = :source_id
+                AND (e.chunk_index IS NULL OR e.chunk_index >= :from_index)
+                AND NOT (e.id::text = ANY(:keep_ids))
+                AND NOT EXISTS (
+                    SELECT 1 FROM embeddings k
+                    WHERE k.source_id = e.source_id
+                    AND k.chunk_index = e.chunk_index
+                    AND k.content_hash IS NOT DISTINCT FROM e.content_hash
+                    AND k.id::text = ANY(:keep_ids)
+                )
+            """),
+            {"source_id": str(source_id), "keep_ids": list(keep_ids), "from_index": from_index}
+        ).rowcount
+
+    def get_stats(self) -> Dict:
+        """Counters for the health endpoint"""
+        total = self.unchanged_count + self.reused_count + self.embedded_count
+        return {
+            "chunks_seen": total,
+            "unchanged": self.unchanged_count,
+            "reused": self.reused_count,
+            "embedded": self.embedded_count,
+            "boilerplate_blocks_dropped": self.boilerplate_block_count,
+            "embedding_savings": round(1 - self.embedded_count / total, 3) if total else 0.0
+        }
+
+
+# Global instance
+_chunk_deduplicator: Optional[ChunkDeduplicator] = None
+
+
+def get_chunk_deduplicator() -> ChunkDeduplicator:
+    """Get the global chunk deduplicator (singleton)"""
+    global _chunk_deduplicator
+    if _chunk_deduplicator is None:
+        settings = get_settings()
+        _chunk_deduplicator = ChunkDeduplicator(
+            boilerplate_min_sources=settings.chunk_boilerplate_min_sources,
+            min_block_chars=settings.chunk_boilerplate_min_chars
+        )
+    return _chunk_deduplicator
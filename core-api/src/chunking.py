@@ -0,0 +1,497 @@
+"""
+Chunking - Structure-aware, token-sized document chunking
+Turns extracted documents into blocks (headings, paragraphs, lists, tables, code)
+and packs them into chunks sized in embedding-model tokens with stable ids
+"""
+
+import hashlib
+import logging
+import re
+import unicodedata
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+from context_packer import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Namespace for chunk ids: uuid5(source id + content hash + occurrence)
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b0e-8d4a-5e7b-9c3f-2a1d0e4b7c95")
+
+
+@dataclass
+class Block:
+    """A structural unit of a document"""
+    kind: str  # heading, paragraph, list, table, code
+    text: str
+    level: int = 0  # Heading level (1 = top)
+
+
+@dataclass
+class Chunk:
+    """A packed chunk ready to embed"""
+    id: str
+    index: int
+    text: str
+    token_count: int
+    content_hash: str
+    heading: str = ""  # Section path, e.g. "Installation > Docker"
+    kinds: List[str] = field(default_factory=list)
+
+
+def content_hash(text: str) -> str:
+    """Hash of text after Unicode (NFKC) and whitespace normalization, used for dedup"""
+    normalized = re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+# ============================================================================
+# BLOCK EXTRACTION
+# ============================================================================
+
+_MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*$')
+_NUMBERED_HEADING = re.compile(r'^(\d+(?:\.\d+)+)\.?\s+\S')
+_CAPS_HEADING = re.compile(r'^[A-Z][A-Z0-9 \-:&/,()]{3,}$')
+_LIST_ITEM = re.compile(r'^\s*(?:[-*+•‣◦]|\d{1,3}[.)]|[a-zA-Z][.)])\s+\S')
+_CODE_FENCE = re.compile(r'^\s*(```|~~~)')
+
+
+def _heading_level(line: str) -> int:
+    """Heading level of a plain-text line, 0 if it is not a heading"""
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1))
+    if len(line) > 80 or line.endswith(('.', ',', ';', ':')):
+        return 0
+    match = _NUMBERED_HEADING.match(line)
+    if match:
+        return min(match.group(1).count('.') + 1, 6)
+    if _CAPS_HEADING.match(line) and sum(c.isalpha() for c in line) >= 4:
+        return 1
+    return 0
+
+
+def _is_table_row(line: str) -> bool:
+    return line.count('|') >= 2 or line.count('\t') >= 2
+
+
+def blocks_from_text(text: str) -> List[Block]:
+    """Recover blocks from plain text (PDF pages, markdown, text files)
+
+    Hard-wrapped paragraph lines are joined; list items, table rows and fenced
+    code keep their line structure.
+    """
+    blocks: List[Block] = []
+    kind: Optional[str] = None
+    lines: List[str] = []
+
+    def flush():
+        nonlocal kind, lines
+        if kind and lines:
+            joiner = ' ' if kind == 'paragraph' else '\n'
+            content = joiner.join(lines).strip()
+            if content:
+                blocks.append(Block(kind, content))
+        kind, lines = None, []
+
+    in_code = False
+    for raw_line in text.splitlines():
+        if _CODE_FENCE.match(raw_line):
+            if in_code:
+                lines.append(raw_line)
+                flush()
+                in_code = False
+            else:
+                flush()
+                kind, lines, in_code = 'code', [raw_line], True
+            continue
+        if in_code:
+            lines.append(raw_line)
+            continue
+
+        line = raw_line.strip()
+        if not line:
+            flush()
+            continue
+
+        level = _heading_level(line)
+        if level:
+            flush()
+            match = _MARKDOWN_HEADING.match(line)
+            blocks.append(Block('heading', match.group(2) if match else line, level))
+            continue
+
+        if _LIST_ITEM.match(raw_line):
+            line_kind = 'list'
+        elif _is_table_row(raw_line):
+            line_kind = 'table'
+        elif kind == 'list' and raw_line[:1].isspace():
+            line_kind = 'list'  # Indented continuation of a list item
+        else:
+            line_kind = 'paragraph'
+
+        if line_kind != kind:
+            flush()
+            kind = line_kind
+        lines.append(raw_line.rstrip() if line_kind in ('table', 'list') else line)
+
+    flush()
+    return blocks
+
+
+def blocks_from_docx(document) -> List[Block]:
+    """Blocks from a python-docx Document, using paragraph styles and tables in body order"""
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    blocks: List[Block] = []
+    list_items: List[str] = []
+
+    def flush_list():
+        if list_items:
+            blocks.append(Block('list', '\n'.join(f"- {item}" for item in list_items)))
+            list_items.clear()
+
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'tbl':
+            flush_list()
+            rows = []
+            for row in Table(element, document).rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                if any(cells):
+                    rows.append(' | '.join(cells))
+            if rows:
+                blocks.append(Block('table', '\n'.join(rows)))
+            continue
+        if tag != 'p':
+            continue
+
+        paragraph = Paragraph(element, document)
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = (paragraph.style.name if paragraph.style is not None else '') or ''
+
+        if style.startswith('List'):
+            list_items.append(text)
+            continue
+        flush_list()
+        if style == 'Title':
+            blocks.append(Block('heading', text, 1))
+        elif style.startswith('Heading'):
+            level = style.replace('Heading', '').strip()
+            blocks.append(Block('heading', text, int(level) if level.isdigit() else 1))
+        else:
+            blocks.append(Block('paragraph', text))
+
+    flush_list()
+    return blocks
+
+
+_HTML_SKIP = {'script', 'style', 'nav', 'header', 'footer', 'aside', 'noscript', 'form', 'svg'}
+_HTML_HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+
+def blocks_from_html(element) -> List[Block]:
+    """Blocks from a BeautifulSoup element (headings, paragraphs, lists, tables, pre)"""
+    from bs4 import NavigableString, Tag
+
+    blocks: List[Block] = []
+
+    def clean(text: str) -> str:
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                text = clean(str(child))
+                if text and child.__class__ is NavigableString:
+                    blocks.append(Block('paragraph', text))
+                continue
+            if not isinstance(child, Tag) or child.name in _HTML_SKIP:
+                continue
+
+            name = child.name
+            if name in _HTML_HEADINGS:
+                text = clean(child.get_text(' '))
+                if text:
+                    blocks.append(Block('heading', text, _HTML_HEADINGS[name]))
+            elif name in ('p', 'blockquote', 'dd', 'dt', 'figcaption'):
+                text = clean(child.get_text(' '))
+                if text:
+                    blocks.append(Block('paragraph', text))
+            elif name in ('ul', 'ol'):
+                items = [clean(li.get_text(' ')) for li in child.find_all('li', recursive=False)]
+                items = [item for item in items if item]
+                if items:
+                    blocks.append(Block('list', '\n'.join(f"- {item}" for item in items)))
+            elif name == 'table':
+                rows = []
+                for tr in child.find_all('tr'):
+                    cells = [clean(cell.get_text(' ')) for cell in tr.find_all(['th', 'td'])]
+                    if any(cells):
+                        rows.append(' | '.join(cells))
+                if rows:
+                    blocks.append(Block('table', '\n'.join(rows)))
+            elif name == 'pre':
+                text = child.get_text().strip('\n')
+                if text.strip():
+                    blocks.append(Block('code', text))
+            else:
+                walk(child)
+
+    walk(element)
+
+    # Inline text split across sibling nodes arrives as many tiny paragraphs; merge runs of them
+    merged: List[Block] = []
+    for block in blocks:
+        if (block.kind == 'paragraph' and merged and merged[-1].kind == 'paragraph'
+                and len(block.text) < 80 and not merged[-1].text.endswith(('.', '!', '?', ':'))):
+            merged[-1] = Block('paragraph', f"{merged[-1].text} {block.text}")
+        else:
+            merged.append(block)
+    return merged
+
+
+def blocks_to_text(blocks: Iterable[Block]) -> str:
+    """Render blocks as markdown-style text that ``blocks_from_text`` reads back"""
+    parts = []
+    for block in blocks:
+        if block.kind == 'heading':
+            parts.append(f"{'#' * max(1, block.level)} {block.text}")
+        elif block.kind == 'code' and not _CODE_FENCE.match(block.text):
+            parts.append(f"```\n{block.text}\n```")
+        else:
+            parts.append(block.text)
+    return '\n\n'.join(parts)
+
+
+# ============================================================================
+# PACKING
+# ============================================================================
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+class StructuredChunker:
+    """Packs blocks into chunks of at most ``max_tokens`` embedding-model tokens
+
+    Blocks are only split when a single block is over budget (paragraphs at sentence
+    ends, lists / tables / code at line ends, tables repeat their header row). A new
+    heading closes the current chunk once it holds ``min_tokens``; chunks that start
+    mid-section are prefixed with the section heading.
+    """
+
+    def __init__(self, max_tokens: int = 384, min_tokens: int = 64, tokenizer_name: str = "", max_heading_tokens: int = 32):
+        self.max_tokens = max(16, max_tokens)
+        self.min_tokens = min(min_tokens, self.max_tokens // 2)
+        self.max_heading_tokens = max_heading_tokens
+        self.counter = TokenCounter(tokenizer_name)
+
+    def chunk(self, blocks: Iterable[Block], source_id: str = "") -> List[Chunk]:
+        """Chunk a whole document"""
+        stream = self.stream(source_id)
+        return stream.feed(blocks) + stream.finish()
+
+    def stream(self, source_id: str = "") -> "ChunkStream":
+        """Incremental chunker for documents that arrive a piece at a time"""
+        return ChunkStream(self, source_id)
+
+    def split_block(self, block: Block, token_count: int) -> List[Tuple[Block, int]]:
+        """Split an over-budget block into pieces that each fit the budget"""
+        if token_count <= self.max_tokens:
+            return [(block, token_count)]
+
+        if block.kind == 'paragraph':
+            units = [unit for unit in _SENTENCE_END.split(block.text) if unit.strip()]
+            joiner, header = ' ', None
+        else:
+            units = block.text.split('\n')
+            joiner = '\n'
+            header = units[0] if block.kind == 'table' and len(units) > 1 else None
+            if header is not None:
+                units = units[1:]
+
+        header_tokens = self.counter.count(header) if header else 0
+        pieces: List[Tuple[Block, int]] = []
+        current: List[str] = []
+        current_tokens = header_tokens
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                lines = ([header] if header else []) + current
+                pieces.append((Block(block.kind, joiner.join(lines), block.level), current_tokens))
+            current, current_tokens = [], header_tokens
+
+        for unit in units:
+            unit_tokens = self.counter.count(unit)
+            if header_tokens + unit_tokens > self.max_tokens:
+                flush()
+                for piece in self._hard_split(unit, self.max_tokens - header_tokens):
+                    pieces.append((Block(block.kind, joiner.join(([header] if header else []) + [piece]), block.level),
+                                   header_tokens + self.counter.count(piece)))
+                continue
+            if current and current_tokens + unit_tokens > self.max_tokens:
+                flush()
+            current.append(unit)
+            current_tokens += unit_tokens
+        flush()
+        return pieces
+
+    def _hard_split(self, text: str, max_tokens: int) -> List[str]:
+        """Last resort for a single sentence / line over budget: cut at whitespace"""
+        max_tokens = max(1, max_tokens)
+        words = text.split()
+        pieces = []
+        step = max(1, int(len(words) * max_tokens / max(1, self.counter.count(text))))
+        start = 0
+        while start < len(words):
+            size = step
+            while True:
+                piece = ' '.join(words[start:start + size])
+                if size == 1 or self.counter.count(piece) <= max_tokens:
+                    break
+                size = max(1, size * 3 // 4)
+            pieces.append(piece)
+            start += size
+        return pieces
+
+
+class ChunkStream:
+    """Stateful packer: ``feed()`` returns chunks as they complete, ``finish()`` the rest"""
+
+    def __init__(self, chunker: StructuredChunker, source_id: str = ""):
+        self.chunker = chunker
+        self.source_id = source_id
+        self.index = 0
+        self._parts: List[Tuple[str, str]] = []  # (kind, text)
+        self._tokens = 0
+        self._has_content = False
+        self._headings: List[Tuple[int, str]] = []  # Open section path
+        self._chunk_heading = ""
+        self._occurrences: Dict[str, int] = {}
+
+    def feed(self, blocks: Iterable[Block]) -> List[Chunk]:
+        """Add blocks; returns the chunks completed by them"""
+        completed: List[Chunk] = []
+        counter = self.chunker.counter
+
+        for block in blocks:
+            text = block.text.strip() if block.kind != 'code' else block.text
+            if not text.strip():
+                continue
+
+            if block.kind == 'heading':
+                if self._has_content and self._tokens >= self.chunker.min_tokens:
+                    completed.extend(self._emit())
+                level = block.level or 1
+                while self._headings and self._headings[-1][0] >= level:
+                    self._headings.pop()
+                heading = counter.truncate(text, self.chunker.max_heading_tokens)
+                self._headings.append((level, heading))
+                heading_tokens = counter.count(heading)
+                if self._tokens + heading_tokens > self.chunker.max_tokens:
+                    completed.extend(self._emit())
+                if not self._parts:
+                    self._chunk_heading = self._section_path()
+                self._parts.append(('heading', heading))
+                self._tokens += heading_tokens
+                continue
+
+            for piece, piece_tokens in self.chunker.split_block(Block(block.kind, text, block.level), counter.count(text)):
+                if self._has_content and self._tokens + piece_tokens > self.chunker.max_tokens:
+                    completed.extend(self._emit())
+                if not self._parts and self._headings:
+                    # Starting mid-section: carry the section heading for context
+                    heading = self._headings[-1][1]
+                    heading_tokens = counter.count(heading)
+                    if heading_tokens + piece_tokens <= self.chunker.max_tokens:
+                        self._parts.append(('heading', heading))
+                        self._tokens += heading_tokens
+                    self._chunk_heading = self._section_path()
+                elif not self._parts:
+                    self._chunk_heading = ""
+                self._parts.append((piece.kind, piece.text))
+                self._tokens += piece_tokens
+                self._has_content = True
+
+        return completed
+
+    def finish(self) -> List[Chunk]:
+        """Emit whatever is still buffered"""
+        return self._emit() if self._parts else []
+
+    def get_state(self) -> Dict:
+        """JSON-serializable state for resuming after ``feed()`` (occurrence counts excluded)"""
+        return {
+            "index": self.index,
+            "parts": [list(part) for part in self._parts],
+            "tokens": self._tokens,
+            "has_content": self._has_content,
+            "headings": [list(heading) for heading in self._headings],
+            "chunk_heading": self._chunk_heading
+        }
+
+    def restore(self, state: Dict, emitted_hashes: Iterable[str] = ()):
+        """Resume from ``get_state()``; ``emitted_hashes`` are the hashes of chunks already emitted"""
+        self.index = state.get("index", 0)
+        self._parts = [tuple(part) for part in state.get("parts", [])]
+        self._tokens = state.get("tokens", 0)
+        self._has_content = state.get("has_content", False)
+        self._headings = [tuple(heading) for heading in state.get("headings", [])]
+        self._chunk_heading = state.get("chunk_heading", "")
+        self._occurrences = {}
+        for chunk_hash in emitted_hashes:
+            self._occurrences[chunk_hash] = self._occurrences.get(chunk_hash, 0) + 1
+
+    def _section_path(self) -> str:
+        return " > ".join(heading for _, heading in self._headings)
+
+    def _emit(self) -> List[Chunk]:
+        if not self._parts:
+            return []
+        text = "\n\n".join(part_text for _, part_text in self._parts)
+        kinds = sorted({kind for kind, _ in self._parts})
+        chunk_hash = content_hash(text)
+
+        # Identical text can repeat within a document; number the repeats to keep ids unique
+        occurrence = self._occurrences.get(chunk_hash, 0)
+        self._occurrences[chunk_hash] = occurrence + 1
+        chunk_id = str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{self.source_id}:{chunk_hash}:{occurrence}"))
+
+        chunk = Chunk(
+            id=chunk_id,
+            index=self.index,
+            text=text,
+            token_count=self._tokens,
+            content_hash=chunk_hash,
+            heading=self._chunk_heading,
+            kinds=kinds
+        )
+        self.index += 1
+        self._parts = []
+        self._tokens = 0
+        self._has_content = False
+        self._chunk_heading = ""
+        return [chunk]
+
+
+# Global instance
+_chunker: Optional[StructuredChunker] = None
+
+
+def get_chunker() -> StructuredChunker:
+    """Get the global document chunker (singleton)"""
+    global _chunker
+    if _chunker is None:
+        settings = get_settings()
+        _chunker = StructuredChunker(
+            max_tokens=settings.chunk_max_tokens,
+            min_tokens=settings.chunk_min_tokens,
+            tokenizer_name=settings.chunk_tokenizer
+        )
+    return _chunker
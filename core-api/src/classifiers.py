@@ -6,14 +6,69 @@ Provides sophisticated intent detection for queries with multi-tenant isolation
 
 import re
 import json
+import time
 import uuid
+import asyncio
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from config import get_settings
+from telemetry_writer import get_telemetry_writer
+
+
+class KeywordMatcher:
+    """Keyword tables per category, matched with plain substring checks
+
+    For short queries and a few dozen keywords the C-level ``in`` checks beat any
+    automaton written in Python, so this only lowercases the tables once.
+    """
+
+    def __init__(self, keywords_by_category: Dict[str, List[str]]):
+        self.keywords_by_category = {
+            category: [keyword.lower() for keyword in keywords if keyword]
+            for category, keywords in keywords_by_category.items()
+        }
+
+    def match_categories(self, text: str) -> Dict[str, List[str]]:
+        """Matched keywords per category (text already lowercased), in the order they were declared"""
+        hits: Dict[str, List[str]] = {}
+        for category, keywords in self.keywords_by_category.items():
+            matched = [keyword for keyword in keywords if keyword in text]
+            if matched:
+                hits[category] = matched
+        return hits
+
+
+class PatternMatcher:
+    """Category regex patterns compiled once, with their leading and trailing ``.*`` removed
+
+    Those wildcards never change whether ``re.search`` finds a pattern, but they make
+    it backtrack over the whole text; searching without them is several times faster.
+    """
+
+    def __init__(self, patterns_by_category: Dict[str, List[str]]):
+        self.compiled_by_category: Dict[str, List[Tuple[str, "re.Pattern"]]] = {}
+        for category, patterns in patterns_by_category.items():
+            compiled = []
+            for pattern in patterns:
+                core = re.sub(r'^(?:\.\*)+|(?:\.\*)+$', '', pattern) or pattern
+                compiled.append((pattern, re.compile(core)))
+            self.compiled_by_category[category] = compiled
+
+    def match_categories(self, text: str) -> Dict[str, List[str]]:
+        """Matched patterns per category, in the order they were declared"""
+        hits: Dict[str, List[str]] = {}
+        for category, compiled in self.compiled_by_category.items():
+            matched = [pattern for pattern, regex in compiled if regex.search(text)]
+            if matched:
+                hits[category] = matched
+        return hits
+
 
 @dataclass
 class ClassificationResult:
@@ -25,6 +80,211 @@ class ClassificationResult:
     metadata: Dict
 
 
+class EmbeddingCentroidClassifier:
+    """Scores a query embedding against per-intent and per-domain centroids
+
+    Intent centroids are built once, in the background, from labeled example queries
+    embedded with the current embedding model; until then intent classification is
+    skipped. Domain centroids come from each organization's ingested document
+    embeddings and are cached, so classifying a query makes no model calls.
+    """
+
+    def __init__(
+        self,
+        intent_examples: Dict[str, List[str]],
+        min_margin: float = 0.05,
+        min_similarity: float = 0.2,
+        cache_ttl_seconds: float = 600.0,
+        retry_interval: float = 30.0,
+        enabled: bool = True
+    ):
+        self.intent_examples = intent_examples
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+        self.cache_ttl_seconds = cache_ttl_seconds  # Domain centroids only; intent centroids never expire
+        self.retry_interval = retry_interval
+        self.enabled = enabled
+        self.embed_texts = None  # async (model, texts) -> vectors; None = embedding_migrator.embed_texts
+
+        self._intent_centroids: Optional[Dict[str, np.ndarray]] = None
+        self._intent_model: Optional[str] = None
+        self._build_task: Optional[asyncio.Task] = None
+        self._domain_centroids: Dict[Tuple[str, str], Tuple[float, Dict[str, np.ndarray]]] = {}
+        self._domain_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def start_background_build(self, embedding_model: str):
+        """Build the intent centroids in the background (no-op if built or already building)"""
+        if not self.enabled or self._intent_model == embedding_model:
+            return
+        if self._build_task is None or self._build_task.done():
+            self._build_task = asyncio.get_running_loop().create_task(self._build_intent_centroids(embedding_model))
+
+    async def stop_background_build(self):
+        """Cancel a build that is still waiting for the embedding model"""
+        if self._build_task and not self._build_task.done():
+            self._build_task.cancel()
+            try:
+                await self._build_task
+            except asyncio.CancelledError:
+                pass
+        self._build_task = None
+
+    async def _build_intent_centroids(self, embedding_model: str):
+        """Embed every example in one batch with exactly ``embedding_model``, retrying until it answers"""
+        embed_texts = self.embed_texts
+        if embed_texts is None:
+            from embedding_migrator import embed_texts
+
+        labels = [intent for intent, examples in self.intent_examples.items() for _ in examples]
+        examples = [example for intent_examples in self.intent_examples.values() for example in intent_examples]
+        while True:
+            try:
+                vectors = await embed_texts(embedding_model, examples)
+                vectors_by_intent: Dict[str, List[np.ndarray]] = {}
+                for intent, vector in zip(labels, vectors):
+                    normalized = self._normalize(vector)
+                    if normalized is not None:
+                        vectors_by_intent.setdefault(intent, []).append(normalized)
+                self._intent_centroids = {
+                    intent: self._normalize(np.mean(intent_vectors, axis=0))
+                    for intent, intent_vectors in vectors_by_intent.items()
+                }
+                self._intent_model = embedding_model
+                print(f"Built intent centroids for {len(self._intent_centroids)} intents with {embedding_model}")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Failed to build intent centroids with {embedding_model}, retrying in {self.retry_interval}s: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    async def _get_domain_centroids(self, organization_id: str, embedding_model: Optional[str]) -> Dict[str, np.ndarray]:
+        key = (organization_id, embedding_model or "")
+        cached = self._domain_centroids.get(key)
+        if cached and time.monotonic() - cached[0] < self.cache_ttl_seconds:
+            return cached[1]
+
+        lock = self._domain_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._domain_centroids.get(key)
+            if cached and time.monotonic() - cached[0] < self.cache_ttl_seconds:
+                return cached[1]
+            # The fetch and JSON decoding of up to 2000 vectors stay off the event loop
+            centroids = await asyncio.get_running_loop().run_in_executor(
+                None, self._load_domain_centroids, organization_id, embedding_model
+            )
+            if centroids is None:
+                centroids = cached[1] if cached else {}
+            self._domain_centroids[key] = (time.monotonic(), centroids)
+        return centroids
+
+    def _load_domain_centroids(self, organization_id: str, embedding_model: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+        from database import SessionLocal
+        from embedding_migrator import MIGRATABLE_ROW_SQL, get_active_embedding_model
+
+        db = SessionLocal()
+        try:
+            if embedding_model is None:
+                embedding_model = get_active_embedding_model(db, organization_id)
+            # Only document chunks of the query's model: another model's vectors share no space with it
+            rows = db.execute(
+                text(f"""
+                    SELECT od.domain_name, e.embedding
+                    FROM embeddings e
+                    JOIN organization_domains od ON e.domain_id = od.id
+                    WHERE e.organization_id = :organization_id
+                    AND e.embedding_model = :embedding_model
+                    AND {MIGRATABLE_ROW_SQL}
+                    ORDER BY e.created_at DESC
+                    LIMIT 2000
+                """),
+                {"organization_id": organization_id, "embedding_model": embedding_model}
+            ).fetchall()
+
+            vectors_by_domain: Dict[str, List[np.ndarray]] = {}
+            for row in rows:
+                embedding = json.loads(row.embedding) if isinstance(row.embedding, str) else row.embedding
+                vector = self._normalize(embedding) if embedding is not None else None
+                if vector is not None:
+                    vectors_by_domain.setdefault(row.domain_name, []).append(vector)
+
+            return {
+                domain: self._normalize(np.mean(vectors, axis=0))
+                for domain, vectors in vectors_by_domain.items()
+            }
+        except Exception as e:
+            print(f"Failed to build domain centroids: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _rank(self, query_embedding, centroids: Dict[str, np.ndarray]) -> List[Tuple[str, float]]:
+        query_vector = self._normalize(query_embedding)
+        if query_vector is None or not centroids:
+            return []
+        labels = [label for label, centroid in centroids.items() if centroid is not None and centroid.shape == query_vector.shape]
+        if not labels:
+            return []
+        scores = np.stack([centroids[label] for label in labels]) @ query_vector
+        return sorted(zip(labels, scores.tolist()), key=lambda item: item[1], reverse=True)
+
+    def _is_confident(self, ranked: List[Tuple[str, float]]) -> bool:
+        if not ranked or ranked[0][1] < self.min_similarity:
+            return False
+        margin = ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        return margin >= self.min_margin
+
+    def confidence_for_margin(self, margin: float) -> float:
+        """Map a centroid margin to a confidence: ``min_margin`` gives 0.5, each further 0.1 adds 0.2
+
+        A bare pass of the margin check stays well below the 0.7 that triggers agent
+        workflows; only clearly separated intents reach it.
+        """
+        return min(0.5 + max(margin - self.min_margin, 0.0) * 2, 0.95)
+
+    async def classify_intent(self, query_embedding, embedding_model: str) -> Tuple[Optional[ClassificationResult], List[Tuple[str, float]]]:
+        """Intent from the nearest centroid, or None when the margin is too small or centroids aren't built yet
+
+        ``embedding_model`` is the model ``query_embedding`` came from; centroids of another model aren't comparable.
+        """
+        if self._intent_model != embedding_model:
+            self.start_background_build(embedding_model)
+            return None, []
+        ranked = self._rank(query_embedding, self._intent_centroids or {})
+        if not self._is_confident(ranked):
+            return None, ranked
+
+        best_intent, best_score = ranked[0]
+        margin = best_score - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        return ClassificationResult(
+            intent=best_intent,
+            confidence=self.confidence_for_margin(margin),
+            reasoning=f"Nearest intent centroid (similarity {best_score:.2f}, margin {margin:.2f})",
+            method="embedding",
+            metadata={"intent_scores": {intent: round(score, 4) for intent, score in ranked}}
+        ), ranked
+
+    async def classify_domain(self, query_embedding, organization_id: str, embedding_model: Optional[str] = None) -> Optional[Dict]:
+        """Nearest domain centroid for an organization, or None when the margin is too small
+
+        ``embedding_model`` is the model ``query_embedding`` came from (None: the tenant's active model).
+        """
+        ranked = self._rank(query_embedding, await self._get_domain_centroids(organization_id, embedding_model))
+        if not self._is_confident(ranked):
+            return None
+        return {
+            "domain": ranked[0][0],
+            "similarity": round(ranked[0][1], 4),
+            "domain_scores": {domain: round(score, 4) for domain, score in ranked}
+        }
+
+
 class IntentClassifier:
     """Advanced intent classification with multiple methods and multi-tenant isolation"""
     
@@ -101,6 +361,66 @@ class IntentClassifier:
                 ]
             }
         }
+        
+        # Conversation context indicators per intent
+        self.context_indicators = {
+            "bug_report": ["error", "problem", "issue", "bug"],
+            "feature_request": ["feature", "add", "new", "enhancement"],
+            "training": ["how", "help", "tutorial", "guide"],
+            "general_query": ["what", "when", "where", "info"]
+        }
+        
+        # Labeled example queries for the embedding-centroid classifier
+        self.intent_examples = {
+            "bug_report": [
+                "I'm getting an error when I try to save",
+                "the app crashes on startup",
+                "login is not working after the update",
+                "the export fails with an exception",
+                "numbers in the report are wrong"
+            ],
+            "feature_request": [
+                "can you add dark mode",
+                "it would be great to export to excel",
+                "please add support for single sign-on",
+                "we need a way to schedule reports",
+                "suggestion: bulk edit for users"
+            ],
+            "training": [
+                "how do I create a job template",
+                "show me how to configure notifications",
+                "what are the steps to clone a job",
+                "guide for setting up a new workflow",
+                "how to install the desktop client"
+            ],
+            "general_query": [
+                "what is the refund policy",
+                "tell me about the pricing plans",
+                "who is the account manager",
+                "when is the next release",
+                "what's the status of my order"
+            ]
+        }
+        
+        settings = get_settings()
+        self.centroid_classifier = EmbeddingCentroidClassifier(
+            self.intent_examples,
+            min_margin=settings.classifier_min_margin,
+            cache_ttl_seconds=settings.classifier_centroid_ttl,
+            enabled=settings.classifier_use_embeddings
+        )
+        
+        self.rebuild_matchers()
+    
+    def rebuild_matchers(self):
+        """Compile keyword and pattern tables; call again after changing intent_patterns"""
+        self.keyword_matcher = KeywordMatcher(
+            {intent: data["keywords"] for intent, data in self.intent_patterns.items()}
+        )
+        self.pattern_matcher = PatternMatcher(
+            {intent: data["patterns"] for intent, data in self.intent_patterns.items()}
+        )
+        self.context_matcher = KeywordMatcher(self.context_indicators)
     
     async def classify_query(
         self,
@@ -108,7 +428,9 @@ class IntentClassifier:
         organization_id: str,
         domain: str = "general",
         context: Optional[Dict] = None,
-        db: Optional[Session] = None
+        db: Optional[Session] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        embedding_model: Optional[str] = None
     ) -> ClassificationResult:
         """
         Classify query intent with multi-tenant isolation
@@ -119,6 +441,8 @@ class IntentClassifier:
             organization_id: Organization ID for multi-tenant isolation
             context: Additional context for classification
             db: Database session for storing results
+            query_embedding: Retrieval embedding of the query, enables centroid classification
+            embedding_model: Model the query embedding came from (None: the tenant's active model)
             
         Returns:
             ClassificationResult with intent, confidence, and reasoning
@@ -132,15 +456,47 @@ class IntentClassifier:
                 metadata={}
             )
         
+        final_result = None
+        intent_ranking: List[Tuple[str, float]] = []
+        if query_embedding is not None and self.centroid_classifier.enabled:
+            final_result, intent_ranking = await self.centroid_classifier.classify_intent(
+                query_embedding, embedding_model or get_settings().embedding_current_model
+            )
+        
+        if final_result is None:
+            # Low centroid margin (or no embedding) - fall back to the keyword methods
+            final_result = self._classify_by_text(query, domain, context)
+            if intent_ranking:
+                final_result.metadata["intent_scores"] = {intent: round(score, 4) for intent, score in intent_ranking}
+        
+        if query_embedding is not None and self.centroid_classifier.enabled:
+            domain_match = await self.centroid_classifier.classify_domain(query_embedding, organization_id, embedding_model)
+            if domain_match:
+                final_result.metadata["suggested_domain"] = domain_match["domain"]
+                final_result.metadata["domain_scores"] = domain_match["domain_scores"]
+        
+        # Store classification result with organization context
+        if db:
+            await self._store_classification(
+                db, query, final_result, domain, organization_id, 
+                context.get("user_id") if context else None,
+                context.get("session_id") if context else None
+            )
+        
+        return final_result
+    
+    def _classify_by_text(self, query: str, domain: str, context: Optional[Dict]) -> ClassificationResult:
+        """Keyword, pattern, context and domain classification combined"""
         # Perform multi-method classification
         results = []
+        query_lower = query.lower()
         
         # Method 1: Keyword-based classification
-        keyword_result = self._classify_by_keywords(query)
+        keyword_result = self._classify_by_keywords(query_lower)
         results.append((keyword_result, 0.3))
         
         # Method 2: Pattern-based classification
-        pattern_result = self._classify_by_patterns(query)
+        pattern_result = self._classify_by_patterns(query_lower)
         results.append((pattern_result, 0.4))
         
         # Method 3: Context-based classification
@@ -153,34 +509,15 @@ class IntentClassifier:
         results.append((domain_result, 0.1))
         
         # Combine results
-        final_result = self._combine_results(results)
-        
-        # Store classification result with organization context
-        if db:
-            await self._store_classification(
-                db, query, final_result, domain, organization_id, 
-                context.get("user_id") if context else None,
-                context.get("session_id") if context else None
-            )
-        
-        return final_result
+        return self._combine_results(results)
     
-    def _classify_by_keywords(self, query: str) -> ClassificationResult:
-        """Classify based on keyword matching"""
-        query_lower = query.lower()
+    def _classify_by_keywords(self, query_lower: str) -> ClassificationResult:
+        """Classify based on keyword matching (expects lowercased text)"""
         scores = {}
         
-        for intent, data in self.intent_patterns.items():
-            score = 0
-            matched_keywords = []
-            
-            for keyword in data["keywords"]:
-                if keyword in query_lower:
-                    score += 1
-                    matched_keywords.append(keyword)
-            
-            if score > 0:
-                confidence = min(score / len(data["keywords"]), 1.0)
+        for intent, matched_keywords in self.keyword_matcher.match_categories(query_lower).items():
+            if matched_keywords:
+                confidence = min(len(matched_keywords) / len(self.intent_patterns[intent]["keywords"]), 1.0)
                 scores[intent] = {
                     "confidence": confidence,
                     "matched_keywords": matched_keywords
@@ -206,20 +543,13 @@ class IntentClassifier:
             metadata={"matched_keywords": best_score["matched_keywords"]}
         )
     
-    def _classify_by_patterns(self, query: str) -> ClassificationResult:
-        """Classify based on regex pattern matching"""
-        query_lower = query.lower()
+    def _classify_by_patterns(self, query_lower: str) -> ClassificationResult:
+        """Classify based on regex pattern matching (expects lowercased text)"""
         scores = {}
         
-        for intent, data in self.intent_patterns.items():
-            matched_patterns = []
-            
-            for pattern in data["patterns"]:
-                if re.search(pattern, query_lower):
-                    matched_patterns.append(pattern)
-            
+        for intent, matched_patterns in self.pattern_matcher.match_categories(query_lower).items():
             if matched_patterns:
-                confidence = min(len(matched_patterns) / len(data["patterns"]), 1.0)
+                confidence = min(len(matched_patterns) / len(self.intent_patterns[intent]["patterns"]), 1.0)
                 scores[intent] = {
                     "confidence": confidence,
                     "matched_patterns": matched_patterns
@@ -258,22 +588,15 @@ class IntentClassifier:
         
         # Analyze recent messages for context clues
         recent_messages = context.get("recent_messages", [])
-        context_indicators = {
-            "bug_report": ["error", "problem", "issue", "bug"],
-            "feature_request": ["feature", "add", "new", "enhancement"],
-            "training": ["how", "help", "tutorial", "guide"],
-            "general_query": ["what", "when", "where", "info"]
-        }
+        
+        matched_by_intent: Dict[str, List[str]] = {}
+        for message in recent_messages[-3:]:  # Last 3 messages
+            content = message.get("content", "").lower()
+            for intent, indicators in self.context_matcher.match_categories(content).items():
+                matched_by_intent.setdefault(intent, []).extend(indicators)
         
         scores = {}
-        for intent, indicators in context_indicators.items():
-            matched_indicators = []
-            for message in recent_messages[-3:]:  # Last 3 messages
-                content = message.get("content", "").lower()
-                for indicator in indicators:
-                    if indicator in content:
-                        matched_indicators.append(indicator)
-            
+        for intent, matched_indicators in matched_by_intent.items():
             if matched_indicators:
                 confidence = min(len(matched_indicators) / 5, 0.8)  # Cap at 0.8 for context
                 scores[intent] = {
@@ -399,53 +722,21 @@ class IntentClassifier:
         user_id: Optional[str] = None,
         session_id: Optional[str] = None
     ):
-        """Store classification result in database with organization context"""
-        try:
-            # Get domain_id from domain name
-            domain_result = db.execute(
-                text("""
-                    SELECT id FROM organization_domains 
-                    WHERE organization_id = :organization_id AND domain_name = :domain_name AND is_active = true
-                """),
-                {"organization_id": organization_id, "domain_name": domain}
-            ).fetchone()
-            
-            if not domain_result:
-                print(f"Warning: Domain '{domain}' not found for organization {organization_id}")
-                return
-            
-            domain_id = str(domain_result.id)
-            
-            classification_id = str(uuid.uuid4())
-            db.execute(
-                text("""
-                    INSERT INTO classification_results (
-                        id, query, intent, confidence, domain_id, organization_id, classification_method,
-                        reasoning, metadata, user_id, session_id, created_at
-                    ) VALUES (
-                        :id, :query, :intent, :confidence, :domain_id, :organization_id, :method,
-                        :reasoning, :metadata, :user_id, :session_id, :created_at
-                    )
-                """),
-                {
-                    "id": classification_id,
-                    "query": query,
-                    "intent": result.intent,
-                    "confidence": result.confidence,
-                    "domain_id": domain_id,
-                    "organization_id": organization_id,
-                    "method": result.method,
-                    "reasoning": result.reasoning,
-                    "metadata": json.dumps(result.metadata),
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "created_at": datetime.utcnow()
-                }
-            )
-            db.commit()
-        except Exception as e:
-            print(f"Failed to store classification result: {e}")
-            db.rollback()
+        """Queue classification result for the batched telemetry writer (no DB work on the request path)"""
+        get_telemetry_writer().record("classification_results", {
+            "id": str(uuid.uuid4()),
+            "query": query,
+            "intent": result.intent,
+            "confidence": result.confidence,
+            "domain": domain,
+            "organization_id": organization_id,
+            "classification_method": result.method,
+            "reasoning": result.reasoning,
+            "metadata": json.dumps(result.metadata),
+            "user_id": user_id,
+            "session_id": session_id,
+            "created_at": datetime.utcnow()
+        })
     
     async def get_classification_analytics(
         self,
@@ -536,14 +827,28 @@ class DomainClassifier:
     """Domain-specific classification"""
     
     def __init__(self):
-        self.domain_patterns = {}
+        self.domain_patterns = {}  # domain -> list of keywords
+        self.rebuild_matchers()
+    
+    def rebuild_matchers(self):
+        """Compile domain keyword tables; call again after changing domain_patterns"""
+        self.keyword_matcher = KeywordMatcher(self.domain_patterns)
     
     def classify_domain(self, query: str) -> Dict:
         """Classify query domain"""
+        hits = self.keyword_matcher.match_categories(query.lower())
+        if not hits:
+            return {
+                "domain": "general",
+                "confidence": 0.5,
+                "reasoning": "No domain keywords matched"
+            }
+        
+        best_domain = max(hits, key=lambda domain: len(hits[domain]) / len(self.domain_patterns[domain]))
         return {
-            "domain": "general",
-            "confidence": 0.5,
-            "reasoning": "Mock implementation"
+            "domain": best_domain,
+            "confidence": min(0.5 + 0.1 * len(hits[best_domain]), 0.95),
+            "reasoning": f"Domain keywords matched: {', '.join(hits[best_domain])}"
         }
 
 
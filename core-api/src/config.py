@@ -25,6 +25,47 @@ class Settings:
         # LLM settings
         self.ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
         self.openai_api_key = os.getenv('OPENAI_API_KEY', '')
+        self.ollama_generation_urls = os.getenv('OLLAMA_GENERATION_URLS', '')  # Comma-separated hosts for chat generation
+        self.llm_hedge_enabled = os.getenv('LLM_HEDGE_ENABLED', 'true').lower() == 'true'
+        self.llm_hedge_min_delay_ms = int(os.getenv('LLM_HEDGE_MIN_DELAY_MS', '2000'))  # Never hedge earlier than this
+        self.llm_request_timeout = float(os.getenv('LLM_REQUEST_TIMEOUT', '30'))  # Per-call deadline (seconds)
+        self.llm_connect_timeout = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+        self.llm_max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+        self.llm_max_keepalive_connections = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+        self.llm_max_concurrent_generations = int(os.getenv('LLM_MAX_CONCURRENT_GENERATIONS', '2'))
+        self.llm_queue_max_wait = float(os.getenv('LLM_QUEUE_MAX_WAIT', '10'))  # Shed to template beyond this wait
+        self.llm_generation_weight_ttl = float(os.getenv('LLM_GENERATION_WEIGHT_TTL', '60'))  # Seconds between reloads of organizations.generation_weight
+        self.llm_probe_interval = float(os.getenv('LLM_PROBE_INTERVAL', '30'))  # Seconds between background model probes
+        self.llm_tokenizer = os.getenv('LLM_TOKENIZER', '')  # Hugging Face id of the chat model's tokenizer; empty = estimate from length
+        self.llm_context_token_budget = int(os.getenv('LLM_CONTEXT_TOKEN_BUDGET', '1500'))  # Retrieved context
+        self.llm_prompt_token_budget = int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', '1700'))  # Whole prompt; leaves room for the answer in a 2k window
+        
+        # Model residency settings
+        self.ollama_chat_keep_alive = os.getenv('OLLAMA_CHAT_KEEP_ALIVE', '30m')
+        self.ollama_vision_keep_alive = os.getenv('OLLAMA_VISION_KEEP_ALIVE', '2m')  # Heavy, used in bursts by the scraper
+        self.ollama_embedding_keep_alive = os.getenv('OLLAMA_EMBEDDING_KEEP_ALIVE', '30m')
+        self.ollama_warm_roles = os.getenv('OLLAMA_WARM_ROLES', 'chat,embedding')
+        self.ollama_warm_interval = float(os.getenv('OLLAMA_WARM_INTERVAL', '240'))  # Seconds between warm pings
+        self.ollama_warm_hours = os.getenv('OLLAMA_WARM_HOURS', '8-18')  # Local hours [start, end)
+        self.ollama_warm_days = os.getenv('OLLAMA_WARM_DAYS', '0-4')  # Weekdays, Monday = 0
+        self.ollama_exclusive_heavy_models = os.getenv('OLLAMA_EXCLUSIVE_HEAVY_MODELS', 'true').lower() == 'true'
+        
+        # RAG latency budget settings
+        self.rag_latency_slo_ms = int(os.getenv('RAG_LATENCY_SLO_MS', '15000'))  # End-to-end chat deadline
+        self.rag_min_generation_budget_ms = int(os.getenv('RAG_MIN_GENERATION_BUDGET_MS', '1000'))
+        self.rag_cache_late_generations = os.getenv('RAG_CACHE_LATE_GENERATIONS', 'false').lower() == 'true'
+        self.rag_late_generation_grace_ms = int(os.getenv('RAG_LATE_GENERATION_GRACE_MS', '3000'))  # Late generations are cancelled after this
+        
+        # Classification settings
+        self.classifier_use_embeddings = os.getenv('CLASSIFIER_USE_EMBEDDINGS', 'true').lower() == 'true'
+        self.classifier_min_margin = float(os.getenv('CLASSIFIER_MIN_MARGIN', '0.05'))  # Below this, fall back to keywords
+        self.classifier_centroid_ttl = float(os.getenv('CLASSIFIER_CENTROID_TTL', '600'))  # Seconds domain centroids are reused; intent centroids are built once
+        
+        # Telemetry writer settings
+        self.telemetry_queue_size = int(os.getenv('TELEMETRY_QUEUE_SIZE', '10000'))  # Rows beyond this are dropped
+        self.telemetry_batch_size = int(os.getenv('TELEMETRY_BATCH_SIZE', '200'))
+        self.telemetry_flush_interval = float(os.getenv('TELEMETRY_FLUSH_INTERVAL', '1.0'))  # Seconds
+        self.telemetry_domain_cache_ttl = float(os.getenv('TELEMETRY_DOMAIN_CACHE_TTL', '300'))  # Seconds a resolved domain id is reused
         
         # Embedding settings
         self.EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'ollama')  # 'openai' or 'ollama'
@@ -32,6 +73,51 @@ class Settings:
         self.VECTOR_DIMENSION = int(os.getenv('VECTOR_DIMENSION', '768'))  # Updated for nomic-embed-text
         self.OLLAMA_BASE_URL = self.ollama_base_url  # Alias for consistency
         self.OPENAI_API_KEY = self.openai_api_key  # Alias for consistency
+        self.embedding_current_model = os.getenv(
+            'EMBEDDING_CURRENT_MODEL',
+            self.EMBEDDING_MODEL if self.EMBEDDING_PROVIDER == 'openai' else 'nomic-embed-text'
+        )  # Model ingestion embeds with; tenants on another model are re-embedded to it
+        
+        # Re-embedding settings
+        self.reembed_batch_size = int(os.getenv('REEMBED_BATCH_SIZE', '64'))  # Chunks embedded per tenant per pass
+        self.reembed_max_rows_per_second = float(os.getenv('REEMBED_MAX_ROWS_PER_SECOND', '20'))  # Throttle across all tenants
+        self.reembed_poll_interval = float(os.getenv('REEMBED_POLL_INTERVAL', '60'))  # Seconds between passes when idle
+        
+        # Ingestion job queue settings
+        self.ingest_max_concurrent_jobs = int(os.getenv('INGEST_MAX_CONCURRENT_JOBS', '2'))  # Per worker process
+        self.ingest_job_lease_seconds = int(os.getenv('INGEST_JOB_LEASE_SECONDS', '120'))  # Renewed by heartbeat
+        self.ingest_poll_interval = float(os.getenv('INGEST_POLL_INTERVAL', '30'))  # Fallback when no NOTIFY arrives
+        self.ingest_org_max_concurrent_jobs = int(os.getenv('INGEST_ORG_MAX_CONCURRENT_JOBS', '4'))  # Running jobs per organization across all workers
+        self.ingest_priority_step_seconds = int(os.getenv('INGEST_PRIORITY_STEP_SECONDS', '3600'))  # Waiting this long lifts a job one priority class
+        self.ingest_retry_backoff_seconds = int(os.getenv('INGEST_RETRY_BACKOFF_SECONDS', '30'))  # Delay before a failed job's first retry; doubles per attempt
+        self.ingest_insert_batch_size = int(os.getenv('INGEST_INSERT_BATCH_SIZE', '500'))  # Embedding rows per INSERT statement
+        self.ingest_pdf_page_window = int(os.getenv('INGEST_PDF_PAGE_WINDOW', '20'))  # PDF pages extracted, embedded and committed per step
+        self.ingest_checkpoint_chunks = int(os.getenv('INGEST_CHECKPOINT_CHUNKS', '64'))  # Chunks committed per checkpoint for non-PDF documents
+        
+        # Chunking settings
+        self.chunk_tokenizer = os.getenv('CHUNK_TOKENIZER', 'bert-base-uncased')  # Tokenizer of the embedding model (nomic-embed-text uses BERT's)
+        self.chunk_max_tokens = int(os.getenv('CHUNK_MAX_TOKENS', '384'))
+        self.chunk_min_tokens = int(os.getenv('CHUNK_MIN_TOKENS', '64'))  # A heading only closes chunks at least this big
+        
+        # Chunk deduplication settings
+        self.chunk_boilerplate_min_sources = int(os.getenv('CHUNK_BOILERPLATE_MIN_SOURCES', '5'))  # Scraped pages of a tenant a block must appear on to count as boilerplate
+        self.chunk_boilerplate_min_chars = int(os.getenv('CHUNK_BOILERPLATE_MIN_CHARS', '40'))  # Shorter blocks are never treated as boilerplate
+        
+        # Vision analysis queue settings
+        self.vision_queue_concurrency = int(os.getenv('VISION_QUEUE_CONCURRENCY', '1'))  # Images analysed at once per API process
+        self.vision_queue_poll_interval = float(os.getenv('VISION_QUEUE_POLL_INTERVAL', '15'))  # Seconds between checks for queued images
+        self.vision_queue_max_attempts = int(os.getenv('VISION_QUEUE_MAX_ATTEMPTS', '3'))  # Per image hash
+        self.vision_queue_lease_seconds = int(os.getenv('VISION_QUEUE_LEASE_SECONDS', '300'))  # Running analyses older than this are retried
+        self.vision_queue_gate_timeout = float(os.getenv('VISION_QUEUE_GATE_TIMEOUT', '120'))  # Wait for chat to free the GPU; then deferred, not failed
+        
+        # Document extraction settings
+        self.extraction_workers = int(os.getenv('EXTRACTION_WORKERS', '2'))  # Extraction processes per API process
+        self.extraction_timeout = float(os.getenv('EXTRACTION_TIMEOUT', '120'))  # Per-file seconds
+        self.extraction_memory_limit_mb = int(os.getenv('EXTRACTION_MEMORY_LIMIT_MB', '1024'))  # Per worker, 0 = unlimited
+        
+        # Upload settings
+        self.upload_max_size_mb = int(os.getenv('UPLOAD_MAX_SIZE_MB', '50'))  # Enforced while the upload streams
+        self.upload_part_size_mb = int(os.getenv('UPLOAD_PART_SIZE_MB', '10'))  # Multipart part size (MinIO minimum is 5)
         
         # MinIO settings
         self.minio_endpoint = os.getenv('MINIO_ENDPOINT', 'localhost:9000')
@@ -33,6 +33,8 @@ logger = logging.getLogger(__name__)
 class WebScraperConnector(BaseConnector):
     """Clean, focused web scraper with two-phase crawling approach"""
     
+    PAGE_EMBEDDING_FLUSH_SIZE = 50  # Pages per bulk embedding write (each page can be several chunks)
+    
     def __init__(self, config: ConnectorConfig):
         super().__init__(config)
         
@@ -50,6 +52,10 @@ class WebScraperConnector(BaseConnector):
         # Session state
         self.visited_urls = set()
         self.user_agent = 'Mozilla/5.0 (compatible; CortexQ-Crawler/1.0)'
+        self._embedding_service = None
+        self._page_embedding_writer = None
+        self._pending_embedding_urls: List[str] = []
+        self._pending_chunk_ids: List[str] = []
         
         logger.info(f"🔧 Web scraper initialized: {len(self.start_urls)} URLs, max_pages={self.max_pages}")
 
@@ -321,21 +327,25 @@ class WebScraperConnector(BaseConnector):
             headers={'User-Agent': self.user_agent}
         ) as session:
             
-            for i, url in enumerate(urls[:self.max_pages], 1):
-                logger.info(f"📄 Scraping {i}/{min(len(urls), self.max_pages)}: {url}")
-                
-                page_data = await self._scrape_page(url, session)
-                if page_data:
-                    scraped_pages.append(page_data)
-                    logger.info(f"✅ {i}/{min(len(urls), self.max_pages)} - {page_data.get('title', 'Untitled')[:50]}...")
+            try:
+                for i, url in enumerate(urls[:self.max_pages], 1):
+                    logger.info(f"📄 Scraping {i}/{min(len(urls), self.max_pages)}: {url}")
                     
-                    # Store in database immediately
-                    await self._store_scraped_content(page_data)
-                else:
-                    logger.warning(f"❌ Failed to scrape {url}")
-                
-                # Respect delay
-                await asyncio.sleep(self.delay)
+                    page_data = await self._scrape_page(url, session)
+                    if page_data:
+                        scraped_pages.append(page_data)
+                        logger.info(f"✅ {i}/{min(len(urls), self.max_pages)} - {page_data.get('title', 'Untitled')[:50]}...")
+                        
+                        # Store in database immediately
+                        await self._store_scraped_content(page_data)
+                    else:
+                        logger.warning(f"❌ Failed to scrape {url}")
+                    
+                    # Respect delay
+                    await asyncio.sleep(self.delay)
+            finally:
+                # Pages already stored must not lose their buffered embeddings to an error or cancellation
+                self._flush_page_embeddings()
         
         logger.info(f"🎉 Scraping complete! Successfully scraped {len(scraped_pages)} pages")
         return scraped_pages
@@ -402,14 +412,9 @@ class WebScraperConnector(BaseConnector):
         # Try to find main content area
         main_content = soup.find('main') or soup.find('article') or soup.find('body') or soup
         
-        # Extract text
-        text = main_content.get_text(separator=' ', strip=True)
-        
-        # Clean up whitespace
-        import re
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text.strip()
+        # Keep headings, lists and tables as markdown-style blocks so chunking can follow them
+        from chunking import blocks_from_html, blocks_to_text
+        return blocks_to_text(blocks_from_html(main_content)).strip()
 
     def _extract_metadata(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
         """Extract metadata from HTML"""
@@ -675,16 +680,20 @@ class WebScraperConnector(BaseConnector):
             
             db.commit()
             
-            # Generate embeddings for searchability
-            await self._generate_embeddings(page_data, db)
+            # Generate embeddings for searchability (buffered, written in bulk)
+            await self._generate_embeddings(page_data, db, existing.id if existing else page_id)
             
         except Exception as e:
             logger.error(f"❌ Failed to store scraped content for {page_data.get('url', 'unknown')}: {e}")
             if 'db' in locals():
                 db.rollback()
 
-    async def _generate_embeddings(self, page_data: Dict[str, Any], db) -> None:
-        """Generate embeddings for scraped content to make it searchable"""
+    async def _generate_embeddings(self, page_data: Dict[str, Any], db, crawled_page_id: Optional[str] = None) -> bool:
+        """Chunk and embed scraped content, buffering the rows for the next bulk write
+
+        Rows are written by ``_flush_page_embeddings`` every ``PAGE_EMBEDDING_FLUSH_SIZE``
+        pages; callers flush whatever is left when they finish.
+        """
         try:
             from sqlalchemy import text
             
@@ -693,122 +702,119 @@ class WebScraperConnector(BaseConnector):
             
             if not content or len(content.strip()) < 50:
                 logger.debug(f"🔸 Skipping embedding for short content: {page_data['url']}")
-                return
-            
-            # Combine title and content for embedding
-            combined_text = f"{title}\n\n{content}" if title else content
-            
-            # Truncate if too long (typical embedding models have token limits)
-            max_chars = 8000  # Roughly 2000 tokens for most models
-            if len(combined_text) > max_chars:
-                combined_text = combined_text[:max_chars] + "..."
-            
-            # Get the actual crawled_pages ID for this URL
-            url_hash = hashlib.md5(page_data['url'].encode()).hexdigest()
-            
-            crawled_page_result = db.execute(
-                text("""
-                    SELECT id FROM crawled_pages 
-                    WHERE organization_id = :org_id 
-                    AND url_hash = :url_hash
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                """),
-                {
-                    "org_id": self.config.organization_id,
-                    "url_hash": url_hash
-                }
-            ).fetchone()
-            
-            if not crawled_page_result:
-                logger.error(f"❌ No crawled_pages record found for URL: {page_data['url']}")
-                return
+                return False
             
-            crawled_page_id = crawled_page_result.id
+            if crawled_page_id is None:
+                # Get the actual crawled_pages ID for this URL
+                url_hash = hashlib.md5(page_data['url'].encode()).hexdigest()
+                
+                crawled_page_result = db.execute(
+                    text("""
+                        SELECT id FROM crawled_pages 
+                        WHERE organization_id = :org_id 
+                        AND url_hash = :url_hash
+                        ORDER BY created_at DESC
+                        LIMIT 1
+                    """),
+                    {
+                        "org_id": self.config.organization_id,
+                        "url_hash": url_hash
+                    }
+                ).fetchone()
+                
+                if not crawled_page_result:
+                    logger.error(f"❌ No crawled_pages record found for URL: {page_data['url']}")
+                    return False
+                
+                crawled_page_id = crawled_page_result.id
             
-            # Generate embedding using the configured embedding service
+            # Generate embeddings using the configured embedding service
             try:
-                # Use the existing embedding service
-                from search.embedding_service import EmbeddingService
+                from chunk_dedup import get_chunk_deduplicator
+                from chunking import blocks_from_text, get_chunker
                 from config import get_settings
                 
                 settings = get_settings()
-                embedding_service = EmbeddingService(settings)
-                await embedding_service.initialize()
+                dedup = get_chunk_deduplicator()
                 
-                # Generate embedding vector
-                embedding_vector = await embedding_service.generate_embedding(combined_text)
+                # Structure-aware, token-sized chunks of the page (title first), minus site-wide boilerplate
+                existing = dedup.existing_chunks(db, crawled_page_id)
+                page_text = f"# {title}\n\n{content}" if title else content
+                blocks = dedup.filter_boilerplate(blocks_from_text(page_text), self.config.organization_id, crawled_page_id)
+                chunks = get_chunker().chunk(blocks, source_id=str(crawled_page_id))
                 
-                if embedding_vector is not None:
-                    # Store embedding in database using correct schema with actual crawled_pages ID
-                    embedding_id = str(uuid.uuid4())
-                    
-                    # Convert numpy array to list for PostgreSQL vector column
-                    if hasattr(embedding_vector, 'tolist'):
+                # Only embed chunks that changed and whose text this tenant hasn't embedded before
+                plan = dedup.plan(db, self.config.organization_id, settings.embedding_current_model, chunks, existing)
+                to_embed = [chunk for chunk in plan["new"] if chunk.content_hash not in plan["reuse"]]
+                embedding_vectors = {}
+                if to_embed:
+                    embedding_service = await self._get_embedding_service()
+                    # No mock vectors: a stored one would be reused by hash for every later copy of the text
+                    vectors = await embedding_service.generate_embeddings_batch([chunk.text for chunk in to_embed], allow_mock=False)
+                    embedding_vectors = {chunk.id: vector for chunk, vector in zip(to_embed, vectors) if vector is not None}
+                
+                # Build metadata for embedding
+                metadata = {
+                    "title": title,
+                    "url": page_data['url'],
+                    "word_count": page_data.get('word_count', 0),
+                    "scraped_at": page_data.get('scraped_at'),
+                    "connector_id": self.config.id,
+                    "content_type": "web_page"
+                }
+                
+                # Add visual content if available
+                page_metadata = page_data.get('metadata', {})
+                visual_content = page_metadata.get('visual_content', {})
+                
+                writer = self._get_page_embedding_writer()
+                domain_id = self._get_domain_id()
+                added = 0
+                for chunk in plan["new"]:
+                    embedding_vector = plan["reuse"].get(chunk.content_hash)
+                    if embedding_vector is None:
+                        embedding_vector = embedding_vectors.get(chunk.id)
+                    if embedding_vector is None:
+                        continue
+                    # Convert numpy array to list for PostgreSQL vector column (reused ones are already serialized)
+                    if isinstance(embedding_vector, str):
+                        embedding_list = embedding_vector
+                    elif hasattr(embedding_vector, 'tolist'):
                         embedding_list = embedding_vector.tolist()
                     else:
                         embedding_list = list(embedding_vector)
                     
-                    # Build metadata for embedding
-                    metadata = {
-                        "title": title,
-                        "url": page_data['url'],
-                        "word_count": page_data.get('word_count', 0),
-                        "scraped_at": page_data.get('scraped_at'),
-                        "connector_id": self.config.id,
-                        "content_type": "web_page"
-                    }
-                    
-                    # Add visual content if available
-                    page_metadata = page_data.get('metadata', {})
-                    visual_content = page_metadata.get('visual_content', {})
-                    
-                    if visual_content and (visual_content.get('screenshots') or visual_content.get('images')):
-                        metadata['visual_content'] = visual_content
+                    chunk_metadata = {**metadata, "chunk_index": chunk.index, "section": chunk.heading}
+                    # Visual content goes on the first chunk only
+                    if chunk.index == 0 and visual_content and (visual_content.get('screenshots') or visual_content.get('images')):
+                        chunk_metadata['visual_content'] = visual_content
                         logger.debug(f"📸 Including visual content in embedding metadata: {len(visual_content.get('screenshots', []))} screenshots, {len(visual_content.get('images', []))} images")
                     
-                    # Delete any existing embeddings for this URL to avoid duplicates
-                    deleted_count = db.execute(
-                        text("""
-                            DELETE FROM embeddings 
-                            WHERE organization_id = :org_id 
-                            AND source_type = 'web_page'
-                            AND metadata->>'url' = :url
-                        """),
-                        {
-                            "org_id": self.config.organization_id,
-                            "url": page_data['url']
-                        }
-                    ).rowcount
-                    
-                    if deleted_count > 0:
-                        logger.debug(f"🗑️ Deleted {deleted_count} old embeddings for URL: {page_data['url']}")
-                    
-                    # Insert new embedding
-                    db.execute(
-                        text("""
-                            INSERT INTO embeddings 
-                            (id, organization_id, domain_id, source_type, source_id,
-                             content_text, embedding, metadata, embedding_model)
-                            VALUES 
-                            (:id, :org_id, :domain_id, :source_type, :source_id,
-                             :content_text, :embedding, :metadata, :embedding_model)
-                        """),
-                        {
-                            "id": embedding_id,
-                            "org_id": self.config.organization_id,
-                            "domain_id": self._get_domain_id(),
-                            "source_type": "web_page",
-                            "source_id": crawled_page_id,  # Use actual crawled_pages ID
-                            "content_text": combined_text,
-                            "embedding": embedding_list,  # Use list format for vector column
-                            "metadata": json.dumps(metadata),
-                            "embedding_model": settings.EMBEDDING_MODEL
-                        }
-                    )
+                    writer.add({
+                        "id": chunk.id,
+                        "organization_id": self.config.organization_id,
+                        "domain_id": domain_id,
+                        "source_type": "web_page",
+                        "source_id": crawled_page_id,  # Use actual crawled_pages ID
+                        "chunk_index": chunk.index,
+                        "content_text": chunk.text,
+                        "content_hash": chunk.content_hash,
+                        "embedding": embedding_list,  # Use list format for vector column
+                        "metadata": json.dumps(chunk_metadata),
+                        "embedding_model": settings.embedding_current_model
+                    })
+                    added += 1
+                
+                if added or plan["unchanged"]:
+                    # Rows of this page other than the unchanged ones are removed at flush, so
+                    # moved chunks don't collide with the (source_id, chunk_index) upsert
+                    self._pending_embedding_urls.append(page_data['url'])
+                    self._pending_chunk_ids.extend(chunk.id for chunk in plan["unchanged"])
+                    logger.debug(f"🔍 {added} chunk embeddings written ({len(to_embed)} embedded), {len(plan['unchanged'])} unchanged for: {page_data['url']}")
                     
-                    db.commit()
-                    logger.debug(f"🔍 Generated embedding for: {page_data['url']}")
+                    if len(self._pending_embedding_urls) >= self.PAGE_EMBEDDING_FLUSH_SIZE:
+                        self._flush_page_embeddings(db)
+                    return True
                 else:
                     logger.warning(f"⚠️  No embedding generated for: {page_data['url']}")
                     
@@ -819,6 +825,113 @@ class WebScraperConnector(BaseConnector):
                 
         except Exception as e:
             logger.error(f"❌ Embedding generation error for {page_data.get('url', 'unknown')}: {e}")
+        return False
+
+    async def _get_embedding_service(self):
+        """Embedding service shared by all pages of this connector"""
+        if self._embedding_service is None:
+            from search.embedding_service import EmbeddingService
+            from config import get_settings
+            
+            embedding_service = EmbeddingService(get_settings())
+            await embedding_service.initialize()
+            self._embedding_service = embedding_service
+        return self._embedding_service
+
+    def _get_page_embedding_writer(self):
+        if self._page_embedding_writer is None:
+            from embedding_writer import EmbeddingBulkWriter
+            self._page_embedding_writer = EmbeddingBulkWriter(
+                [
+                    "id", "organization_id", "domain_id", "source_type", "source_id", "chunk_index",
+                    "content_text", "content_hash", "embedding", "metadata", "embedding_model"
+                ],
+                on_conflict="""
+                    ON CONFLICT (source_id, chunk_index, embedding_model) DO UPDATE SET id = EXCLUDED.id,
+                        content_text = EXCLUDED.content_text, content_hash = EXCLUDED.content_hash,
+                        embedding = EXCLUDED.embedding, metadata = EXCLUDED.metadata
+                """
+            )
+        return self._page_embedding_writer
+
+    def _flush_page_embeddings(self, db=None) -> int:
+        """Remove stale embeddings for the buffered pages and bulk upsert the new ones in one transaction"""
+        writer = self._page_embedding_writer
+        if not self._pending_embedding_urls:
+            return 0
+        
+        from sqlalchemy import text
+        
+        if db is None:
+            from dependencies import get_db
+            db = next(get_db())
+        
+        urls = self._pending_embedding_urls
+        try:
+            # Delete embeddings for these URLs except the chunks that are unchanged, along
+            # with other models' vectors of them (same position and text)
+            deleted_count = db.execute(
+                text("""
+                    DELETE FROM embeddings e
+                    WHERE e.organization_id = :org_id 
+                    AND e.source_type = 'web_page'
+                    AND e.metadata->>'url' = ANY(:urls)
+                    AND NOT (e.id::text = ANY(:keep_ids))
+                    AND NOT EXISTS (
+                        SELECT 1 FROM embeddings k
+                        WHERE k.source_id = e.source_id
+                        AND k.chunk_index = e.chunk_index
+                        AND k.content_hash IS NOT DISTINCT FROM e.content_hash
+                        AND k.id::text = ANY(:keep_ids)
+                    )
+                """),
+                {
+                    "org_id": self.config.organization_id,
+                    "urls": urls,
+                    "keep_ids": self._pending_chunk_ids
+                }
+            ).rowcount
+            
+            if deleted_count > 0:
+                logger.debug(f"🗑️ Deleted {deleted_count} old embeddings for {len(urls)} pages")
+            
+            written = writer.write(db) if writer is not None else 0
+            db.commit()
+            logger.info(f"💾 Stored {written} page embeddings")
+            return written
+        except Exception as e:
+            logger.error(f"❌ Failed to store embeddings for {len(urls)} pages: {e}")
+            db.rollback()
+            if writer is not None:
+                writer.clear()
+            self._mark_embedding_failed(db, urls, str(e))
+            return 0
+        finally:
+            self._pending_embedding_urls = []
+            self._pending_chunk_ids = []
+
+    def _mark_embedding_failed(self, db, urls: List[str], error_message: str):
+        """Flag pages whose embeddings weren't stored, so they show as failed and are embedded again on the next crawl"""
+        from sqlalchemy import text
+        
+        try:
+            db.execute(
+                text("""
+                    UPDATE crawled_pages
+                    SET status = 'failed', error_message = :error_message, updated_at = NOW()
+                    WHERE organization_id = :org_id AND connector_id = :connector_id AND url = ANY(:urls)
+                """),
+                {
+                    "org_id": self.config.organization_id,
+                    "connector_id": self.config.id,
+                    "urls": urls,
+                    "error_message": f"Embedding write failed: {error_message}"[:1000]
+                }
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Could not mark {len(urls)} pages as failed: {e}")
 
     def _get_domain_id(self) -> str:
         """Get domain ID from domain name"""
@@ -977,29 +1090,33 @@ class WebScraperConnector(BaseConnector):
             created = 0
             errors = 0
             
-            for row in result:
-                try:
-                    # Convert row to dict format expected by _generate_embeddings
-                    page_data = {
-                        "url": row.url,
-                        "title": row.title or "",
-                        "content": row.content or "",
-                        "scraped_at": row.scraped_at.isoformat() if row.scraped_at else None
-                    }
+            try:
+                for row in result:
+                    try:
+                        # Convert row to dict format expected by _generate_embeddings
+                        page_data = {
+                            "url": row.url,
+                            "title": row.title or "",
+                            "content": row.content or "",
+                            "scraped_at": row.scraped_at.isoformat() if row.scraped_at else None
+                        }
                     
-                    # Generate embedding for this page
-                    await self._generate_embeddings(page_data, db)
-                    created += 1
-                    processed += 1
+                        # Generate embedding for this page
+                        if await self._generate_embeddings(page_data, db, row.id):
+                            created += 1
+                        else:
+                            errors += 1
+                        processed += 1
                     
-                    if processed % 10 == 0:
-                        logger.info(f"🔄 Processed {processed}/{len(result)} pages...")
+                        if processed % 10 == 0:
+                            logger.info(f"🔄 Processed {processed}/{len(result)} pages...")
                         
-                except Exception as e:
-                    logger.error(f"❌ Failed to generate embedding for {row.url}: {e}")
-                    errors += 1
-                    processed += 1
-            
+                    except Exception as e:
+                        logger.error(f"❌ Failed to generate embedding for {row.url}: {e}")
+                        errors += 1
+                        processed += 1
+            finally:
+                self._flush_page_embeddings(db)
             logger.info(f"✅ Embedding regeneration complete: {created} created, {errors} errors")
             
             return {
@@ -1014,21 +1131,20 @@ class WebScraperConnector(BaseConnector):
             return {"error": str(e), "processed": 0, "created": 0, "errors": 0}
 
     async def _extract_page_images(self, html: str, page_url: str, session: aiohttp.ClientSession) -> Dict[str, Any]:
-        """Extract and download images embedded in the web page with vision analysis"""
+        """Extract and download images embedded in the web page
+        
+        Images seen before come back with their cached vision analysis; new ones are
+        queued for the vision stage and don't hold up the page.
+        """
         try:
             from ingestion.visual_extractor import VisualContentExtractor
-            from vision_analyzer import get_vision_analyzer
             
             # Use the existing visual extractor for initial image discovery
             extractor = VisualContentExtractor()
             initial_extraction = extractor._extract_html_images(html)
             
-            # Get vision analyzer for intelligent image analysis
-            vision_analyzer = get_vision_analyzer()
-            
             # Download and store the actual images
-            processed_images = []
-            processed_screenshots = []
+            stored_images = []
             
             # Combine all image candidates
             all_candidates = initial_extraction.get('images', []) + initial_extraction.get('screenshots', [])
@@ -1065,98 +1181,46 @@ class WebScraperConnector(BaseConnector):
                             if not img_content_type.startswith('image/'):
                                 continue
                             
-                            # VISION ANALYSIS: Analyze image at ingestion time
-                            vision_analysis = None
-                            if vision_analyzer and vision_analyzer.available:
-                                try:
-                                    print(f"🔍 INGESTION: Analyzing image {img_url} with vision model")
-                                    context_hint = f"Image from {page_url}: {img_info.get('alt_text', '')}"
-                                    vision_analysis = vision_analyzer.analyze_image(img_content, context_hint)
-                                    print(f"✅ INGESTION: Vision analysis complete - detected: {vision_analysis.get('content_type', 'unknown')}")
-                                except Exception as e:
-                                    print(f"❌ INGESTION: Vision analysis failed: {e}")
-                                    vision_analysis = None
+                            # Store image content-addressed in object storage
+                            stored_image = await self._store_image(img_content, img_url, img_content_type)
                             
-                            # Store image in file storage
-                            stored_url = await self._store_image(img_content, img_url, img_content_type)
-                            
-                            if stored_url:
-                                # Enhanced image info with vision analysis
-                                enhanced_img_info = {
+                            if stored_image:
+                                width, height = extractor._get_image_dimensions(img_content)
+                                stored_images.append({
                                     **img_info,
-                                    'stored_url': stored_url,
+                                    **stored_image,
+                                    'width': img_info.get('width') or width,
+                                    'height': img_info.get('height') or height,
                                     'original_url': img_url,
-                                    'content_type': img_content_type,
-                                    'size_bytes': len(img_content),
                                     'downloaded_at': datetime.utcnow().isoformat()
-                                }
-                                
-                                # Add vision analysis results if available
-                                if vision_analysis:
-                                    enhanced_img_info.update({
-                                        'enhanced_description': vision_analysis['description'],
-                                        'content_type_detected': vision_analysis['content_type'],
-                                        'context_tags': vision_analysis['context_tags'],
-                                        'ui_elements': vision_analysis['ui_elements'],
-                                        'vision_analyzed': True,
-                                        'vision_analyzed_at': datetime.utcnow().isoformat()
-                                    })
-                                    
-                                    # Store image description embedding in the main embeddings table for efficient search
-                                    try:
-                                        from main import embeddings_model
-                                        if embeddings_model and vision_analysis['description']:
-                                            description_embedding = embeddings_model.encode([vision_analysis['description']])[0]
-                                            
-                                            # Store in embeddings table (polymorphic approach)
-                                            await self._store_image_description_embedding(
-                                                enhanced_img_info, 
-                                                vision_analysis['description'],
-                                                description_embedding,
-                                                page_url
-                                            )
-                                            
-                                            logger.debug(f"📊 Stored image description embedding: {vision_analysis['description'][:50]}...")
-                                    except Exception as e:
-                                        logger.warning(f"⚠️  Failed to store image description embedding: {e}")
-                                    
-                                    # Update alt_text with more descriptive version
-                                    if vision_analysis['content_type'] != 'unknown':
-                                        content_type_name = vision_analysis['content_type'].replace('_', ' ').title()
-                                        description_preview = vision_analysis['description'][:80] + "..." if len(vision_analysis['description']) > 80 else vision_analysis['description']
-                                        enhanced_img_info['alt_text'] = f"{content_type_name}: {description_preview}"
-                                    
-                                    # Use vision analysis to determine if it's a screenshot
-                                    if vision_analysis['content_type'] in ['login_page', 'dashboard', 'form', 'settings', 'navigation']:
-                                        enhanced_img_info['type'] = 'screenshot'
-                                    elif 'interface' in vision_analysis.get('context_tags', []):
-                                        enhanced_img_info['type'] = 'screenshot'
-                                    else:
-                                        enhanced_img_info['type'] = 'image'
-                                else:
-                                    enhanced_img_info['vision_analyzed'] = False
-                                
-                                if enhanced_img_info.get('type') == 'screenshot':
-                                    processed_screenshots.append(enhanced_img_info)
-                                else:
-                                    processed_images.append(enhanced_img_info)
-                                    
-                                logger.debug(f"📸 Downloaded and analyzed image: {img_url} -> {stored_url}")
+                                })
+                                logger.debug(f"📸 Downloaded image: {img_url} -> {stored_image['stored_url']}")
                         
                 except Exception as e:
-                    logger.debug(f"❌ Failed to download/analyze image {img_info.get('src', 'unknown')}: {e}")
+                    logger.debug(f"❌ Failed to download image {img_info.get('src', 'unknown')}: {e}")
                     continue
             
-            if processed_images or processed_screenshots:
-                vision_count = sum(1 for img in (processed_images + processed_screenshots) if img.get('vision_analyzed'))
-                logger.info(f"📸 INGESTION: Extracted {len(processed_screenshots)} screenshots and {len(processed_images)} images from {page_url} (vision analyzed: {vision_count})")
+            processed_images = []
+            processed_screenshots = []
+            if stored_images:
+                loop = asyncio.get_running_loop()
+                stored_images = await loop.run_in_executor(None, self._apply_vision_analyses, stored_images, page_url)
+                for img in stored_images:
+                    if img.get('type') == 'screenshot':
+                        processed_screenshots.append(img)
+                    else:
+                        processed_images.append(img)
+            
+            vision_count = sum(1 for img in stored_images if img.get('vision_analyzed'))
+            if stored_images:
+                logger.info(f"📸 INGESTION: Extracted {len(processed_screenshots)} screenshots and {len(processed_images)} images from {page_url} (vision analyzed: {vision_count}, queued: {len(stored_images) - vision_count})")
             
             return {
                 'images': processed_images,
                 'screenshots': processed_screenshots,
                 'extraction_method': 'web_download_with_vision',
-                'total_processed': len(processed_images) + len(processed_screenshots),
-                'vision_analyzed_count': sum(1 for img in (processed_images + processed_screenshots) if img.get('vision_analyzed'))
+                'total_processed': len(stored_images),
+                'vision_analyzed_count': vision_count
             }
             
         except ImportError:
@@ -1166,119 +1230,60 @@ class WebScraperConnector(BaseConnector):
             logger.error(f"❌ Failed to extract images from {page_url}: {e}")
             return {'images': [], 'screenshots': [], 'extraction_method': 'failed'}
 
-    async def _store_image(self, img_content: bytes, original_url: str, content_type: str) -> Optional[str]:
-        """Store downloaded image in file storage and return the stored URL"""
+    def _apply_vision_analyses(self, images: List[Dict[str, Any]], page_url: str) -> List[Dict[str, Any]]:
+        """Merge cached vision analyses into the images and queue the rest for analysis"""
+        from database import SessionLocal
+        from vision_queue import apply_image_analysis, get_vision_queue
+        
+        vision_queue = get_vision_queue()
+        db = SessionLocal()
         try:
-            from storage_utils import minio_storage
-            from dependencies import get_db
-            from sqlalchemy import text
-            import hashlib
-            
-            # Get organization slug from database
-            db = next(get_db())
-            org_result = db.execute(
-                text("SELECT slug FROM organizations WHERE id = :org_id"),
-                {"org_id": self.config.organization_id}
-            ).fetchone()
-            
-            org_slug = org_result.slug if org_result else 'default'
-            domain = getattr(self.config, 'domain', 'general')
-            
-            # Generate unique filename
-            url_hash = hashlib.md5(original_url.encode()).hexdigest()[:16]
-            file_extension = content_type.split('/')[-1] if '/' in content_type else 'jpg'
-            filename = f"web_image_{url_hash}.{file_extension}"
-            
-            # Generate unique file ID
-            file_id = f"img_{url_hash}"
-            
-            # Upload to storage using the correct API
-            upload_result = await minio_storage.upload_file(
-                file_content=img_content,
-                organization_slug=org_slug,
-                domain=domain,
-                file_id=file_id,
-                filename=filename,
-                content_type=content_type,
-                metadata={
-                    'source_type': 'web_image',
-                    'original_url': original_url,
-                    'connector_id': self.config.id
-                }
+            cached = vision_queue.get_cached(db, [img['content_hash'] for img in images])
+            enhanced = []
+            for img in images:
+                analysis = cached.get(img['content_hash'])
+                if analysis:
+                    enhanced.append(apply_image_analysis(img, analysis))
+                else:
+                    enhanced.append({**img, 'vision_analyzed': False, 'vision_status': 'queued'})
+            
+            # Every tenant gets its own description embedding, cached analyses included
+            vision_queue.enqueue_images(
+                db,
+                [{**img, 'vision_analyzed': False, 'alt_text': f"Image from {page_url}: {img.get('alt_text', '')}"} for img in images],
+                self.config.organization_id,
+                self._get_domain_id(),
+                source_metadata={"url": page_url, "connector_id": self.config.id}
             )
+            db.commit()
+            return enhanced
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️  Failed to queue images for vision analysis: {e}")
+            return [{**img, 'vision_analyzed': False} for img in images]
+        finally:
+            db.close()
+
+    async def _store_image(self, img_content: bytes, original_url: str, content_type: str) -> Optional[Dict[str, Any]]:
+        """Store a downloaded image content-addressed in MinIO and return its reference
+        
+        The same image on many pages (logos, shared screenshots) is stored once.
+        """
+        try:
+            from storage_utils import minio_storage
             
-            if upload_result.get('success'):
-                stored_url = upload_result.get('url') or minio_storage.get_file_url(upload_result.get('object_key'))
-                logger.debug(f"📸 Stored image: {filename} -> {stored_url}")
-                return stored_url
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(None, minio_storage.put_image, img_content, content_type)
+            if stored:
+                logger.debug(f"📸 Stored image: {original_url} -> {stored['object_key']}")
             else:
-                logger.warning(f"⚠️  Failed to store image {filename}: {upload_result.get('error')}")
-                return None
+                logger.warning(f"⚠️  Failed to store image {original_url}")
+            return stored
                 
         except Exception as e:
             logger.error(f"❌ Failed to store image: {e}")
             return None
 
-    async def _store_image_description_embedding(self, img_info: Dict[str, Any], description: str, embedding: List[float], page_url: str) -> None:
-        """Store image description embedding in the main embeddings table for efficient search"""
-        try:
-            from dependencies import get_db
-            from sqlalchemy import text
-            import json
-            
-            db = next(get_db())
-            
-            # Generate unique embedding ID
-            embedding_id = str(uuid.uuid4())
-            
-            # Generate a proper UUID for source_id since these are standalone image description embeddings
-            image_source_id = str(uuid.uuid4())
-            
-            # Build metadata for embedding
-            metadata = {
-                "title": img_info.get('title', 'Untitled'),
-                "url": page_url,
-                "word_count": len(description.split()),
-                "scraped_at": img_info.get('scraped_at'),
-                "connector_id": self.config.id,
-                "content_type": "image_description",
-                "description": description,
-                "original_image_url": img_info.get('original_url'),
-                "stored_image_url": img_info.get('stored_url')
-            }
-            
-            # Convert embedding to list format for PostgreSQL vector column
-            embedding_list = embedding.tolist()
-            
-            # Insert new embedding
-            db.execute(
-                text("""
-                    INSERT INTO embeddings 
-                    (id, organization_id, domain_id, source_type, source_id,
-                     content_text, embedding, metadata, embedding_model)
-                    VALUES 
-                    (:id, :org_id, :domain_id, :source_type, :source_id,
-                     :content_text, :embedding, :metadata, :embedding_model)
-                """),
-                {
-                    "id": embedding_id,
-                    "org_id": self.config.organization_id,
-                    "domain_id": self._get_domain_id(),
-                    "source_type": "image_description",
-                    "source_id": image_source_id,  # Use proper UUID instead of string like "html_img_0"
-                    "content_text": description,
-                    "embedding": embedding_list,
-                    "metadata": json.dumps(metadata),
-                    "embedding_model": "default"  # Assuming a default embedding model
-                }
-            )
-            
-            db.commit()
-            logger.debug(f"🔍 Stored image description embedding for: {page_url}")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to store image description embedding for {page_url}: {e}")
-
     async def regenerate_embeddings_with_visual_content(self) -> Dict[str, Any]:
         """Regenerate embeddings for existing crawled pages to include visual content metadata"""
         try:
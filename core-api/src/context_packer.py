@@ -0,0 +1,180 @@
+"""
+Context Packer - Token-budgeted context assembly for LLM prompts
+Deduplicates overlapping chunks and fills a token budget greedily by similarity
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter:
+    """Counts tokens with the generation model's tokenizer, falling back to a character estimate
+
+    The tokenizer is only used once ``load`` has run; until then (or if it fails)
+    tokens are estimated, so counting never downloads anything.
+    """
+
+    CHARS_PER_TOKEN = 4  # Rough average for English text when no tokenizer is available
+
+    def __init__(self, tokenizer_name: str = ""):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._load_attempted = False
+
+    def load(self):
+        """Load the tokenizer (may download it, so call from a thread at startup)"""
+        if self._load_attempted:
+            return
+        self._load_attempted = True
+        if not self.tokenizer_name:
+            return
+        try:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+            logger.info(f"Context packer using tokenizer: {self.tokenizer_name}")
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer '{self.tokenizer_name}', estimating tokens from length: {e}")
+            self._tokenizer = None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text"""
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False))
+        return (len(text) + self.CHARS_PER_TOKEN - 1) // self.CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, preferring a sentence boundary"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        if self._tokenizer is not None:
+            token_ids = self._tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+            truncated = self._tokenizer.decode(token_ids, skip_special_tokens=True)
+        else:
+            truncated = text[:max_tokens * self.CHARS_PER_TOKEN]
+
+        # Back off to the last sentence end if it keeps most of the text
+        sentence_end = max(truncated.rfind('. '), truncated.rfind('.\n'), truncated.rfind('? '), truncated.rfind('! '))
+        if sentence_end > len(truncated) * 0.6:
+            truncated = truncated[:sentence_end + 1]
+        return truncated.rstrip() + "..."
+
+
+class ContextPacker:
+    """Builds LLM context from search results within a fixed token budget"""
+
+    def __init__(self, token_budget: int = 1500, tokenizer_name: str = "", max_overlap_chars: int = 300):
+        self.token_budget = token_budget
+        self.counter = TokenCounter(tokenizer_name)
+        self.max_overlap_chars = max_overlap_chars
+        self.min_overlap_chars = 20
+        self.min_fragment_tokens = 32  # Don't bother adding truncated fragments smaller than this
+
+    def pack(self, results: List, token_budget: Optional[int] = None) -> str:
+        """Greedily pack the most similar non-redundant chunks into the budget"""
+        if not results:
+            return "No relevant information found."
+
+        budget = token_budget if token_budget is not None else self.token_budget
+        used_tokens = 0
+
+        # source_id -> {"title": str, "header_tokens": int, "pieces": [(chunk_index, text)]}
+        selected: Dict[str, Dict] = {}
+        source_order: List[str] = []
+
+        for result in sorted(results, key=lambda r: r.similarity, reverse=True):
+            content = self._normalize(result.content)
+            if not content:
+                continue
+
+            source_id = result.source_id
+            group = selected.get(source_id)
+            header_tokens = 0
+            if group is None:
+                title = result.metadata.get("title") or "Document"
+                if title.endswith('.pdf'):
+                    title = title[:-4]
+                header = f"From {title}:\n"
+                header_tokens = self.counter.count(header) + 1  # + separator between sources
+            else:
+                content = self._strip_overlap(content, [text for _, text in group["pieces"]])
+                if not content:
+                    continue
+
+            content_tokens = self.counter.count(content)
+            remaining = budget - used_tokens - header_tokens
+
+            if content_tokens > remaining:
+                if remaining < self.min_fragment_tokens:
+                    continue
+                content = self.counter.truncate(content, remaining)
+                content_tokens = self.counter.count(content)
+
+            if group is None:
+                group = {"title": title, "pieces": []}
+                selected[source_id] = group
+                source_order.append(source_id)
+            group["pieces"].append((result.metadata.get("chunk_index", 0) or 0, content))
+            used_tokens += header_tokens + content_tokens
+
+            if budget - used_tokens < self.min_fragment_tokens:
+                break
+
+        context_parts = []
+        for source_id in source_order:
+            group = selected[source_id]
+            pieces = [text for _, text in sorted(group["pieces"], key=lambda p: p[0])]
+            context_parts.append(f"From {group['title']}:\n" + " ".join(pieces))
+
+        logger.debug(f"Packed {sum(len(g['pieces']) for g in selected.values())} chunks from {len(source_order)} sources into {used_tokens}/{budget} tokens")
+        return "\n\n".join(context_parts)
+
+    def _normalize(self, text: str) -> str:
+        return re.sub(r'[ \t]+', ' ', (text or "").strip())
+
+    def _strip_overlap(self, text: str, existing: List[str]) -> str:
+        """Remove text already covered by chunks selected from the same source"""
+        for other in existing:
+            if text in other:
+                return ""
+
+            # Chunk follows an existing one: drop the shared prefix
+            for size in range(min(self.max_overlap_chars, len(text), len(other)), self.min_overlap_chars - 1, -1):
+                if other.endswith(text[:size]):
+                    text = text[size:].lstrip()
+                    break
+
+            # Chunk precedes an existing one: drop the shared suffix
+            for size in range(min(self.max_overlap_chars, len(text), len(other)), self.min_overlap_chars - 1, -1):
+                if other.startswith(text[-size:]):
+                    text = text[:-size].rstrip()
+                    break
+
+            if not text:
+                return ""
+        return text
+
+
+# Global instance
+_context_packer: Optional[ContextPacker] = None
+
+
+def get_context_packer() -> ContextPacker:
+    """Get the global context packer (singleton)"""
+    global _context_packer
+    if _context_packer is None:
+        settings = get_settings()
+        _context_packer = ContextPacker(
+            token_budget=settings.llm_context_token_budget,
+            tokenizer_name=settings.llm_tokenizer
+        )
+    return _context_packer
@@ -0,0 +1,467 @@
+"""
+Embedding Migrator - Online re-embedding when the embedding model changes
+Every embedding row names the model that produced it and each tenant searches one
+active model. When ingestion moves to a new model, a throttled background worker writes
+the new vectors alongside the old ones, switches the tenant in a single UPDATE once
+every chunk has one and then deletes the old rows.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# The SentenceTransformer the API loads at startup
+LOCAL_EMBEDDING_MODEL = "all-mpnet-base-v2"
+
+# Namespace for ids of rows holding another model's vector of a chunk position
+MODEL_VECTOR_NAMESPACE = uuid.UUID("3b9e7c1d-5a2f-4e8b-a6d4-1c7f0e9b2a58")
+
+# Old rows are kept this long after a switch so searches that already picked the old model finish
+PRUNE_GRACE_SECONDS = 60
+
+# Rows that follow the tenant's model. Chat messages have no chunk position, and image descriptions
+# stay in LOCAL_EMBEDDING_MODEL because LLMService ranks images against those vectors.
+MIGRATABLE_ROW_SQL = """
+    e.source_id IS NOT NULL
+    AND e.chunk_index IS NOT NULL
+    AND e.source_type IS DISTINCT FROM 'image_description'
+"""
+
+# Rows of ``organization_id`` not in ``:model`` whose position has no ``:model`` vector of the same text.
+# The model test is written as two ranges instead of <> so it can use idx_embeddings_org_model.
+MISSING_VECTOR_SQL = f"""
+    e.organization_id = :organization_id
+    AND (e.embedding_model < :model OR e.embedding_model > :model)
+    AND {MIGRATABLE_ROW_SQL}
+    AND e.content_text IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM embeddings t
+        WHERE t.source_id = e.source_id
+        AND t.chunk_index = e.chunk_index
+        AND t.embedding_model = :model
+        AND t.content_hash IS NOT DISTINCT FROM e.content_hash
+    )
+"""
+
+# Rows of ``organization_id`` not in ``:model`` whose position already has a ``:model`` vector of the same text
+STALE_VECTOR_SQL = f"""
+    e.organization_id = :organization_id
+    AND (e.embedding_model < :model OR e.embedding_model > :model)
+    AND {MIGRATABLE_ROW_SQL}
+    AND EXISTS (
+        SELECT 1 FROM embeddings t
+        WHERE t.source_id = e.source_id
+        AND t.chunk_index = e.chunk_index
+        AND t.embedding_model = :model
+        AND t.content_hash IS NOT DISTINCT FROM e.content_hash
+    )
+"""
+
+
+def model_vector_id(source_id: str, chunk_index: int, embedding_model: str) -> str:
+    """Id of the row holding ``embedding_model``'s vector of a chunk position"""
+    return str(uuid.uuid5(MODEL_VECTOR_NAMESPACE, f"{source_id}:{chunk_index}:{embedding_model}"))
+
+
+def get_active_embedding_model(db, organization_id: str) -> str:
+    """Model whose vectors the tenant's searches read"""
+    row = db.execute(
+        text("SELECT embedding_model FROM organizations WHERE id = :organization_id"),
+        {"organization_id": str(organization_id)}
+    ).fetchone()
+    if row and row.embedding_model:
+        return row.embedding_model
+    return get_settings().embedding_current_model
+
+
+async def embed_texts(embedding_model: str, texts: List[str]) -> List[List[float]]:
+    """Embed texts with exactly ``embedding_model``; raises rather than falling back to another model"""
+    settings = get_settings()
+    if embedding_model == LOCAL_EMBEDDING_MODEL:
+        from main import embeddings_model
+
+        if embeddings_model is None:
+            raise RuntimeError(f"{LOCAL_EMBEDDING_MODEL} is not loaded")
+        vectors = await asyncio.get_running_loop().run_in_executor(None, embeddings_model.encode, texts)
+        return [vector.tolist() for vector in vectors]
+
+    if settings.EMBEDDING_PROVIDER == "openai" and embedding_model == settings.EMBEDDING_MODEL:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        response = await client.embeddings.create(model=embedding_model, input=texts, encoding_format="float")
+        return [data.embedding for data in response.data]
+
+    from model_residency import get_model_residency
+    from ollama_client import get_ollama_client
+
+    response = await get_ollama_client().post(
+        f"{settings.OLLAMA_BASE_URL}/api/embed",
+        json={
+            "model": embedding_model,
+            "input": texts,
+            "keep_alive": get_model_residency().keep_alive("embedding")
+        }
+    )
+    response.raise_for_status()
+    return response.json()["embeddings"]
+
+
+class EmbeddingMigrator:
+    """Background worker that moves tenants onto the current embedding model
+
+    Per tenant it keeps every chunk covered by the tenant's active model, so chunks that
+    ingestion has already embedded with the new model stay searchable. While the active
+    model differs from ``embedding_current_model`` it also fills in new-model vectors,
+    recorded as a row in ``embedding_migrations``. When none are missing,
+    ``organizations.embedding_model`` is switched in one UPDATE, and later passes delete
+    the rows of other models. Each tenant is held under an advisory lock so several API
+    processes don't embed the same rows, and embedding is throttled to
+    ``max_rows_per_second`` across tenants.
+    """
+
+    def __init__(self, batch_size: int = 64, max_rows_per_second: float = 20.0, poll_interval: float = 60.0):
+        self.batch_size = max(1, batch_size)
+        self.max_rows_per_second = max_rows_per_second
+        self.poll_interval = poll_interval
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.embedded_count = 0
+        self.pruned_count = 0
+        self.switch_count = 0
+        self.failed_batches = 0
+
+    def start(self):
+        """Start the background worker"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background worker; a migration resumes where it stopped on the next start"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def wake(self):
+        """Check for work now instead of at the next poll (safe to call from any thread)"""
+        if self._wakeup is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def get_migration_status(self, db, organization_id: str) -> Dict:
+        """Active model of a tenant and the progress of its latest migration"""
+        active_model = get_active_embedding_model(db, organization_id)
+        migration = db.execute(
+            text("""
+                SELECT source_model, target_model, status, total_chunks, embedded_chunks, started_at, completed_at
+                FROM embedding_migrations
+                WHERE organization_id = :organization_id
+                ORDER BY started_at DESC
+                LIMIT 1
+            """),
+            {"organization_id": str(organization_id)}
+        ).fetchone()
+
+        status = {
+            "active_model": active_model,
+            "current_model": get_settings().embedding_current_model,
+            "migration": None
+        }
+        if migration:
+            status["migration"] = {
+                "source_model": migration.source_model,
+                "target_model": migration.target_model,
+                "status": migration.status,
+                "total_chunks": migration.total_chunks,
+                "embedded_chunks": migration.embedded_chunks,
+                "started_at": migration.started_at.isoformat() if migration.started_at else None,
+                "completed_at": migration.completed_at.isoformat() if migration.completed_at else None
+            }
+        return status
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                if await self._pass():
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in embedding migrator: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _pass(self) -> int:
+        """One batch for every tenant; returns rows embedded, deleted or switched"""
+        loop = asyncio.get_running_loop()
+        current_model = get_settings().embedding_current_model
+        tenants = await loop.run_in_executor(None, self._tenants, current_model)
+
+        done = 0
+        for tenant in tenants:
+            embedded, changed = await self._migrate_tenant(str(tenant.id), tenant.embedding_model, current_model)
+            done += embedded + changed
+            if embedded and self.max_rows_per_second > 0:
+                await asyncio.sleep(embedded / self.max_rows_per_second)
+        return done
+
+    def _tenants(self, current_model: str) -> list:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            # New organizations have no vectors yet: they start on the current model
+            db.execute(
+                text("UPDATE organizations SET embedding_model = :model WHERE embedding_model IS NULL"),
+                {"model": current_model}
+            )
+            db.commit()
+            return db.execute(text("SELECT id, embedding_model FROM organizations ORDER BY id")).fetchall()
+        finally:
+            db.close()
+
+    async def _migrate_tenant(self, organization_id: str, active_model: str, current_model: str) -> tuple[int, int]:
+        """Do one step for a tenant; returns (rows embedded, rows deleted or switched)"""
+        from database import SessionLocal, engine
+
+        loop = asyncio.get_running_loop()
+        # One connection for the whole step: the advisory lock belongs to it, not to a transaction
+        connection = engine.connect()
+        db = SessionLocal(bind=connection)
+        lock_key = f"reembed:{organization_id}"
+        try:
+            locked = db.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": lock_key}).scalar()
+            db.commit()
+            if not locked:
+                return 0, 0
+            try:
+                if active_model != current_model:
+                    await loop.run_in_executor(None, self._ensure_migration, db, organization_id, active_model, current_model)
+
+                # The active model first: it is what searches read right now
+                models = [active_model] if active_model == current_model else [active_model, current_model]
+                for model in models:
+                    rows = await loop.run_in_executor(None, self._missing_vectors, db, organization_id, model)
+                    if not rows:
+                        continue
+                    try:
+                        written = await self._embed_rows(db, organization_id, model, rows)
+                    except Exception as e:
+                        db.rollback()
+                        self.failed_batches += 1
+                        logger.warning(f"Re-embedding {len(rows)} chunks of {organization_id} with {model} failed: {e}")
+                        continue
+                    if model == current_model and model != active_model:
+                        await loop.run_in_executor(None, self._record_progress, db, organization_id, written)
+                    return written, 0
+
+                if active_model != current_model:
+                    return 0, await loop.run_in_executor(None, self._switch, db, organization_id, active_model, current_model)
+                return 0, await loop.run_in_executor(None, self._prune, db, organization_id, active_model)
+            finally:
+                db.rollback()  # In case the step failed mid-transaction
+                db.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": lock_key})
+                db.commit()
+        finally:
+            db.close()
+            connection.close()
+
+    def _ensure_migration(self, db, organization_id: str, source_model: str, target_model: str):
+        """Record a running migration for the tenant, replacing one aimed at another model"""
+        db.execute(
+            text("""
+                UPDATE embedding_migrations SET status = 'cancelled', completed_at = NOW()
+                WHERE organization_id = :organization_id AND status = 'running' AND target_model <> :target_model
+            """),
+            {"organization_id": organization_id, "target_model": target_model}
+        )
+        db.execute(
+            text(f"""
+                INSERT INTO embedding_migrations (id, organization_id, source_model, target_model, status, total_chunks, started_at)
+                SELECT :id, :organization_id, :source_model, :target_model, 'running',
+                       (SELECT COUNT(*) FROM embeddings e
+                        WHERE e.organization_id = :organization_id AND e.embedding_model = :source_model
+                        AND {MIGRATABLE_ROW_SQL}),
+                       NOW()
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM embedding_migrations
+                    WHERE organization_id = :organization_id AND status = 'running'
+                )
+            """),
+            {
+                "id": str(uuid.uuid4()),
+                "organization_id": organization_id,
+                "source_model": source_model,
+                "target_model": target_model
+            }
+        )
+        db.commit()
+
+    def _missing_vectors(self, db, organization_id: str, model: str) -> list:
+        """Up to ``batch_size`` chunk positions that have no ``model`` vector yet"""
+        rows = db.execute(
+            text(f"""
+                SELECT e.domain_id, e.source_type, e.source_id, e.chunk_index,
+                       e.content_text, e.content_hash, e.metadata
+                FROM embeddings e
+                WHERE {MISSING_VECTOR_SQL}
+                LIMIT :limit
+            """),
+            {"organization_id": organization_id, "model": model, "limit": self.batch_size}
+        ).fetchall()
+        db.commit()
+
+        # A position can have rows in several other models; one embedding per position is enough
+        unique = {}
+        for row in rows:
+            unique.setdefault((str(row.source_id), row.chunk_index), row)
+        return list(unique.values())
+
+    async def _embed_rows(self, db, organization_id: str, model: str, rows: list) -> int:
+        """Embed rows' text with ``model`` and store them next to the existing vectors"""
+        from embedding_writer import EmbeddingBulkWriter
+
+        vectors = await embed_texts(model, [row.content_text for row in rows])
+        writer = EmbeddingBulkWriter(
+            [
+                "id", "organization_id", "domain_id", "source_type", "source_id", "chunk_index",
+                "content_text", "content_hash", "embedding", "metadata", "embedding_model", "created_at"
+            ],
+            on_conflict="""
+                ON CONFLICT (source_id, chunk_index, embedding_model) DO UPDATE SET id = EXCLUDED.id,
+                    content_text = EXCLUDED.content_text, content_hash = EXCLUDED.content_hash,
+                    embedding = EXCLUDED.embedding, metadata = EXCLUDED.metadata
+            """
+        )
+        created_at = datetime.utcnow()
+        for row, vector in zip(rows, vectors):
+            writer.add({
+                "id": model_vector_id(str(row.source_id), row.chunk_index, model),
+                "organization_id": organization_id,
+                "domain_id": str(row.domain_id) if row.domain_id else None,
+                "source_type": row.source_type,
+                "source_id": str(row.source_id),
+                "chunk_index": row.chunk_index,
+                "content_text": row.content_text,
+                "content_hash": row.content_hash,
+                "embedding": json.dumps(vector),
+                "metadata": row.metadata if isinstance(row.metadata, str) or row.metadata is None else json.dumps(row.metadata),
+                "embedding_model": model,
+                "created_at": created_at
+            })
+        written = await asyncio.get_running_loop().run_in_executor(None, writer.write, db)
+        db.commit()
+        self.embedded_count += written
+        return written
+
+    def _record_progress(self, db, organization_id: str, embedded: int):
+        db.execute(
+            text("""
+                UPDATE embedding_migrations SET embedded_chunks = embedded_chunks + :embedded
+                WHERE organization_id = :organization_id AND status = 'running'
+            """),
+            {"organization_id": organization_id, "embedded": embedded}
+        )
+        db.commit()
+
+    def _switch(self, db, organization_id: str, active_model: str, target_model: str) -> int:
+        """Point the tenant's searches at ``target_model`` if it covers every chunk; returns 1 if switched"""
+        switched = db.execute(
+            text(f"""
+                UPDATE organizations SET embedding_model = :model
+                WHERE id = :organization_id AND embedding_model = :active_model
+                AND NOT EXISTS (SELECT 1 FROM embeddings e WHERE {MISSING_VECTOR_SQL})
+            """),
+            {"organization_id": organization_id, "model": target_model, "active_model": active_model}
+        ).rowcount
+        if switched:
+            db.execute(
+                text("""
+                    UPDATE embedding_migrations SET status = 'completed', completed_at = NOW()
+                    WHERE organization_id = :organization_id AND status = 'running'
+                """),
+                {"organization_id": organization_id}
+            )
+            self.switch_count += 1
+            logger.info(f"Organization {organization_id} now searches {target_model} embeddings (was {active_model})")
+        db.commit()
+        return switched
+
+    def _prune(self, db, organization_id: str, active_model: str) -> int:
+        """Delete rows of other models whose position has an active-model vector of the same text"""
+        recently_switched = db.execute(
+            text("""
+                SELECT 1 FROM embedding_migrations
+                WHERE organization_id = :organization_id AND status = 'completed'
+                AND completed_at > NOW() - make_interval(secs => :grace)
+                LIMIT 1
+            """),
+            {"organization_id": organization_id, "grace": PRUNE_GRACE_SECONDS}
+        ).fetchone()
+        if recently_switched:
+            db.commit()
+            return 0
+
+        deleted = db.execute(
+            text(f"""
+                DELETE FROM embeddings WHERE id IN (
+                    SELECT e.id FROM embeddings e
+                    WHERE {STALE_VECTOR_SQL}
+                    LIMIT :limit
+                )
+            """),
+            {"organization_id": organization_id, "model": active_model, "limit": self.batch_size * 10}
+        ).rowcount
+        db.commit()
+        self.pruned_count += deleted
+        return deleted
+
+    def get_stats(self) -> Dict:
+        """Counters for the health endpoint"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "current_model": get_settings().embedding_current_model,
+            "embedded": self.embedded_count,
+            "pruned": self.pruned_count,
+            "switches": self.switch_count,
+            "failed_batches": self.failed_batches
+        }
+
+
+# Global instance
+_embedding_migrator: Optional[EmbeddingMigrator] = None
+
+
+def get_embedding_migrator() -> EmbeddingMigrator:
+    """Get the global embedding migrator (singleton)"""
+    global _embedding_migrator
+    if _embedding_migrator is None:
+        settings = get_settings()
+        _embedding_migrator = EmbeddingMigrator(
+            batch_size=settings.reembed_batch_size,
+            max_rows_per_second=settings.reembed_max_rows_per_second,
+            poll_interval=settings.reembed_poll_interval
+        )
+    return _embedding_migrator
@@ -0,0 +1,72 @@
+"""
+Embedding Writer - Bulk inserts for chunk / embedding rows
+Buffers rows for a document and writes them with large multi-row INSERTs so
+ingestion is bound by embedding throughput rather than database round trips
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBulkWriter:
+    """Accumulates rows and writes them ``batch_size`` rows per statement
+
+    ``write()`` only executes statements on the caller's session; the caller
+    commits, so all of a file's chunks land in one transaction.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        table: str = "embeddings",
+        batch_size: Optional[int] = None,
+        on_conflict: str = ""
+    ):
+        self.columns = list(columns)
+        self.table = table
+        self.batch_size = max(1, batch_size or get_settings().ingest_insert_batch_size)
+        self.on_conflict = on_conflict
+        self._rows: List[Dict] = []
+
+    def add(self, row: Dict):
+        """Buffer one row (missing columns are written as NULL)"""
+        self._rows.append(row)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def write(self, db) -> int:
+        """Insert all buffered rows on ``db`` without committing; returns rows written"""
+        written = 0
+        while self._rows:
+            batch, self._rows = self._rows[:self.batch_size], self._rows[self.batch_size:]
+            db.execute(self._build_insert(len(batch)), self._build_params(batch))
+            written += len(batch)
+        return written
+
+    def clear(self):
+        """Drop buffered rows (e.g. after a rollback)"""
+        self._rows = []
+
+    def _build_insert(self, row_count: int):
+        values_sql = []
+        for i in range(row_count):
+            values_sql.append(f"({', '.join(f':{column}_{i}' for column in self.columns)})")
+        return text(f"""
+            INSERT INTO {self.table} ({', '.join(self.columns)})
+            VALUES {', '.join(values_sql)}
+            {self.on_conflict}
+        """)
+
+    def _build_params(self, rows: List[Dict]) -> Dict:
+        params = {}
+        for i, row in enumerate(rows):
+            for column in self.columns:
+                params[f"{column}_{i}"] = row.get(column)
+        return params
@@ -0,0 +1,236 @@
+"""
+Extraction Pool - Runs CPU-bound document parsing in worker processes
+Keeps pypdf / python-docx / PyMuPDF off the API event loop with per-call
+timeouts, a per-worker memory limit and isolation from parser crashes.
+PDFs can be read from disk a window of pages at a time.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Raised when a document could not be extracted (timeout, memory limit or worker crash)"""
+
+
+def _init_worker(memory_limit_bytes: int):
+    """Cap the worker's address space so one huge document can't take the host down"""
+    if memory_limit_bytes <= 0:
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ImportError, ValueError, OSError) as e:
+        logging.getLogger(__name__).warning(f"Could not set extraction memory limit: {e}")
+
+
+def _extract_document(content: bytes, content_type: str, filename: str, with_visual: bool) -> Tuple[List[Any], Dict[str, Any]]:
+    """Worker entry point: structural blocks plus visual content for one document"""
+    from background_processor import FileProcessor
+
+    blocks = FileProcessor().extract_blocks_from_file(filename, content_type, content)
+
+    visual_content: Dict[str, Any] = {}
+    if with_visual:
+        try:
+            from ingestion.visual_extractor import VisualContentExtractor
+            visual_content = VisualContentExtractor().extract_visual_content(content, content_type, filename)
+        except MemoryError:
+            raise
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Failed to extract visual content from {filename}: {e}")
+            visual_content = {"images": [], "screenshots": [], "has_visual_content": False}
+
+    return blocks, visual_content
+
+
+def _count_pdf_pages(path: str) -> int:
+    """Worker entry point: number of pages in a PDF on disk"""
+    import pypdf
+    return len(pypdf.PdfReader(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Worker entry point: text of pages [start, end) of a PDF on disk
+
+    pypdf parses page objects lazily, so only the requested pages are loaded.
+    """
+    import pypdf
+    reader = pypdf.PdfReader(path)
+    pages = []
+    for page_number in range(start, min(end, len(reader.pages))):
+        try:
+            pages.append(reader.pages[page_number].extract_text() or "")
+        except MemoryError:
+            raise
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Failed to extract page {page_number + 1} of {path}: {e}")
+            pages.append("")
+    return pages
+
+
+def _extract_visual_from_path(path: str, content_type: str, filename: str) -> Dict[str, Any]:
+    """Worker entry point: visual content for a document on disk"""
+    from ingestion.visual_extractor import VisualContentExtractor
+
+    with open(path, "rb") as f:
+        content = f.read()
+    return VisualContentExtractor().extract_visual_content(content, content_type, filename)
+
+
+class ExtractionPool:
+    """Bounded process pool for document extraction
+
+    Each concurrency slot has its own single-process executor, so killing a runaway
+    parse only affects the file running in that slot.
+    """
+
+    def __init__(self, max_workers: int = 2, timeout_seconds: float = 120.0, memory_limit_mb: int = 1024):
+        self.max_workers = max(1, max_workers)
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.max_workers
+        self._free_slots: Optional[asyncio.Queue] = None
+
+        self.completed_count = 0
+        self.timeout_count = 0
+        self.crash_count = 0
+
+    def _get_executor(self, slot: int) -> ProcessPoolExecutor:
+        if self._executors[slot] is None:
+            self._executors[slot] = ProcessPoolExecutor(
+                max_workers=1,
+                # spawn: never fork a process that has an event loop and DB pool threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_bytes,)
+            )
+        return self._executors[slot]
+
+    def _reset_executor(self, slot: int):
+        """Kill the slot's worker (the only way to stop a runaway parse); a fresh one starts on next use"""
+        executor, self._executors[slot] = self._executors[slot], None
+        if executor is None:
+            return
+        for process in list(getattr(executor, "_processes", {}).values()):
+            try:
+                process.kill()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, filename: str, func, *args):
+        """Run ``func`` in a free slot's worker under the timeout
+
+        Raises ExtractionError on timeout, memory exhaustion or a crashed worker.
+        """
+        if self._free_slots is None:
+            self._free_slots = asyncio.Queue()
+            for slot in range(self.max_workers):
+                self._free_slots.put_nowait(slot)
+
+        slot = await self._free_slots.get()
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(self._get_executor(slot), func, *args),
+                    timeout=self.timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.timeout_count += 1
+                logger.error(f"Extraction of {filename} exceeded {self.timeout_seconds}s, restarting its worker")
+                self._reset_executor(slot)
+                raise ExtractionError(f"Extraction timed out after {self.timeout_seconds}s")
+            except BrokenProcessPool as e:
+                self.crash_count += 1
+                logger.error(f"Extraction worker crashed on {filename}: {e}")
+                self._reset_executor(slot)
+                raise ExtractionError("Extraction worker crashed")
+            except MemoryError:
+                raise ExtractionError(f"Extraction exceeded the {self.memory_limit_bytes // (1024 * 1024)}MB memory limit")
+            except asyncio.CancelledError:
+                # The caller gave up; don't leave its parse occupying the slot's worker
+                self._reset_executor(slot)
+                raise
+
+            self.completed_count += 1
+            return result
+        finally:
+            self._free_slots.put_nowait(slot)
+
+    async def extract(self, content: bytes, content_type: str, filename: str, with_visual: bool = True) -> Tuple[List[Any], Dict[str, Any]]:
+        """Extract structural blocks (see ``chunking.Block``) and visual content in a worker process"""
+        return await self._run(filename, _extract_document, content, content_type, filename, with_visual)
+
+    async def extract_visual(self, path: str, content_type: str, filename: str) -> Dict[str, Any]:
+        """Extract visual content from a file on disk"""
+        return await self._run(filename, _extract_visual_from_path, path, content_type, filename)
+
+    async def count_pdf_pages(self, path: str, filename: str) -> int:
+        return await self._run(filename, _count_pdf_pages, path)
+
+    async def iter_pdf_pages(self, path: str, filename: str, page_count: int, window: int = 20,
+                             start_page: int = 0) -> AsyncIterator[Tuple[int, List[str]]]:
+        """Yield ``(first_page_index, page_texts)`` for successive windows of a PDF on disk
+
+        The next window is extracted while the caller works on the current one; at most
+        two windows are held in memory. Each window gets its own timeout. ``start_page``
+        skips pages already handled by an earlier, interrupted run.
+        """
+        window = max(1, window)
+        starts = list(range(max(0, start_page), page_count, window))
+        if not starts:
+            return
+
+        pending = asyncio.ensure_future(self._run(filename, _extract_pdf_pages, path, starts[0], starts[0] + window))
+        try:
+            for i, start in enumerate(starts):
+                pages = await pending
+                if i + 1 < len(starts):
+                    next_start = starts[i + 1]
+                    pending = asyncio.ensure_future(self._run(filename, _extract_pdf_pages, path, next_start, next_start + window))
+                yield start, pages
+        finally:
+            if not pending.done():
+                pending.cancel()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        for slot, executor in enumerate(self._executors):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executors[slot] = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "max_workers": self.max_workers,
+            "completed_count": self.completed_count,
+            "timeout_count": self.timeout_count,
+            "crash_count": self.crash_count
+        }
+
+
+# Global instance
+_extraction_pool: Optional[ExtractionPool] = None
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """Get the global extraction pool (singleton)"""
+    global _extraction_pool
+    if _extraction_pool is None:
+        settings = get_settings()
+        _extraction_pool = ExtractionPool(
+            max_workers=settings.extraction_workers,
+            timeout_seconds=settings.extraction_timeout,
+            memory_limit_mb=settings.extraction_memory_limit_mb
+        )
+    return _extraction_pool
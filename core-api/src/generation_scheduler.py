@@ -0,0 +1,239 @@
+"""
+Generation Scheduler - Admission control in front of the LLM service
+Bounds concurrent Ollama generations and shares them fairly between organizations
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRejected(Exception):
+    """Raised when a generation is shed because the queue wait would exceed its deadline"""
+
+    def __init__(self, organization_id: Optional[str], estimated_wait: float, max_wait: float):
+        self.organization_id = organization_id
+        self.estimated_wait = estimated_wait
+        self.max_wait = max_wait
+        super().__init__(
+            f"Generation queue wait {estimated_wait:.1f}s exceeds deadline {max_wait:.1f}s"
+        )
+
+
+class GenerationScheduler:
+    """Weighted fair queue with a global concurrency limit for LLM generations
+
+    Each waiter gets a virtual finish tag of ``max(global_vt, org_last_tag) + 1 / weight``
+    and slots are granted in tag order, so a tenant with a deep backlog cannot push
+    other tenants' requests behind its own. Weights come from
+    ``organizations.generation_weight`` and are reloaded in the background every
+    ``weight_ttl_seconds``.
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_wait_seconds: float = 10.0, default_weight: float = 1.0,
+                 weight_ttl_seconds: float = 60.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_wait_seconds = max_wait_seconds
+        self.default_weight = default_weight
+        self.weight_ttl_seconds = weight_ttl_seconds
+        self.weights: Dict[str, float] = {}
+        self._weights_loaded_at: Optional[float] = None
+        self._weights_task: Optional[asyncio.Task] = None
+
+        self._heap: List[Tuple[float, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag: Dict[str, float] = {}
+        self._queued_by_org: Dict[str, int] = {}
+        self._in_flight = 0
+        self._in_flight_by_org: Dict[str, int] = {}
+
+        # Metrics
+        self._avg_generation_seconds = 5.0  # EWMA, seeded with a typical CPU generation time
+        self._wait_samples = deque(maxlen=500)
+        self.completed_count = 0
+        self.shed_count = 0
+        self.timeout_count = 0
+
+    def _refresh_weights(self):
+        """Start reloading organization weights if they are stale; queued requests don't wait for it"""
+        if self._weights_task is not None and not self._weights_task.done():
+            return
+        if self._weights_loaded_at is not None and time.monotonic() - self._weights_loaded_at < self.weight_ttl_seconds:
+            return
+        self._weights_loaded_at = time.monotonic()
+        self._weights_task = asyncio.get_running_loop().create_task(self._load_weights())
+
+    async def _load_weights(self):
+        try:
+            self.weights = await asyncio.get_running_loop().run_in_executor(None, self._fetch_weights)
+        except Exception as e:
+            logger.warning(f"Could not load generation weights, keeping the previous ones: {e}")
+
+    def _fetch_weights(self) -> Dict[str, float]:
+        """Fair-share weight per organization (higher = larger share); absent ones use the default"""
+        from sqlalchemy import text
+
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                text("SELECT id, generation_weight FROM organizations WHERE generation_weight <> 1")
+            ).fetchall()
+            return {str(row.id): max(float(row.generation_weight), 0.01) for row in rows}
+        finally:
+            db.close()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of generations waiting for a slot"""
+        return sum(self._queued_by_org.values())
+
+    def estimate_wait(self) -> float:
+        """Estimate how long a newly queued generation would wait for a slot"""
+        if self._in_flight < self.max_concurrent and self.queue_depth == 0:
+            return 0.0
+        return (self.queue_depth + 1) / self.max_concurrent * self._avg_generation_seconds
+
+    async def acquire(self, organization_id: Optional[str], max_wait: Optional[float] = None) -> float:
+        """Wait for a generation slot, returning the seconds spent queued
+
+        Raises GenerationRejected when the estimated or actual wait exceeds ``max_wait``.
+        """
+        org_key = organization_id or "anonymous"
+        max_wait = self.max_wait_seconds if max_wait is None else max_wait
+        self._refresh_weights()
+
+        if self._in_flight < self.max_concurrent and self.queue_depth == 0:
+            self._start(org_key)
+            self._wait_samples.append(0.0)
+            return 0.0
+
+        estimated_wait = self.estimate_wait()
+        if estimated_wait > max_wait:
+            self.shed_count += 1
+            logger.warning(
+                f"Shedding generation for org {org_key}: estimated wait {estimated_wait:.1f}s "
+                f"> {max_wait:.1f}s (queue depth {self.queue_depth})"
+            )
+            raise GenerationRejected(organization_id, estimated_wait, max_wait)
+
+        weight = self.weights.get(org_key, self.default_weight)
+        tag = max(self._virtual_time, self._last_tag.get(org_key, 0.0)) + 1.0 / weight
+        self._last_tag[org_key] = tag
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (tag, next(self._sequence), org_key, future))
+        self._queued_by_org[org_key] = self._queued_by_org.get(org_key, 0) + 1
+
+        enqueued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot was granted while we were giving up - hand it back
+                self.release(org_key)
+            else:
+                self._dequeued(org_key)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeout_count += 1
+                raise GenerationRejected(organization_id, time.monotonic() - enqueued_at, max_wait)
+            raise
+
+        waited = time.monotonic() - enqueued_at
+        self._wait_samples.append(waited)
+        return waited
+
+    def release(self, organization_id: Optional[str], generation_seconds: Optional[float] = None):
+        """Return a slot and wake the next waiter in fair-queue order"""
+        org_key = organization_id or "anonymous"
+        self._in_flight = max(0, self._in_flight - 1)
+        remaining = self._in_flight_by_org.get(org_key, 1) - 1
+        if remaining > 0:
+            self._in_flight_by_org[org_key] = remaining
+        else:
+            self._in_flight_by_org.pop(org_key, None)
+
+        if generation_seconds is not None:
+            self.completed_count += 1
+            self._avg_generation_seconds = 0.8 * self._avg_generation_seconds + 0.2 * generation_seconds
+
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, organization_id: Optional[str], max_wait: Optional[float] = None):
+        """Hold a generation slot for the duration of the block"""
+        await self.acquire(organization_id, max_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(organization_id, time.monotonic() - started)
+
+    def _start(self, org_key: str):
+        self._in_flight += 1
+        self._in_flight_by_org[org_key] = self._in_flight_by_org.get(org_key, 0) + 1
+
+    def _dequeued(self, org_key: str):
+        count = self._queued_by_org.get(org_key, 0) - 1
+        if count > 0:
+            self._queued_by_org[org_key] = count
+        else:
+            self._queued_by_org.pop(org_key, None)
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrent and self._heap:
+            tag, _, org_key, future = heapq.heappop(self._heap)
+            if future.done():
+                # Waiter gave up (timeout/cancel) and already left the queue
+                continue
+            self._dequeued(org_key)
+            self._virtual_time = max(self._virtual_time, tag)
+            self._start(org_key)
+            future.set_result(None)
+
+    def get_stats(self) -> Dict:
+        """Queue depth, wait-time and shedding metrics"""
+        waits = sorted(self._wait_samples)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_organization": dict(self._queued_by_org),
+            "in_flight_by_organization": dict(self._in_flight_by_org),
+            "avg_wait_ms": int(sum(waits) / len(waits) * 1000) if waits else 0,
+            "p95_wait_ms": int(p95 * 1000),
+            "estimated_wait_ms": int(self.estimate_wait() * 1000),
+            "avg_generation_ms": int(self._avg_generation_seconds * 1000),
+            "completed_count": self.completed_count,
+            "shed_count": self.shed_count,
+            "timeout_count": self.timeout_count
+        }
+
+
+# Global instance
+_generation_scheduler: Optional[GenerationScheduler] = None
+
+
+def get_generation_scheduler() -> GenerationScheduler:
+    """Get the global generation scheduler (singleton)"""
+    global _generation_scheduler
+    if _generation_scheduler is None:
+        settings = get_settings()
+        _generation_scheduler = GenerationScheduler(
+            max_concurrent=settings.llm_max_concurrent_generations,
+            max_wait_seconds=settings.llm_queue_max_wait,
+            weight_ttl_seconds=settings.llm_generation_weight_ttl
+        )
+    return _generation_scheduler
@@ -1,9 +1,9 @@
 """
 Visual Content Extractor
-Extracts and processes images, screenshots, and visual content from documents
+Extracts and processes images, screenshots, and visual content from documents.
+Image bytes are stored content-addressed in MinIO; only references end up in metadata.
 """
 
-import base64
 import logging
 from typing import List, Dict, Optional, Any
 from pathlib import Path
@@ -86,20 +86,18 @@ class VisualContentExtractor:
                         if pix.n - pix.alpha < 4:  # GRAY or RGB
                             img_data = pix.tobytes("png")
                             
-                            if len(img_data) <= self.max_image_size:
-                                img_base64 = base64.b64encode(img_data).decode('utf-8')
-                                
+                            stored = self._store_image(img_data, "image/png") if len(img_data) <= self.max_image_size else None
+                            if stored:
                                 # Determine if it's likely a screenshot vs regular image
                                 is_screenshot = self._classify_as_screenshot(pix.width, pix.height, filename)
                                 
                                 image_info = {
                                     "id": f"pdf_img_{page_num}_{img_index}",
                                     "type": "screenshot" if is_screenshot else "image",
-                                    "data": f"data:image/png;base64,{img_base64}",
+                                    **stored,
                                     "width": pix.width,
                                     "height": pix.height,
                                     "page": page_num + 1,
-                                    "size_bytes": len(img_data),
                                     "alt_text": f"Image from page {page_num + 1} of {filename}"
                                 }
                                 
@@ -195,9 +193,8 @@ class VisualContentExtractor:
                             
                             # Determine image format
                             img_format = self._detect_image_format(img_data)
-                            if img_format:
-                                img_base64 = base64.b64encode(img_data).decode('utf-8')
-                                
+                            stored = self._store_image(img_data, f"image/{img_format}") if img_format else None
+                            if stored:
                                 # Try to get image dimensions
                                 width, height = self._get_image_dimensions(img_data)
                                 
@@ -207,10 +204,9 @@ class VisualContentExtractor:
                                 image_info = {
                                     "id": f"docx_img_{i}",
                                     "type": "screenshot" if is_screenshot else "image",
-                                    "data": f"data:image/{img_format};base64,{img_base64}",
+                                    **stored,
                                     "width": width,
                                     "height": height,
-                                    "size_bytes": len(img_data),
                                     "alt_text": f"Image from {filename}"
                                 }
                                 
@@ -239,8 +235,9 @@ class VisualContentExtractor:
             if len(content) > self.max_image_size:
                 return {"images": [], "screenshots": [], "extraction_method": "too_large"}
             
-            img_format = content_type.split('/')[-1]
-            img_base64 = base64.b64encode(content).decode('utf-8')
+            stored = self._store_image(content, content_type)
+            if not stored:
+                return {"images": [], "screenshots": [], "extraction_method": "failed"}
             
             # Get image dimensions
             width, height = self._get_image_dimensions(content)
@@ -251,10 +248,9 @@ class VisualContentExtractor:
             image_info = {
                 "id": "single_image",
                 "type": "screenshot" if is_screenshot else "image",
-                "data": f"data:{content_type};base64,{img_base64}",
+                **stored,
                 "width": width,
                 "height": height,
-                "size_bytes": len(content),
                 "alt_text": filename
             }
             
@@ -267,6 +263,15 @@ class VisualContentExtractor:
             logger.error(f"Error processing single image: {e}")
             return {"images": [], "screenshots": [], "extraction_method": "failed"}
     
+    def _store_image(self, img_data: bytes, content_type: str) -> Optional[Dict[str, Any]]:
+        """Store image bytes content-addressed in MinIO; metadata keeps only the reference"""
+        try:
+            from storage_utils import minio_storage
+            return minio_storage.put_image(img_data, content_type)
+        except Exception as e:
+            logger.warning(f"Error storing extracted image: {e}")
+            return None
+    
     def _classify_as_screenshot(self, width: Optional[int], height: Optional[int], filename: str) -> bool:
         """Classify if an image is likely a screenshot"""
         if not width or not height:
@@ -3,10 +3,20 @@ LLM Service - Ollama Integration for Response Generation
 """
 
 import json
-import requests
-from typing import List, Dict, Optional
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict, Optional, AsyncIterator
 import logging
 
+import numpy as np
+
+from config import get_settings
+from ollama_client import get_ollama_client, OllamaEndpointPool
+from context_packer import get_context_packer
+from model_residency import get_model_residency
+
 logger = logging.getLogger(__name__)
 
 class LLMService:
@@ -23,18 +33,70 @@ class LLMService:
             "llama2:7b",        # Final fallback
         ]
         self.vision_analyzer = None
-        self._initialize_model()
-        self._initialize_vision()
-        
-    def _initialize_model(self):
+        self.request_timeout = get_settings().llm_request_timeout
+        self.prompt_token_budget = get_settings().llm_prompt_token_budget
+        self.default_model = "llama3.2:1b"  # Used until probing finds a better model
+        self.probe_interval = get_settings().llm_probe_interval
+        
+        # Generation hosts: OLLAMA_GENERATION_URLS, or just base_url
+        settings = get_settings()
+        generation_urls = [url.strip() for url in settings.ollama_generation_urls.split(',') if url.strip()]
+        self.endpoint_pool = OllamaEndpointPool(
+            generation_urls or [base_url],
+            hedge_enabled=settings.llm_hedge_enabled,
+            hedge_min_delay=settings.llm_hedge_min_delay_ms / 1000.0
+        )
+        
+        # Readiness state, maintained by the background probe
+        self.status = "initializing"  # initializing | ready | unavailable
+        self.ready = False
+        self.last_probe_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        
+        # Image description embeddings keyed by description hash (LRU)
+        self._image_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.image_embedding_cache_size = 2048
+    
+    def start_background_initialization(self):
+        """Start probing Ollama for models in the background (no-op if already running)"""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+    
+    async def stop_background_initialization(self):
+        """Cancel the background probe"""
+        if self._probe_task and not self._probe_task.done():
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+        self._probe_task = None
+    
+    async def _probe_loop(self):
+        """Select a model once Ollama is reachable, then keep readiness up to date"""
+        vision_initialized = False
+        while True:
+            await self._initialize_model()
+            if self.ready and not vision_initialized:
+                vision_initialized = await self._initialize_vision()
+            await asyncio.sleep(self.probe_interval)
+    
+    async def _initialize_model(self):
         """Initialize with the best available model"""
+        self.last_probe_at = time.time()
         try:
-            available_models = self._get_available_models()
+            await self.endpoint_pool.check_health()
+            available_models = await self._get_available_models()
+            
+            if available_models is None:
+                self._set_unavailable("Ollama not reachable")
+                return
             
             if not available_models:
                 logger.warning("No Ollama models found. Attempting to pull default model...")
-                self._auto_pull_model("llama3.2:1b")
-                available_models = self._get_available_models()
+                await self._auto_pull_model(self.default_model)
+                available_models = await self._get_available_models() or []
             
             # Select the best available model from preferences
             selected_model = None
@@ -43,36 +105,55 @@ class LLMService:
                     selected_model = preferred
                     break
             
-            if selected_model:
+            if not selected_model and available_models:
+                # Use the first available model
+                selected_model = available_models[0]
+                logger.warning(f"Using fallback model: {selected_model}")
+            
+            if not selected_model:
+                self._set_unavailable("No models available")
+                return
+            
+            if selected_model != self.model:
                 self.model = selected_model
                 logger.info(f"LLM Service initialized with model: {self.model}")
-            else:
-                # Use the first available model
-                self.model = available_models[0] if available_models else "llama3.2:1b"
-                logger.warning(f"Using fallback model: {self.model}")
+            get_model_residency().register("chat", self.model)
+            if not self.ready:
+                logger.info("✅ LLM service ready")
+            self.ready = True
+            self.status = "ready"
+            self.last_error = None
                 
         except Exception as e:
             logger.error(f"Failed to initialize LLM model: {e}")
-            self.model = "llama3.2:1b"  # Safe fallback
+            self._set_unavailable(str(e))
+    
+    def _set_unavailable(self, reason: str):
+        if self.ready or self.last_error != reason:
+            logger.warning(f"⚠️ LLM service unavailable: {reason}")
+        self.ready = False
+        self.status = "unavailable"
+        self.last_error = reason
     
-    def _get_available_models(self) -> List[str]:
-        """Get list of available models from Ollama"""
+    async def _get_available_models(self) -> Optional[List[str]]:
+        """Get list of available models from Ollama (None if Ollama is unreachable)"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            endpoint = self.endpoint_pool.pick()
+            response = await get_ollama_client().get(f"{endpoint.url}/api/tags", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 return [model["name"] for model in data.get("models", [])]
-            return []
+            return None
         except Exception as e:
-            logger.error(f"Failed to get available models: {e}")
-            return []
+            logger.debug(f"Failed to get available models: {e}")
+            return None
     
-    def _auto_pull_model(self, model_name: str) -> bool:
+    async def _auto_pull_model(self, model_name: str) -> bool:
         """Automatically pull a model if none are available"""
         try:
             logger.info(f"Auto-pulling model: {model_name}")
-            response = requests.post(
-                f"{self.base_url}/api/pull",
+            response = await get_ollama_client().post(
+                f"{self.endpoint_pool.pick().url}/api/pull",
                 json={"name": model_name},
                 timeout=300  # 5 minutes for model download
             )
@@ -88,48 +169,132 @@ class LLMService:
             logger.error(f"Error pulling model {model_name}: {e}")
             return False
     
-    def generate_response(
+    def get_status(self) -> Dict:
+        """Readiness state for the health endpoint"""
+        return {
+            "status": self.status,
+            "model": self.model,
+            "last_probe_at": self.last_probe_at,
+            "last_error": self.last_error,
+            "endpoints": self.endpoint_pool.get_stats(),
+            "vision": self.vision_analyzer.get_status() if self.vision_analyzer else {"status": "initializing"}
+        }
+    
+    async def generate_response(
         self, 
         query: str, 
         context: str, 
         sources: List[Dict],
-        intent: str = "general_query"
-    ) -> str:
-        """Generate a concise response using Ollama with proper citations"""
+        intent: str = "general_query",
+        timeout: Optional[float] = None,
+        fallback_on_error: bool = True
+    ) -> Optional[str]:
+        """Generate a concise response using Ollama with proper citations
+        
+        With ``fallback_on_error=False`` failures return None instead of the fallback text.
+        """
         
         # Create a focused prompt for concise responses
         prompt = self._create_concise_prompt(query, context, sources, intent)
         
+        # Deadline for the whole call - on expiry the request is cancelled and we fall back
+        deadline = timeout if timeout is not None else self.request_timeout
+        
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "max_tokens": 300,  # Reduced for more concise responses
-                        "stop": ["Human:", "Assistant:", "\n\n---", "Sources:", "References:"]
-                    }
-                },
-                timeout=30
-            )
+            response = await asyncio.wait_for(self._post_generation(prompt), timeout=deadline)
             
             if response.status_code == 200:
                 result = response.json()
-                raw_response = result.get("response", "").strip()
-                # Post-process to ensure clean, professional formatting
-                cleaned_response = self._clean_llm_response(raw_response)
-                return self._enhance_citations(cleaned_response, sources)
+                return self.finalize_response(result.get("response", ""), sources)
             else:
                 logger.error(f"Ollama API error: {response.status_code}")
-                return self._fallback_response(query, context, sources)
                 
+        except asyncio.TimeoutError:
+            logger.warning(f"LLM generation exceeded {deadline}s deadline, using fallback")
         except Exception as e:
             logger.error(f"LLM generation failed: {e}")
-            return self._fallback_response(query, context, sources)
+        
+        return self._fallback_response(query, context, sources) if fallback_on_error else None
+    
+    async def _post_generation(self, prompt: str):
+        async with get_model_residency().use("chat"):
+            return await self.endpoint_pool.post("/api/generate", self._generation_payload(prompt, stream=False))
+    
+    async def generate_response_stream(
+        self,
+        query: str,
+        context: str,
+        sources: List[Dict],
+        intent: str = "general_query",
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Stream raw response tokens from Ollama as they are generated
+        
+        Yields nothing if Ollama fails before the first token, so callers can fall back.
+        Pass the joined tokens through finalize_response() for citations and images.
+        """
+        prompt = self._create_concise_prompt(query, context, sources, intent)
+        deadline = timeout if timeout is not None else self.request_timeout
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline
+        
+        # Streams aren't hedged - route to the least loaded healthy host
+        endpoint = self.endpoint_pool.pick()
+        
+        try:
+            async with get_model_residency().use("chat", timeout=deadline), self.endpoint_pool.track(endpoint), get_ollama_client().stream(
+                "POST",
+                f"{endpoint.url}/api/generate",
+                json=self._generation_payload(prompt, stream=True)
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Ollama API error: {response.status_code}")
+                    return
+                
+                lines = response.aiter_lines()
+                while True:
+                    remaining = expires_at - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        return
+                    
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        return
+                        
+        except asyncio.TimeoutError:
+            logger.warning(f"LLM stream exceeded {deadline}s deadline, stopping generation")
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {e}")
+    
+    def finalize_response(self, raw_response: str, sources: List[Dict]) -> str:
+        """Clean raw model output and attach citation and image markup"""
+        # Post-process to ensure clean, professional formatting
+        cleaned_response = self._clean_llm_response(raw_response.strip())
+        return self._enhance_citations(cleaned_response, sources)
+    
+    def _generation_payload(self, prompt: str, stream: bool) -> Dict:
+        """Build the /api/generate request body"""
+        return {
+            "model": self.model or self.default_model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": get_model_residency().keep_alive("chat"),
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "max_tokens": 300,  # Reduced for more concise responses
+                "stop": ["Human:", "Assistant:", "\n\n---", "Sources:", "References:"]
+            }
+        }
     
     def _create_concise_prompt(self, query: str, context: str, sources: List[Dict], intent: str) -> str:
         """Create a concise prompt focused on direct answers"""
@@ -196,7 +361,16 @@ When describing the login process, reference the appropriate image using the EXA
         
         prompt += """ANSWER:"""
         
-        print(f"🔍 DEBUG LLM PROMPT: Final prompt length: {len(prompt)} characters")
+        # Image references and instructions share the window with the context - trim the context if they overflow it
+        counter = get_context_packer().counter
+        prompt_tokens = counter.count(prompt)
+        overflow = prompt_tokens - self.prompt_token_budget
+        if overflow > 0 and context:
+            trimmed_context = counter.truncate(context, counter.count(context) - overflow)
+            prompt = prompt.replace(context, trimmed_context, 1)
+            prompt_tokens = counter.count(prompt)
+        
+        logger.debug(f"Final prompt length: {len(prompt)} characters, {prompt_tokens}/{self.prompt_token_budget} tokens")
         print(f"🔍 DEBUG LLM PROMPT: Prompt preview:\n{prompt[:500]}...")
         
         return prompt
@@ -411,13 +585,12 @@ When describing the login process, reference the appropriate image using the EXA
         
         return response
     
-    def is_available(self) -> bool:
-        """Check if Ollama service is available"""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+    async def is_available(self) -> bool:
+        """Check if Ollama service is available (False until the first background probe settles)"""
+        if self._probe_task is None:
+            # First use outside the app lifespan (e.g. worker process) - start probing now
+            self.start_background_initialization()
+        return self.ready
     
     def _extract_image_references(self, sources: List[Dict], query: str = "") -> str:
         """Extract image references using semantic search on image descriptions"""
@@ -517,24 +690,23 @@ When describing the login process, reference the appropriate image using the EXA
             return all_images[:top_k]
         
         try:
-            # Check if any images have pre-computed embeddings
+            # Fetch every candidate's pre-computed embedding in one round trip
             images_with_embeddings = []
             images_without_embeddings = []
             
+            descriptions = [img['enhanced_description'] for img in all_images if img.get('enhanced_description')]
+            embeddings_by_description = self._get_image_description_embeddings(descriptions)
+            
             for img in all_images:
-                if img.get('enhanced_description'):
-                    # Try to find pre-computed embedding for this image description
-                    pre_computed_embedding = self._get_image_description_embedding(img.get('enhanced_description'))
-                    if pre_computed_embedding:
-                        img['pre_computed_embedding'] = pre_computed_embedding
-                        images_with_embeddings.append(img)
-                        print(f"✅ DEBUG: Found pre-computed embedding for image: {img.get('enhanced_description', '')[:50]}...")
-                    else:
-                        images_without_embeddings.append(img)
-                        print(f"⚠️ DEBUG: No pre-computed embedding found for: {img.get('enhanced_description', '')[:50]}...")
+                pre_computed_embedding = embeddings_by_description.get(img.get('enhanced_description') or "")
+                if pre_computed_embedding is not None:
+                    img['pre_computed_embedding'] = pre_computed_embedding
+                    images_with_embeddings.append(img)
                 else:
                     images_without_embeddings.append(img)
             
+            logger.debug(f"Pre-computed embeddings found for {len(images_with_embeddings)}/{len(all_images)} images")
+            
             # If we have pre-computed embeddings, use them for efficient search
             if images_with_embeddings:
                 return self._search_with_precomputed_embeddings(query, images_with_embeddings, top_k)
@@ -548,89 +720,94 @@ When describing the login process, reference the appropriate image using the EXA
             # Fallback to first few images
             return all_images[:top_k]
     
-    def _get_image_description_embedding(self, description: str) -> Optional[List[float]]:
-        """Get pre-computed embedding for image description from database"""
+    def _get_image_description_embeddings(self, descriptions: List[str]) -> Dict[str, np.ndarray]:
+        """Get pre-computed embeddings for image descriptions, from the cache or one DB query"""
+        found = {}
+        missing = []
+        for description in dict.fromkeys(descriptions):
+            key = hashlib.sha1(description.encode('utf-8')).hexdigest()
+            cached = self._image_embedding_cache.get(key)
+            if cached is not None:
+                self._image_embedding_cache.move_to_end(key)
+                found[description] = cached
+            else:
+                missing.append(description)
+        
+        if not missing:
+            return found
+        
+        db = None
         try:
             from dependencies import get_db
             from sqlalchemy import text
-            import numpy as np
+            
+            from embedding_migrator import LOCAL_EMBEDDING_MODEL
             
             db = next(get_db())
             
-            # Look up pre-computed embedding by description text
-            result = db.execute(
+            # Look up pre-computed embeddings by description text; queries here are embedded
+            # with the local SentenceTransformer, so only its vectors are comparable
+            rows = db.execute(
                 text("""
-                    SELECT embedding 
+                    SELECT DISTINCT ON (content_text) content_text, embedding
                     FROM embeddings 
                     WHERE source_type = 'image_description' 
-                    AND content_text = :description
-                    LIMIT 1
+                    AND content_text = ANY(:descriptions)
+                    AND embedding_model = :embedding_model
                 """),
-                {"description": description}
-            ).fetchone()
+                {"descriptions": missing, "embedding_model": LOCAL_EMBEDDING_MODEL}
+            ).fetchall()
             
-            if result and result.embedding:
-                # PostgreSQL vector column returns list, but ensure it's properly typed
-                embedding = result.embedding
-                
-                # Convert to numpy array and then back to list to ensure proper float types
-                if isinstance(embedding, (list, tuple)):
-                    # Convert to float array to ensure proper numerical types
-                    embedding_array = np.array(embedding, dtype=np.float32)
-                    return embedding_array.tolist()
-                elif isinstance(embedding, str):
-                    # Handle case where it might be returned as string representation
-                    try:
-                        import json
-                        embedding_list = json.loads(embedding)
-                        embedding_array = np.array(embedding_list, dtype=np.float32)
-                        return embedding_array.tolist()
-                    except:
-                        print(f"❌ DEBUG: Could not parse embedding string: {embedding[:50]}...")
-                        return None
-                else:
-                    print(f"❌ DEBUG: Unexpected embedding type: {type(embedding)}")
-                    return None
+            for row in rows:
+                embedding = self._parse_embedding(row.embedding)
+                if embedding is None:
+                    continue
+                found[row.content_text] = embedding
+                self._image_embedding_cache[hashlib.sha1(row.content_text.encode('utf-8')).hexdigest()] = embedding
             
-            return None
+            while len(self._image_embedding_cache) > self.image_embedding_cache_size:
+                self._image_embedding_cache.popitem(last=False)
             
         except Exception as e:
-            print(f"❌ DEBUG: Failed to get pre-computed embedding: {e}")
+            logger.warning(f"Failed to get pre-computed image embeddings: {e}")
+        finally:
+            if db is not None:
+                db.close()
+        
+        return found
+    
+    def _parse_embedding(self, embedding) -> Optional[np.ndarray]:
+        """Convert a vector column value (list or '[...]' string) to a float32 array"""
+        if embedding is None:
+            return None
+        if isinstance(embedding, str):
+            # Handle case where it might be returned as string representation
+            try:
+                embedding = json.loads(embedding)
+            except ValueError:
+                logger.debug(f"Could not parse embedding string: {embedding[:50]}...")
+                return None
+        try:
+            return np.asarray(embedding, dtype=np.float32)
+        except (TypeError, ValueError):
+            logger.debug(f"Unexpected embedding type: {type(embedding)}")
             return None
     
     def _search_with_precomputed_embeddings(self, query: str, images_with_embeddings: List[Dict], top_k: int) -> List[Dict]:
         """Efficient search using pre-computed embeddings"""
         try:
             from main import embeddings_model
-            import numpy as np
             
             # Embed query once
-            query_embedding = embeddings_model.encode([query])[0]
-            print(f"🔍 DEBUG: Query embedding shape: {query_embedding.shape}, dtype: {query_embedding.dtype}")
-            
-            # Calculate similarities using pre-computed embeddings
-            similarities = []
-            for i, img in enumerate(images_with_embeddings):
-                try:
-                    # Ensure pre-computed embedding is properly typed
-                    pre_computed_embedding = np.array(img['pre_computed_embedding'], dtype=np.float32)
-                    print(f"🔍 DEBUG: Image {i} embedding shape: {pre_computed_embedding.shape}, dtype: {pre_computed_embedding.dtype}")
-                    
-                    # Ensure query embedding is also float32 for compatibility
-                    query_embedding_typed = np.array(query_embedding, dtype=np.float32)
-                    
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_embedding_typed, pre_computed_embedding) / (
-                        np.linalg.norm(query_embedding_typed) * np.linalg.norm(pre_computed_embedding)
-                    )
-                    similarities.append(float(similarity))  # Ensure it's a Python float
-                    
-                    description = img.get('enhanced_description', 'No description')[:50]
-                    print(f"🔍 DEBUG: Similarity {i}: {similarity:.3f} for '{description}...'")
-                    
-                except Exception as e:
-                    print(f"❌ DEBUG: Failed to calculate similarity for image {i}: {e}")
-                    similarities.append(0.0)  # Add zero similarity for failed calculations
+            query_embedding = np.asarray(embeddings_model.encode([query])[0], dtype=np.float32)
+            
+            # Score all candidates at once; mismatched dimensions score 0
+            similarities = np.zeros(len(images_with_embeddings), dtype=np.float32)
+            valid = [i for i, img in enumerate(images_with_embeddings) if img['pre_computed_embedding'].shape == query_embedding.shape]
+            if valid:
+                matrix = np.stack([images_with_embeddings[i]['pre_computed_embedding'] for i in valid])
+                similarities[valid] = self._cosine_similarities(query_embedding, matrix)
+            similarities = similarities.tolist()
             
             if not similarities:
                 print(f"❌ DEBUG: No valid similarities calculated")
@@ -702,13 +879,7 @@ When describing the login process, reference the appropriate image using the EXA
             description_embeddings = embeddings_model.encode(image_descriptions)
             
             # Calculate similarities
-            import numpy as np
-            similarities = []
-            for desc_embedding in description_embeddings:
-                similarity = np.dot(query_embedding, desc_embedding) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(desc_embedding)
-                )
-                similarities.append(similarity)
+            similarities = self._cosine_similarities(query_embedding, description_embeddings).tolist()
             
             # Get top-k most similar images
             top_indices = np.argsort(similarities)[-top_k:][::-1]  # Descending order
@@ -730,22 +901,35 @@ When describing the login process, reference the appropriate image using the EXA
             # Fallback to first few images
             return valid_images[:top_k]
     
-    def _initialize_vision(self):
+    def _cosine_similarities(self, query_embedding: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one query vector against each row of matrix"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_embedding)
+        return (matrix @ query_embedding) / np.where(norms == 0, 1.0, norms)
+    
+    async def _initialize_vision(self) -> bool:
         """Initialize vision analyzer if available"""
         try:
             from vision_analyzer import get_vision_analyzer
             self.vision_analyzer = get_vision_analyzer()
+            await self.vision_analyzer.initialize()
             if self.vision_analyzer.available:
                 logger.info("✅ Vision analyzer initialized")
             else:
                 logger.info("⚠️ Vision analyzer not available (no vision model)")
+            return True
         except Exception as e:
             logger.error(f"❌ Failed to initialize vision analyzer: {e}")
             self.vision_analyzer = None
+            return False
 
-# Global instance
-llm_service = LLMService()
+# Global instance (created lazily; model probing starts in the background)
+_llm_service: Optional[LLMService] = None
 
 def get_llm_service() -> LLMService:
     """Get the global LLM service instance"""
-    return llm_service 
\ No newline at end of file
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = LLMService()
+    return _llm_service
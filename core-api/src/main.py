@@ -50,6 +50,15 @@ from routes.scraper_management_routes import router as scraper_management_router
 
 # Import core services
 from rag_processor import initialize_rag_processor
+from generation_scheduler import get_generation_scheduler
+from llm_service import get_llm_service
+from model_residency import get_model_residency
+from telemetry_writer import get_telemetry_writer
+from chunk_dedup import get_chunk_deduplicator
+from vision_queue import get_vision_queue
+from embedding_migrator import get_embedding_migrator, LOCAL_EMBEDDING_MODEL
+from classifiers import classifier
+from config import get_settings
 from auth_utils import SessionManager
 
 # Set up logging
@@ -98,12 +107,20 @@ async def lifespan(app: FastAPI):
     try:
         logger.info("Loading embeddings model...")
         # Use a 768-dimensional model to match our system configuration
-        embeddings_model = SentenceTransformer('all-mpnet-base-v2')  # 768-dimensional model
+        embeddings_model = SentenceTransformer(LOCAL_EMBEDDING_MODEL)  # 768-dimensional model
         logger.info("✅ Embeddings model loaded")
     except Exception as e:
         logger.error(f"❌ Failed to load embeddings model: {e}")
         embeddings_model = None
     
+    # Load tokenizers off the event loop now rather than on the first chat or upload
+    import asyncio
+    from chunking import get_chunker
+    from context_packer import get_context_packer
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, get_context_packer().counter.load)
+    await loop.run_in_executor(None, get_chunker().counter.load)
+    
     # Initialize RAG processor
     if embeddings_model:
         try:
@@ -121,6 +138,15 @@ async def lifespan(app: FastAPI):
             logger.error(f"❌ Failed to initialize RAG processor: {e}")
             rag_processor = None
     
+    # Probe Ollama for models in the background so startup doesn't wait on it
+    get_llm_service().start_background_initialization()
+    logger.info("✅ LLM model probing started")
+    get_model_residency().start()
+    get_telemetry_writer().start()
+    get_vision_queue().start()  # Describes queued images in the background
+    get_embedding_migrator().start()  # Moves tenants onto the current embedding model
+    classifier.centroid_classifier.start_background_build(get_settings().embedding_current_model)  # Intent centroids, off the chat path
+    
     # Initialize background processor
     try:
         from background_processor import BackgroundJobProcessor
@@ -155,6 +181,23 @@ async def lifespan(app: FastAPI):
     if background_job_processor:
         background_job_processor.stop()
         logger.info("✅ Background processor stopped")
+    
+    from extraction_pool import get_extraction_pool
+    get_extraction_pool().shutdown()
+
+    await get_llm_service().stop_background_initialization()
+    await get_model_residency().stop()
+    await get_telemetry_writer().stop()  # Flushes queued analytics rows
+    await get_vision_queue().stop()
+    await get_embedding_migrator().stop()
+    await classifier.centroid_classifier.stop_background_build()
+    
+    # Release pooled Ollama connections
+    try:
+        from ollama_client import close_ollama_client
+        await close_ollama_client()
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to close Ollama client: {e}")
 
 # ============================================================================
 # APPLICATION SETUP
@@ -192,8 +235,15 @@ async def health_check():
             "database": "connected",
             "redis": "connected" if redis_client else "unavailable",
             "embeddings": "loaded" if embeddings_model else "unavailable",
-            "rag_processor": "initialized" if rag_processor else "unavailable"
-        }
+            "rag_processor": "initialized" if rag_processor else "unavailable",
+            "llm": get_llm_service().get_status()
+        },
+        "llm_queue": get_generation_scheduler().get_stats(),
+        "model_residency": get_model_residency().get_stats(),
+        "telemetry": get_telemetry_writer().get_stats(),
+        "chunk_dedup": get_chunk_deduplicator().get_stats(),
+        "vision_queue": get_vision_queue().get_stats(),
+        "embedding_migrator": get_embedding_migrator().get_stats()
     }
 
 # ============================================================================
@@ -219,6 +269,40 @@ if DEBUG:
     app.include_router(debug_router, prefix="/debug", tags=["Debug"])
     logger.info("🔧 Debug endpoints enabled")
 
+# Content-addressed images extracted from documents and web pages
+@app.get("/api/images/content/{content_hash}")
+async def serve_stored_image(content_hash: str):
+    """Serve an extracted image by its sha256"""
+    if len(content_hash) != 64 or any(c not in "0123456789abcdef" for c in content_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    from storage_utils import minio_storage
+    import asyncio
+
+    try:
+        image = await asyncio.wait_for(
+            asyncio.get_event_loop().run_in_executor(None, minio_storage.get_image, content_hash),
+            timeout=10.0
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout downloading image: {content_hash}")
+        raise HTTPException(status_code=504, detail="Timeout downloading image")
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    file_data, content_type = image
+    return Response(
+        content=file_data,
+        media_type=content_type,
+        headers={
+            # The URL names the content, so it never changes; private keeps tenant images out of shared caches
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Access-Control-Allow-Origin": "*",
+            "Content-Length": str(len(file_data))
+        }
+    )
+
 # Add image proxy endpoint for serving MinIO images
 @app.get("/api/images/{organization_slug}/{domain}/{year}/{month}/{image_path:path}")
 async def proxy_image(
@@ -0,0 +1,258 @@
+"""
+Model Residency Manager - Keeps Ollama models loaded when they are needed
+Sets keep_alive per model, warms models during business hours, tracks load/unload
+events and stops heavy models (chat vs vision) from evicting each other mid-traffic
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import get_settings
+from ollama_client import get_ollama_client
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_range(value: str, default: Tuple[int, int]) -> Tuple[int, int]:
+    """Parse an inclusive-exclusive 'start-end' range such as '8-18'"""
+    try:
+        start, end = value.split('-', 1)
+        return int(start), int(end)
+    except (ValueError, AttributeError):
+        return default
+
+
+class ModelResidencyManager:
+    """Tracks which Ollama models are resident and keeps the important ones warm"""
+
+    ROLES = ("chat", "vision", "embedding")
+
+    def __init__(
+        self,
+        base_url: str,
+        keep_alive: Dict[str, str],
+        warm_roles: List[str],
+        warm_interval: float = 240.0,
+        business_hours: Tuple[int, int] = (8, 18),
+        business_days: Tuple[int, int] = (0, 4),
+        heavy_roles: Tuple[str, ...] = ("chat", "vision"),
+        exclusive_heavy: bool = True,
+        max_switch_wait: float = 30.0
+    ):
+        self.base_url = base_url
+        self.keep_alive_by_role = keep_alive
+        self.warm_roles = set(warm_roles)
+        self.warm_interval = warm_interval
+        self.business_hours = business_hours
+        self.business_days = business_days
+        self.heavy_roles = set(heavy_roles)
+        self.exclusive_heavy = exclusive_heavy
+        self.max_switch_wait = max_switch_wait
+
+        self.models: Dict[str, str] = {}  # role -> model name
+        self._resident: Set[str] = set()
+        self._resident_known = False
+        self.events = deque(maxlen=100)
+        self.load_count = 0
+        self.unload_count = 0
+        self.warm_ping_count = 0
+        self._task: Optional[asyncio.Task] = None
+
+        # Heavy model gate: one heavy role runs at a time so they don't evict each other
+        self._gate: Optional[asyncio.Condition] = None
+        self._active_heavy: Optional[str] = None
+        self._heavy_in_flight = 0
+        self._waiting_since: Dict[str, float] = {}
+        self._waiting_count: Dict[str, int] = {}
+        self.switch_count = 0
+
+    def register(self, role: str, model: str):
+        """Record which model serves a role (chat, vision or embedding)"""
+        if self.models.get(role) != model:
+            self.models[role] = model
+            logger.info(f"Model residency: {role} -> {model} (keep_alive={self.keep_alive(role)})")
+
+    def keep_alive(self, role: str) -> str:
+        """keep_alive value to send with requests for a role's model"""
+        return self.keep_alive_by_role.get(role, "5m")
+
+    @asynccontextmanager
+    async def use(self, role: str, timeout: Optional[float] = None):
+        """Hold the model for a role; heavy roles wait for the other heavy model to drain
+
+        Raises asyncio.TimeoutError if the gate is not entered within ``timeout`` seconds.
+        """
+        if not self.exclusive_heavy or role not in self.heavy_roles:
+            yield
+            return
+
+        if self._gate is None:
+            self._gate = asyncio.Condition()
+
+        async with self._gate:
+            self._waiting_count[role] = self._waiting_count.get(role, 0) + 1
+            self._waiting_since.setdefault(role, time.monotonic())
+            try:
+                await asyncio.wait_for(self._gate.wait_for(lambda: self._can_enter(role)), timeout=timeout)
+            finally:
+                self._waiting_count[role] -= 1
+                if not self._waiting_count[role]:
+                    self._waiting_count.pop(role)
+                    self._waiting_since.pop(role, None)
+
+            if self._active_heavy != role:
+                if self._active_heavy is not None:
+                    self.switch_count += 1
+                    logger.info(f"Model residency: switching heavy model {self._active_heavy} -> {role}")
+                self._active_heavy = role
+            self._heavy_in_flight += 1
+
+        try:
+            yield
+        finally:
+            async with self._gate:
+                self._heavy_in_flight -= 1
+                self._gate.notify_all()
+
+    def _can_enter(self, role: str) -> bool:
+        if self._heavy_in_flight == 0:
+            # Idle: the role that has waited longest goes first
+            oldest = min(self._waiting_since.items(), key=lambda item: item[1])[0]
+            return oldest == role
+        if self._active_heavy != role:
+            return False
+        # Keep batching the active role unless another heavy role has waited too long
+        now = time.monotonic()
+        return not any(
+            other != role and now - since > self.max_switch_wait
+            for other, since in self._waiting_since.items()
+        )
+
+    def start(self):
+        """Start the warm-ping / residency polling loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the polling loop"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def in_business_hours(self, now: Optional[datetime] = None) -> bool:
+        """True when warm pings should keep models resident"""
+        now = now or datetime.now()
+        start_day, end_day = self.business_days
+        start_hour, end_hour = self.business_hours
+        return start_day <= now.weekday() <= end_day and start_hour <= now.hour < end_hour
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_resident_models()
+                if self.in_business_hours():
+                    await self._warm_models()
+            except Exception as e:
+                logger.warning(f"Model residency check failed: {e}")
+            await asyncio.sleep(self.warm_interval)
+
+    async def refresh_resident_models(self):
+        """Poll /api/ps and record load/unload events since the last poll"""
+        response = await get_ollama_client().get(f"{self.base_url}/api/ps", timeout=5)
+        if response.status_code != 200:
+            return
+        resident = {model["name"] for model in response.json().get("models", [])}
+
+        if self._resident_known:
+            for model in resident - self._resident:
+                self._record_event("loaded", model)
+            for model in self._resident - resident:
+                self._record_event("unloaded", model)
+        self._resident = resident
+        self._resident_known = True
+
+    def _record_event(self, event: str, model: str):
+        if event == "loaded":
+            self.load_count += 1
+        else:
+            self.unload_count += 1
+        self.events.append({"event": event, "model": model, "at": datetime.utcnow().isoformat()})
+        logger.info(f"Model residency: {model} {event}")
+
+    async def _warm_models(self):
+        """Ping warm roles so Ollama loads them / extends their keep_alive"""
+        for role in self.ROLES:
+            model = self.models.get(role)
+            if role not in self.warm_roles or not model:
+                continue
+            # Don't pull a heavy model back in while the other heavy model is busy
+            if role in self.heavy_roles and self._heavy_in_flight and self._active_heavy != role:
+                continue
+
+            if role == "embedding":
+                url = f"{self.base_url}/api/embeddings"
+                payload = {"model": model, "prompt": "", "keep_alive": self.keep_alive(role)}
+            else:
+                # An empty prompt loads the model without generating anything
+                url = f"{self.base_url}/api/generate"
+                payload = {"model": model, "keep_alive": self.keep_alive(role)}
+
+            try:
+                response = await get_ollama_client().post(url, json=payload, timeout=120)
+                if response.status_code == 200:
+                    self.warm_ping_count += 1
+                    if model not in self._resident:
+                        self._record_event("loaded", model)
+                        self._resident.add(model)
+            except Exception as e:
+                logger.warning(f"Warm ping for {model} failed: {e}")
+
+    def get_stats(self) -> Dict:
+        """Residency state and load/unload counters for the health endpoint"""
+        return {
+            "models": dict(self.models),
+            "keep_alive": {role: self.keep_alive(role) for role in self.models},
+            "resident": sorted(self._resident),
+            "warming": self.in_business_hours(),
+            "active_heavy_role": self._active_heavy,
+            "heavy_in_flight": self._heavy_in_flight,
+            "heavy_switch_count": self.switch_count,
+            "load_count": self.load_count,
+            "unload_count": self.unload_count,
+            "warm_ping_count": self.warm_ping_count,
+            "recent_events": list(self.events)[-10:]
+        }
+
+
+# Global instance
+_model_residency: Optional[ModelResidencyManager] = None
+
+
+def get_model_residency() -> ModelResidencyManager:
+    """Get the global model residency manager (singleton)"""
+    global _model_residency
+    if _model_residency is None:
+        settings = get_settings()
+        _model_residency = ModelResidencyManager(
+            base_url=settings.ollama_base_url,
+            keep_alive={
+                "chat": settings.ollama_chat_keep_alive,
+                "vision": settings.ollama_vision_keep_alive,
+                "embedding": settings.ollama_embedding_keep_alive
+            },
+            warm_roles=[role.strip() for role in settings.ollama_warm_roles.split(',') if role.strip()],
+            warm_interval=settings.ollama_warm_interval,
+            business_hours=_parse_range(settings.ollama_warm_hours, (8, 18)),
+            business_days=_parse_range(settings.ollama_warm_days, (0, 4)),
+            exclusive_heavy=settings.ollama_exclusive_heavy_models
+        )
+    return _model_residency
@@ -0,0 +1,236 @@
+"""
+Ollama HTTP Client - Shared pooled async client for Ollama API calls
+and load-balanced, hedged routing across multiple Ollama hosts
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Shared client instance (created lazily inside the running event loop)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_ollama_client() -> httpx.AsyncClient:
+    """Get the shared pooled HTTP client used for all Ollama calls"""
+    global _client
+    if _client is None or _client.is_closed:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.llm_request_timeout,
+                connect=settings.llm_connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=30.0
+            )
+        )
+        logger.info(
+            f"Ollama HTTP client created (max_connections={settings.llm_max_connections}, "
+            f"keepalive={settings.llm_max_keepalive_connections})"
+        )
+    return _client
+
+
+async def close_ollama_client():
+    """Close the shared client and release pooled connections"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Ollama HTTP client closed")
+    _client = None
+
+
+class OllamaEndpoint:
+    """One Ollama host with health, load and latency tracking"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True  # Optimistic until the first health check says otherwise
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.request_count = 0
+        self.failure_count = 0
+        self.latencies = deque(maxlen=200)
+
+    def p95_latency(self) -> Optional[float]:
+        """95th percentile of recent successful request latencies (None until enough samples)"""
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def record_success(self, seconds: float):
+        self.latencies.append(seconds)
+        self.consecutive_failures = 0
+        self.healthy = True
+
+    def record_failure(self, max_failures: int):
+        self.failure_count += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures and self.healthy:
+            self.healthy = False
+            logger.warning(f"Ollama endpoint {self.url} marked unhealthy after {self.consecutive_failures} failures")
+
+    def get_stats(self) -> Dict:
+        p95 = self.p95_latency()
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "request_count": self.request_count,
+            "failure_count": self.failure_count,
+            "p95_latency_ms": int(p95 * 1000) if p95 is not None else None
+        }
+
+
+class OllamaEndpointPool:
+    """Routes generation requests across several Ollama hosts
+
+    Requests go to the healthy endpoint with the fewest outstanding requests. A
+    non-streaming request still running after the endpoint's p95 latency is hedged
+    to a second endpoint; whichever answers first wins and the other is cancelled.
+    """
+
+    def __init__(self, urls: List[str], hedge_enabled: bool = True, hedge_min_delay: float = 2.0, max_failures: int = 3):
+        self.endpoints = [OllamaEndpoint(url) for url in dict.fromkeys(urls)]
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.max_failures = max_failures
+        self.hedge_count = 0
+        self.hedge_win_count = 0
+        self.fallback_count = 0
+
+    def pick(self, exclude: Optional[Set[str]] = None) -> Optional[OllamaEndpoint]:
+        """Least-outstanding-requests choice among healthy endpoints (any endpoint if none are healthy)"""
+        candidates = [e for e in self.endpoints if not exclude or e.url not in exclude]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if e.healthy]
+        return min(healthy or candidates, key=lambda e: (e.outstanding, e.p95_latency() or 0.0))
+
+    async def check_health(self) -> int:
+        """Probe every endpoint's /api/tags, returning the number of healthy endpoints"""
+        client = get_ollama_client()
+
+        async def probe(endpoint: OllamaEndpoint):
+            try:
+                response = await client.get(f"{endpoint.url}/api/tags", timeout=5)
+                healthy = response.status_code == 200
+            except Exception:
+                healthy = False
+            if healthy != endpoint.healthy:
+                logger.info(f"Ollama endpoint {endpoint.url} is now {'healthy' if healthy else 'unhealthy'}")
+            endpoint.healthy = healthy
+            if healthy:
+                endpoint.consecutive_failures = 0
+
+        await asyncio.gather(*(probe(e) for e in self.endpoints))
+        return sum(1 for e in self.endpoints if e.healthy)
+
+    @asynccontextmanager
+    async def track(self, endpoint: OllamaEndpoint):
+        """Count an in-flight request against an endpoint and record its outcome"""
+        endpoint.outstanding += 1
+        endpoint.request_count += 1
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            endpoint.record_failure(self.max_failures)
+            raise
+        else:
+            endpoint.record_success(time.monotonic() - started)
+        finally:
+            endpoint.outstanding -= 1
+
+    async def post(self, path: str, payload: Dict) -> httpx.Response:
+        """POST to the best endpoint, hedging to a second one if it runs past p95"""
+        primary = self.pick()
+        if primary is None:
+            raise RuntimeError("No Ollama endpoints configured")
+
+        tasks = {asyncio.ensure_future(self._post_to(primary, path, payload)): primary}
+        tried = {primary.url}
+        try:
+            hedge_delay = self._hedge_delay(primary)
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    secondary = self.pick(exclude=tried)
+                    if secondary is not None and secondary.healthy:
+                        self.hedge_count += 1
+                        logger.info(f"Hedging generation from {primary.url} to {secondary.url} after {hedge_delay:.1f}s")
+                        tasks[asyncio.ensure_future(self._post_to(secondary, path, payload))] = secondary
+                        tried.add(secondary.url)
+
+            last_error: Optional[BaseException] = None
+            while True:
+                pending = [t for t in tasks if not t.done()]
+                if pending:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task, endpoint in tasks.items():
+                    if task.done() and not task.cancelled() and task.exception() is None:
+                        if endpoint is not primary:
+                            self.hedge_win_count += 1
+                        return task.result()
+
+                if any(not t.done() for t in tasks):
+                    continue
+
+                # Everything tried so far failed - fall back to an endpoint we haven't used yet
+                last_error = next((t.exception() for t in tasks if not t.cancelled() and t.exception()), last_error)
+                fallback = self.pick(exclude=tried)
+                if fallback is None:
+                    raise last_error or RuntimeError("All Ollama endpoints failed")
+                self.fallback_count += 1
+                logger.warning(f"Generation failed on {', '.join(tried)}; falling back to {fallback.url}")
+                tasks = {asyncio.ensure_future(self._post_to(fallback, path, payload)): fallback}
+                tried.add(fallback.url)
+        finally:
+            # Cancel the losing (or abandoned) requests so their hosts stop generating
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _post_to(self, endpoint: OllamaEndpoint, path: str, payload: Dict) -> httpx.Response:
+        async with self.track(endpoint):
+            response = await get_ollama_client().post(f"{endpoint.url}{path}", json=payload)
+            if response.status_code >= 500:
+                raise httpx.HTTPStatusError(
+                    f"Ollama {endpoint.url} returned {response.status_code}",
+                    request=response.request,
+                    response=response
+                )
+            return response
+
+    def _hedge_delay(self, primary: OllamaEndpoint) -> Optional[float]:
+        if not self.hedge_enabled or sum(1 for e in self.endpoints if e.healthy) < 2:
+            return None
+        p95 = primary.p95_latency()
+        if p95 is None:
+            return None
+        return max(p95, self.hedge_min_delay)
+
+    def get_stats(self) -> Dict:
+        """Per-endpoint health/load plus hedging counters"""
+        return {
+            "endpoints": [e.get_stats() for e in self.endpoints],
+            "hedge_count": self.hedge_count,
+            "hedge_win_count": self.hedge_win_count,
+            "fallback_count": self.fallback_count
+        }
@@ -6,10 +6,11 @@ Provides sophisticated retrieval-augmented generation with multi-mode processing
 
 import json
 import uuid
+import asyncio
 import hashlib
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Tuple, AsyncIterator
 from dataclasses import dataclass
 from enum import Enum
 import re
@@ -20,6 +21,10 @@ from sqlalchemy import text
 from sentence_transformers import SentenceTransformer
 
 from classifiers import classifier, ClassificationResult
+from config import get_settings
+from context_packer import get_context_packer
+from telemetry_writer import get_telemetry_writer
+from generation_scheduler import get_generation_scheduler, GenerationRejected
 
 # Import migrated workflow modules
 try:
@@ -61,6 +66,14 @@ class RAGRequest:
     session_id: Optional[str] = None
     organization_id: Optional[str] = None
     force_refresh_cache: bool = False
+    deadline: Optional[float] = None  # time.monotonic() by which a response must be returned
+    started_at: Optional[float] = None  # time.time() when processing began
+    
+    def remaining_budget(self) -> Optional[float]:
+        """Seconds left before the deadline (None when no deadline is set)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
 
 
 @dataclass
@@ -146,12 +159,8 @@ class MultiDomainVectorStore:
         domain_data["doc_ids"].extend(doc_ids)
         domain_data["last_updated"] = datetime.utcnow()
     
-    async def search(self, query: str, domain: str, top_k: int = 5, min_similarity: float = 0.3, organization_id: Optional[str] = None) -> List[SearchResult]:
-        """Search embeddings in database with organization isolation"""
-        from database import SessionLocal
-        
-        print(f"🔍 DEBUG: Starting search for query='{query}', domain='{domain}', org_id='{organization_id}'")
-        
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query for retrieval (the embedding is reused for centroid classification)"""
         # Generate query embedding using Ollama (same as web scraper) for consistency
         try:
             from search.embedding_service import EmbeddingService
@@ -171,11 +180,38 @@ class MultiDomainVectorStore:
             query_embedding = self.embeddings_model.encode([query])[0]
             print(f"🔍 DEBUG: Query embedding generated using SentenceTransformer fallback, shape: {query_embedding.shape}")
         
+        return query_embedding
+    
+    async def embed_query_for_model(self, query: str, embedding_model: str) -> np.ndarray:
+        """Embed a query so it can be compared with ``embedding_model`` vectors"""
+        if embedding_model == get_settings().embedding_current_model:
+            return await self.embed_query(query)
+        
+        from embedding_migrator import embed_texts
+        vectors = await embed_texts(embedding_model, [query])
+        return np.array(vectors[0], dtype=np.float32)
+    
+    async def search(self, query: str, domain: str, top_k: int = 5, min_similarity: float = 0.3, organization_id: Optional[str] = None, query_embedding: Optional[np.ndarray] = None,
+                     embedding_model: Optional[str] = None) -> List[SearchResult]:
+        """Search embeddings in database with organization isolation
+        
+        Only vectors of the tenant's active embedding model are compared. ``embedding_model``
+        is the model ``query_embedding`` came from (None: the current model, as from embed_query).
+        """
+        from database import SessionLocal
+        
+        print(f"🔍 DEBUG: Starting search for query='{query}', domain='{domain}', org_id='{organization_id}'")
+        
         db = SessionLocal()
         try:
-            # Get domain_id from domain name
+            # Get domain_id from domain name, with the model the tenant's searches read
             domain_result = db.execute(
-                text("SELECT id FROM organization_domains WHERE domain_name = :domain AND organization_id = :org_id"),
+                text("""
+                    SELECT od.id, o.embedding_model
+                    FROM organization_domains od
+                    JOIN organizations o ON o.id = od.organization_id
+                    WHERE od.domain_name = :domain AND od.organization_id = :org_id
+                """),
                 {"domain": domain, "org_id": organization_id}
             ).fetchone()
             
@@ -186,10 +222,16 @@ class MultiDomainVectorStore:
             domain_id = domain_result.id
             print(f"✅ DEBUG: Found domain_id: {domain_id}")
             
+            current_model = get_settings().embedding_current_model
+            active_model = domain_result.embedding_model or current_model
+            if query_embedding is None or (embedding_model or current_model) != active_model:
+                query_embedding = await self.embed_query_for_model(query, active_model)
+            
             # Build query parameters
             query_params = {
                 "domain_id": domain_id,
-                "organization_id": organization_id
+                "organization_id": organization_id,
+                "embedding_model": active_model
             }
             
             # Query embeddings from database with organization isolation and polymorphic support
@@ -206,6 +248,7 @@ class MultiDomainVectorStore:
                     LEFT JOIN organization_domains od ON e.domain_id = od.id
                     WHERE e.domain_id = :domain_id
                     AND e.organization_id = :organization_id
+                    AND e.embedding_model = :embedding_model
                     AND e.source_id IS NOT NULL
                     AND (
                         (e.source_type = 'file' AND f.processed = true)
@@ -312,13 +355,28 @@ class MultiDomainVectorStore:
         finally:
             db.close()
     
-    async def cross_domain_search(self, query: str, domains: List[str], top_k: int = 10, min_similarity: float = 0.3, organization_id: Optional[str] = None) -> Dict[str, List[SearchResult]]:
+    async def cross_domain_search(self, query: str, domains: List[str], top_k: int = 10, min_similarity: float = 0.3, organization_id: Optional[str] = None, query_embedding: Optional[np.ndarray] = None) -> Dict[str, List[SearchResult]]:
         """Search across multiple domains with ranking"""
+        from database import SessionLocal
+        from embedding_migrator import get_active_embedding_model
+        
         all_results = {}
         
+        # Embed once for all domains, with the model the tenant's searches read
+        current_model = get_settings().embedding_current_model
+        embedding_model = current_model
+        if organization_id:
+            db = SessionLocal()
+            try:
+                embedding_model = get_active_embedding_model(db, organization_id)
+            finally:
+                db.close()
+        if query_embedding is None or embedding_model != current_model:
+            query_embedding = await self.embed_query_for_model(query, embedding_model)
+        
         for domain in domains:
             # Always search in database, not just domain_indices
-            results = await self.search(query, domain, top_k, min_similarity, organization_id)
+            results = await self.search(query, domain, top_k, min_similarity, organization_id, query_embedding, embedding_model)
             if results:
                 all_results[domain] = results
         
@@ -760,6 +818,13 @@ class EnhancedRAGProcessor:
         self.cache_ttl_seconds = 3600  # 1 hour default TTL
         self.similarity_threshold_for_cache_update = 0.7  # Threshold for determining if new content affects cached queries
         
+        # End-to-end latency budget (SLO) applied to requests without an explicit deadline
+        settings = get_settings()
+        self.latency_slo_seconds = settings.rag_latency_slo_ms / 1000.0
+        self.min_generation_budget_seconds = settings.rag_min_generation_budget_ms / 1000.0
+        self.cache_late_generations = settings.rag_cache_late_generations
+        self.late_generation_grace_seconds = settings.rag_late_generation_grace_ms / 1000.0
+        
     async def smart_cache_update_for_new_content(self, domain: str, new_file_id: str, new_content_chunks: List[str], db: Session):
         """Smart cache update when new content is added - only update relevant cached queries"""
         if not new_content_chunks:
@@ -1078,93 +1143,33 @@ class EnhancedRAGProcessor:
         """Enhanced query processing with multi-mode support"""
         start_time = time.time()
         execution_id = str(uuid.uuid4())
+        self._start_budget(request)
         
         # Clean up expired cache entries periodically
         self._cleanup_expired_cache()
         
         # Check cache first
         cache_key = self._generate_cache_key(request)
-        if not request.force_refresh_cache and cache_key in self.response_cache:
-            cache_data = self.response_cache[cache_key]
-            if self._is_cache_valid(cache_data, request.domain):
-                cached_response = cache_data["response"]
-                cached_response.cache_hit = True
-                cached_response.execution_id = execution_id
-                return cached_response
-            else:
-                # Remove invalid cache entry
-                del self.response_cache[cache_key]
+        cached_response = self._get_cached_response(cache_key, request, execution_id)
+        if cached_response:
+            return cached_response
         
         try:
-            # Step 1: Intent Classification with organization context
-            if not request.organization_id:
-                raise ValueError("Organization ID is required for multi-tenant isolation")
-            
-            classification_result = await classifier.classify_query(
-                query=request.query,
-                domain=request.domain,
-                organization_id=request.organization_id,
-                context=request.context,
-                db=db
-            )
-            
-            # Step 2: Retrieve documents based on mode
-            search_results = await self._perform_search(request, classification_result)
-            
-            # Step 3: Agent workflow processing (if applicable)
-            agent_result = None
-            confidence = classification_result.confidence or 0.0  # Handle None confidence
-            if (request.mode == RAGMode.AGENT_ENHANCED and 
-                confidence > 0.7 and 
-                classification_result.intent in ["bug_report", "feature_request", "training"]):
-                
-                agent_result = await self.agent_processor.execute_workflow(
-                    intent=classification_result.intent,
-                    query=request.query,
-                    confidence=confidence,
-                    context=request.context,
-                    vector_results=search_results,
-                    db=db
-                )
+            # Steps 1-3: Classification, retrieval and agent workflows
+            classification_result, search_results, agent_result = await self._classify_and_retrieve(request, db)
             
             # Step 4: Generate response
-            response_data = self._generate_enhanced_response(
+            response_data = await self._generate_enhanced_response(
                 request, classification_result, search_results, agent_result
             )
             
             # Step 5: Create response object
-            processing_time = int((time.time() - start_time) * 1000)
-            
-            rag_response = RAGResponse(
-                query=request.query,
-                response=response_data["response"],
-                intent=classification_result.intent,
-                confidence=response_data["confidence"],
-                sources=response_data["sources"],
-                domain=request.domain,
-                mode_used=request.mode,
-                response_type=response_data["response_type"],
-                processing_time_ms=processing_time,
-                execution_id=execution_id,
-                source_count=len(response_data["sources"]),
-                suggested_actions=response_data.get("suggested_actions", []),
-                related_queries=response_data.get("related_queries", []),
-                agent_workflow_triggered=agent_result is not None,
-                agent_workflow_id=agent_result.workflow_id if agent_result else None,
-                metadata=response_data.get("metadata", {})
+            rag_response = self._build_rag_response(
+                request, classification_result, response_data, agent_result, execution_id, start_time
             )
             
             # Cache the response with enhanced metadata
-            query_embedding = self.embeddings_model.encode([request.query])[0] if self.embeddings_model else None
-            source_ids = {source.get("id") for source in response_data["sources"] if source.get("id")}
-            
-            self.response_cache[cache_key] = {
-                "response": rag_response, 
-                "timestamp": datetime.utcnow(), 
-                "domain": request.domain,
-                "query_embedding": query_embedding,
-                "source_ids": source_ids
-            }
+            self._cache_response(cache_key, request, rag_response)
             
             # Store execution in database
             await self._store_execution(db, request, rag_response, classification_result)
@@ -1177,7 +1182,243 @@ class EnhancedRAGProcessor:
             print(f"Full traceback: {traceback.format_exc()}")
             return self._generate_error_response(request, str(e), execution_id, int((time.time() - start_time) * 1000))
     
-    async def _perform_search(self, request: RAGRequest, classification: ClassificationResult) -> List[SearchResult]:
+    async def process_query_stream(self, request: RAGRequest, db: Session) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of process_query
+        
+        Yields a ``sources`` event as soon as retrieval finishes, ``token`` events while
+        the LLM generates, and a ``final`` event carrying the complete RAGResponse with
+        citation and image markup applied.
+        """
+        start_time = time.time()
+        execution_id = str(uuid.uuid4())
+        self._start_budget(request)
+        
+        self._cleanup_expired_cache()
+        
+        cache_key = self._generate_cache_key(request)
+        cached_response = self._get_cached_response(cache_key, request, execution_id)
+        if cached_response:
+            yield self._sources_event(execution_id, cached_response.intent, cached_response.sources)
+            yield {"event": "final", "data": cached_response}
+            return
+        
+        try:
+            classification_result, search_results, agent_result = await self._classify_and_retrieve(request, db)
+            
+            sources = self._format_sources(search_results)
+            yield self._sources_event(execution_id, classification_result.intent, sources)
+            
+            if agent_result or not search_results:
+                # Nothing to stream - workflow and no-result responses are produced in one go
+                response_data = await self._generate_enhanced_response(
+                    request, classification_result, search_results, agent_result
+                )
+            else:
+                response_data = None
+                context = self._generate_context(search_results)
+                
+                try:
+                    from llm_service import get_llm_service
+                    llm_service = get_llm_service()
+                    
+                    remaining = request.remaining_budget()
+                    if remaining is not None and remaining < self.min_generation_budget_seconds:
+                        print(f"Latency budget exhausted before generation ({remaining:.2f}s left), using template response")
+                    elif await llm_service.is_available():
+                        tokens = []
+                        async with get_generation_scheduler().slot(request.organization_id, max_wait=remaining):
+                            async for token in llm_service.generate_response_stream(
+                                query=request.query,
+                                context=context,
+                                sources=sources,
+                                intent=classification_result.intent,
+                                timeout=request.remaining_budget()
+                            ):
+                                tokens.append(token)
+                                yield {"event": "token", "data": {"text": token}}
+                        
+                        if tokens:
+                            llm_response = llm_service.finalize_response("".join(tokens), sources)
+                            response_data = self._llm_response_data(
+                                llm_response, classification_result, sources, search_results
+                            )
+                except GenerationRejected as e:
+                    print(f"LLM queue overloaded, shedding to template response: {e}")
+                    response_data = self._generate_template_response(request, classification_result, sources, context)
+                    response_data["metadata"]["load_shed"] = True
+                except Exception as e:
+                    print(f"LLM streaming failed: {e}")
+                
+                if response_data is None:
+                    print("LLM stream produced no output, using template response")
+                    response_data = self._generate_template_response(request, classification_result, sources, context)
+            
+            rag_response = self._build_rag_response(
+                request, classification_result, response_data, agent_result, execution_id, start_time
+            )
+            self._cache_response(cache_key, request, rag_response)
+            await self._store_execution(db, request, rag_response, classification_result)
+            
+            yield {"event": "final", "data": rag_response}
+            
+        except Exception as e:
+            print(f"Error in streaming RAG processing: {e}")
+            import traceback
+            print(f"Full traceback: {traceback.format_exc()}")
+            yield {
+                "event": "final",
+                "data": self._generate_error_response(request, str(e), execution_id, int((time.time() - start_time) * 1000))
+            }
+    
+    def _sources_event(self, execution_id: str, intent: str, sources: List[Dict]) -> Dict[str, Any]:
+        """Build the up-front sources event for streaming responses"""
+        return {
+            "event": "sources",
+            "data": {
+                "execution_id": execution_id,
+                "intent": intent,
+                "sources": sources,
+                "source_count": len(sources)
+            }
+        }
+    
+    def _get_cached_response(self, cache_key: str, request: RAGRequest, execution_id: str) -> Optional[RAGResponse]:
+        """Return a valid cached response for the request, dropping stale entries"""
+        if request.force_refresh_cache or cache_key not in self.response_cache:
+            return None
+        
+        cache_data = self.response_cache[cache_key]
+        if self._is_cache_valid(cache_data, request.domain):
+            cached_response = cache_data["response"]
+            cached_response.cache_hit = True
+            cached_response.execution_id = execution_id
+            return cached_response
+        
+        # Remove invalid cache entry
+        del self.response_cache[cache_key]
+        return None
+    
+    async def _classify_and_retrieve(
+        self,
+        request: RAGRequest,
+        db: Session
+    ) -> Tuple[ClassificationResult, List[SearchResult], Optional[WorkflowResult]]:
+        """Run intent classification, retrieval and (if applicable) the agent workflow"""
+        # Step 1: Intent Classification with organization context
+        if not request.organization_id:
+            raise ValueError("Organization ID is required for multi-tenant isolation")
+        
+        # The query embedding is computed once and shared by classification and retrieval
+        try:
+            query_embedding = await asyncio.wait_for(
+                self.vector_store.embed_query(request.query),
+                timeout=request.remaining_budget()
+            )
+        except asyncio.TimeoutError:
+            print(f"Query embedding exceeded latency budget for query '{request.query[:50]}'")
+            query_embedding = None
+        
+        try:
+            # Centroid classification may load domain centroids from the database
+            classification_result = await asyncio.wait_for(
+                classifier.classify_query(
+                    query=request.query,
+                    domain=request.domain,
+                    organization_id=request.organization_id,
+                    context=request.context,
+                    db=db,
+                    query_embedding=query_embedding,
+                    embedding_model=get_settings().embedding_current_model  # embed_query uses the current model
+                ),
+                timeout=request.remaining_budget()
+            )
+        except asyncio.TimeoutError:
+            print(f"Classification exceeded latency budget for query '{request.query[:50]}', using keyword classification")
+            # Without an embedding only the in-memory keyword and pattern methods run
+            classification_result = await classifier.classify_query(
+                query=request.query,
+                domain=request.domain,
+                organization_id=request.organization_id,
+                context=request.context,
+                db=db
+            )
+        
+        # Step 2: Retrieve documents based on mode (search shares the remaining budget)
+        try:
+            if query_embedding is None:
+                raise asyncio.TimeoutError()
+            search_results = await asyncio.wait_for(
+                self._perform_search(request, classification_result, query_embedding),
+                timeout=request.remaining_budget()
+            )
+        except asyncio.TimeoutError:
+            print(f"Search exceeded latency budget for query '{request.query[:50]}', continuing without results")
+            search_results = []
+        
+        # Step 3: Agent workflow processing (if applicable and budget remains)
+        agent_result = None
+        confidence = classification_result.confidence or 0.0  # Handle None confidence
+        if (request.remaining_budget() != 0.0 and
+            request.mode == RAGMode.AGENT_ENHANCED and 
+            confidence > 0.7 and 
+            classification_result.intent in ["bug_report", "feature_request", "training"]):
+            
+            agent_result = await self.agent_processor.execute_workflow(
+                intent=classification_result.intent,
+                query=request.query,
+                confidence=confidence,
+                context=request.context,
+                vector_results=search_results,
+                db=db
+            )
+        
+        return classification_result, search_results, agent_result
+    
+    def _build_rag_response(
+        self,
+        request: RAGRequest,
+        classification_result: ClassificationResult,
+        response_data: Dict[str, Any],
+        agent_result: Optional[WorkflowResult],
+        execution_id: str,
+        start_time: float
+    ) -> RAGResponse:
+        """Assemble the RAGResponse from generated response data"""
+        processing_time = int((time.time() - start_time) * 1000)
+        
+        return RAGResponse(
+            query=request.query,
+            response=response_data["response"],
+            intent=classification_result.intent,
+            confidence=response_data["confidence"],
+            sources=response_data["sources"],
+            domain=request.domain,
+            mode_used=request.mode,
+            response_type=response_data["response_type"],
+            processing_time_ms=processing_time,
+            execution_id=execution_id,
+            source_count=len(response_data["sources"]),
+            suggested_actions=response_data.get("suggested_actions", []),
+            related_queries=response_data.get("related_queries", []),
+            agent_workflow_triggered=agent_result is not None,
+            agent_workflow_id=agent_result.workflow_id if agent_result else None,
+            metadata=response_data.get("metadata", {})
+        )
+    
+    def _cache_response(self, cache_key: str, request: RAGRequest, rag_response: RAGResponse):
+        """Cache a response together with its query embedding and source ids"""
+        query_embedding = self.embeddings_model.encode([request.query])[0] if self.embeddings_model else None
+        source_ids = {source.get("id") for source in rag_response.sources if source.get("id")}
+        
+        self.response_cache[cache_key] = {
+            "response": rag_response, 
+            "timestamp": datetime.utcnow(), 
+            "domain": request.domain,
+            "query_embedding": query_embedding,
+            "source_ids": source_ids
+        }
+    
+    async def _perform_search(self, request: RAGRequest, classification: ClassificationResult, query_embedding: Optional[np.ndarray] = None) -> List[SearchResult]:
         """Perform search based on mode"""
         
         if request.mode == RAGMode.SIMPLE:
@@ -1186,7 +1427,8 @@ class EnhancedRAGProcessor:
                 request.domain, 
                 request.max_results, 
                 request.confidence_threshold,
-                request.organization_id
+                request.organization_id,
+                query_embedding
             )
         
         elif request.mode == RAGMode.CROSS_DOMAIN:
@@ -1197,7 +1439,8 @@ class EnhancedRAGProcessor:
                 all_domains, 
                 request.max_results * 2, 
                 request.confidence_threshold,
-                request.organization_id
+                request.organization_id,
+                query_embedding
             )
             
             # Flatten and rank results
@@ -1216,7 +1459,8 @@ class EnhancedRAGProcessor:
                 all_domains, 
                 request.max_results, 
                 request.confidence_threshold,
-                request.organization_id
+                request.organization_id,
+                query_embedding
             )
             
             all_results = []
@@ -1232,10 +1476,11 @@ class EnhancedRAGProcessor:
                 request.domain, 
                 request.max_results, 
                 request.confidence_threshold,
-                request.organization_id
+                request.organization_id,
+                query_embedding
             )
     
-    def _generate_enhanced_response(
+    async def _generate_enhanced_response(
         self,
         request: RAGRequest,
         classification: ClassificationResult,
@@ -1266,21 +1511,43 @@ class EnhancedRAGProcessor:
         # Generate context from results
         context = self._generate_context(search_results)
         
+        # Skip generation entirely when the latency budget is already spent
+        remaining = request.remaining_budget()
+        if remaining is not None and remaining < self.min_generation_budget_seconds:
+            print(f"Latency budget exhausted before generation ({remaining:.2f}s left), using template response")
+            response_data = self._generate_template_response(request, classification, sources, context)
+            response_data["metadata"]["deadline_exceeded"] = True
+            return response_data
+        
         # Use LLM for response generation
         try:
             from llm_service import get_llm_service
             llm_service = get_llm_service()
             
-            print(f"LLM service available: {llm_service.is_available()}")
+            llm_available = await llm_service.is_available()
+            print(f"LLM service available: {llm_available}")
             
-            if llm_service.is_available():
-                # Generate response using LLM
-                llm_response = llm_service.generate_response(
-                    query=request.query,
-                    context=context,
-                    sources=sources,
-                    intent=classification.intent
+            if llm_available:
+                # Generate response using LLM (admission-controlled, bounded by the remaining budget)
+                admitted = asyncio.Event()
+                generation = asyncio.create_task(
+                    self._scheduled_generation(request, llm_service, context, sources, classification.intent, admitted)
                 )
+                try:
+                    llm_response = await asyncio.wait_for(
+                        asyncio.shield(generation),
+                        timeout=request.remaining_budget()
+                    )
+                except asyncio.TimeoutError:
+                    print("Latency budget exhausted during generation, returning template response")
+                    self._finish_late_generation(generation, admitted, request, classification, sources, search_results)
+                    response_data = self._generate_template_response(request, classification, sources, context)
+                    response_data["metadata"]["deadline_exceeded"] = True
+                    return response_data
+                
+                if llm_response is None:
+                    print("LLM generation failed, using template response")
+                    return self._generate_template_response(request, classification, sources, context)
                 
                 # Debug: Log visual content in sources for login queries
                 if 'login' in request.query.lower():
@@ -1300,23 +1567,17 @@ class EnhancedRAGProcessor:
                 
                 print(f"LLM response generated: {llm_response[:100]}...")
                 
-                # Boost confidence when using LLM
-                base_confidence = classification.confidence or 0.0  # Handle None confidence
-                confidence = min(base_confidence + 0.2, 0.95)
-                
-                return {
-                    "response": llm_response,
-                    "confidence": confidence,
-                    "response_type": ResponseType.GENERATED,
-                    "sources": sources,
-                    "suggested_actions": self._generate_suggested_actions(classification.intent),
-                    "related_queries": self._generate_related_queries(search_results),
-                    "metadata": {"classification": classification.metadata, "llm_used": True}
-                }
+                return self._llm_response_data(llm_response, classification, sources, search_results)
             else:
                 print("LLM service not available, using template response")
                 # Fallback to template-based response
                 return self._generate_template_response(request, classification, sources, context)
+        
+        except GenerationRejected as e:
+            print(f"LLM queue overloaded, shedding to template response: {e}")
+            response_data = self._generate_template_response(request, classification, sources, context)
+            response_data["metadata"]["load_shed"] = True
+            return response_data
                 
         except Exception as e:
             print(f"LLM generation failed: {e}")
@@ -1325,6 +1586,95 @@ class EnhancedRAGProcessor:
             # Fallback to template-based response
             return self._generate_template_response(request, classification, sources, context)
     
+    async def _scheduled_generation(
+        self,
+        request: RAGRequest,
+        llm_service,
+        context: str,
+        sources: List[Dict],
+        intent: str,
+        admitted: Optional[asyncio.Event] = None
+    ) -> Optional[str]:
+        """Run a generation inside a scheduler slot; returns None on failure
+
+        ``admitted`` is set once the slot is held.
+        """
+        async with get_generation_scheduler().slot(request.organization_id, max_wait=request.remaining_budget()):
+            if admitted is not None:
+                admitted.set()
+            return await llm_service.generate_response(
+                query=request.query,
+                context=context,
+                sources=sources,
+                intent=intent,
+                fallback_on_error=False
+            )
+    
+    def _finish_late_generation(
+        self,
+        generation: asyncio.Task,
+        admitted: asyncio.Event,
+        request: RAGRequest,
+        classification: ClassificationResult,
+        sources: List[Dict],
+        search_results: List[SearchResult]
+    ):
+        """Cancel a generation that missed its deadline, or give it a short grace to finish for the cache
+        
+        A generation still queued for a slot is always cancelled, and one that outlasts
+        the grace period is cancelled then, so late work can't hold the LLM while it
+        is overloaded.
+        """
+        if not self.cache_late_generations or not admitted.is_set() or self.late_generation_grace_seconds <= 0:
+            generation.cancel()
+            return
+        asyncio.get_running_loop().call_later(self.late_generation_grace_seconds, generation.cancel)
+        
+        cache_key = self._generate_cache_key(request)
+        start_time = request.started_at or time.time()
+        
+        def _cache_late_result(task: asyncio.Task):
+            if task.cancelled() or task.exception() is not None or not task.result():
+                return
+            response_data = self._llm_response_data(task.result(), classification, sources, search_results)
+            response_data["metadata"]["late_generation"] = True
+            rag_response = self._build_rag_response(
+                request, classification, response_data, None, str(uuid.uuid4()), start_time
+            )
+            self._cache_response(cache_key, request, rag_response)
+            print(f"Cached late LLM generation for query '{request.query[:50]}'")
+        
+        generation.add_done_callback(_cache_late_result)
+    
+    def _start_budget(self, request: RAGRequest):
+        """Record when processing began and apply the default latency SLO to requests without a deadline"""
+        if request.started_at is None:
+            request.started_at = time.time()
+        if request.deadline is None and self.latency_slo_seconds > 0:
+            request.deadline = time.monotonic() + self.latency_slo_seconds
+    
+    def _llm_response_data(
+        self,
+        llm_response: str,
+        classification: ClassificationResult,
+        sources: List[Dict],
+        search_results: List[SearchResult]
+    ) -> Dict[str, Any]:
+        """Package an LLM-generated answer as response data"""
+        # Boost confidence when using LLM
+        base_confidence = classification.confidence or 0.0  # Handle None confidence
+        confidence = min(base_confidence + 0.2, 0.95)
+        
+        return {
+            "response": llm_response,
+            "confidence": confidence,
+            "response_type": ResponseType.GENERATED,
+            "sources": sources,
+            "suggested_actions": self._generate_suggested_actions(classification.intent),
+            "related_queries": self._generate_related_queries(search_results),
+            "metadata": {"classification": classification.metadata, "llm_used": True}
+        }
+    
     def _generate_template_response(self, request: RAGRequest, classification: ClassificationResult, sources: List[Dict], context: str) -> Dict[str, Any]:
         """Fallback template-based response generation with concise format"""
         
@@ -1510,38 +1860,8 @@ class EnhancedRAGProcessor:
     
     def _generate_context(self, results: List[SearchResult]) -> str:
         """Generate focused context from search results for LLM processing"""
-        if not results:
-            return "No relevant information found."
-        
-        # Group results by source to avoid fragmentation
-        source_groups = {}
-        for result in results:
-            source_id = result.source_id
-            if source_id not in source_groups:
-                source_groups[source_id] = []
-            source_groups[source_id].append(result)
-        
-        context_parts = []
-        for source_id, source_results in source_groups.items():
-            # Sort by chunk index if available
-            source_results.sort(key=lambda x: x.metadata.get('chunk_index', 0) or 0)
-            
-            # Get the most relevant content from this source
-            best_result = max(source_results, key=lambda x: x.similarity)
-            content = best_result.content.strip()
-            
-            # Add source title for LLM reference
-            title = best_result.metadata.get("title", "Document")
-            if title.endswith('.pdf'):
-                title = title[:-4]
-            
-            # Keep content focused but sufficient for LLM understanding
-            if len(content) > 600:
-                content = content[:600] + "..."
-            
-            context_parts.append(f"From {title}:\n{content}")
-        
-        return "\n\n".join(context_parts[:3])  # Max 3 sources for focused context
+        # Most similar chunks first, overlaps removed, capped by the LLM context token budget
+        return get_context_packer().pack(results)
     
     def _generate_suggested_actions(self, intent: str) -> List[str]:
         """Generate suggested actions based on intent"""
@@ -1632,52 +1952,22 @@ class EnhancedRAGProcessor:
         response: RAGResponse,
         classification: ClassificationResult
     ):
-        """Store execution in database"""
-        try:
-            # Get domain_id from domain name
-            domain_result = db.execute(
-                text("SELECT id FROM organization_domains WHERE domain_name = :domain AND organization_id = :org_id"),
-                {"domain": request.domain, "org_id": request.organization_id}
-            ).fetchone()
-            
-            if not domain_result:
-                print(f"Domain '{request.domain}' not found for organization {request.organization_id}")
-                return
-            
-            domain_id = domain_result.id
-            
-            db.execute(
-                text("""
-                    INSERT INTO rag_executions (
-                        id, query, domain_id, mode, intent, confidence, 
-                        response_type, source_count, processing_time_ms, 
-                        user_id, session_id, organization_id, created_at
-                    ) VALUES (
-                        :id, :query, :domain_id, :mode, :intent, :confidence,
-                        :response_type, :source_count, :processing_time_ms,
-                        :user_id, :session_id, :organization_id, :created_at
-                    )
-                """),
-                {
-                    "id": response.execution_id,
-                    "query": request.query,
-                    "domain_id": domain_id,
-                    "mode": request.mode.value,
-                    "intent": classification.intent,
-                    "confidence": classification.confidence,
-                    "response_type": response.response_type.value,
-                    "source_count": response.source_count,
-                    "processing_time_ms": response.processing_time_ms,
-                    "user_id": request.user_id,
-                    "session_id": request.session_id,
-                    "organization_id": request.organization_id,
-                    "created_at": datetime.utcnow()
-                }
-            )
-            db.commit()
-        except Exception as e:
-            print(f"Failed to store RAG execution: {e}")
-            db.rollback()
+        """Queue execution for the batched telemetry writer (no DB work on the request path)"""
+        get_telemetry_writer().record("rag_executions", {
+            "id": response.execution_id,
+            "query": request.query,
+            "domain": request.domain,
+            "mode": request.mode.value,
+            "intent": classification.intent,
+            "confidence": classification.confidence,
+            "response_type": response.response_type.value,
+            "source_count": response.source_count,
+            "processing_time_ms": response.processing_time_ms,
+            "user_id": request.user_id,
+            "session_id": request.session_id,
+            "organization_id": request.organization_id,
+            "created_at": datetime.utcnow()
+        })
     
     async def get_analytics(self, db: Session, domain: Optional[str] = None, days: int = 7) -> Dict:
         """Get RAG analytics"""
@@ -5,7 +5,9 @@ Consolidated redundant upload endpoints into single production endpoint
 """
 
 import uuid
-import hashlib
+import asyncio
+import functools
+import json
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, List
@@ -14,12 +16,16 @@ from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pathlib import Path
+from pydantic import BaseModel
 
 from models import FileUploadResponse, WebScrapingRequest, WebScrapingResponse
 from dependencies import get_db, get_current_user, require_permission
 from auth_utils import PermissionManager, AuditLogger
-from storage_utils import minio_storage
+from config import get_settings
+from storage_utils import minio_storage, HashingReader, UploadTooLargeError
 from background_processor import BackgroundJobProcessor
+from chunking import CHUNK_ID_NAMESPACE
+from embedding_migrator import model_vector_id
 from ingestion.crawler import CrawlScheduler
 
 # Initialize router
@@ -37,6 +43,29 @@ logger = logging.getLogger(__name__)
 # Global flags (will be set by main app)
 CRAWLER_AVAILABLE = False
 
+# Bytes read up front for file type detection
+UPLOAD_SNIFF_BYTES = 64 * 1024
+
+# Most files announced in one upload handshake
+UPLOAD_INIT_MAX_FILES = 1000
+
+# Filename fragments refused on upload
+SUSPICIOUS_PATTERNS = ['.exe', '.bat', '.cmd', '.scr', '.vbs', '.js', '.jar', '.com', '.pif']
+
+
+class UploadInitFile(BaseModel):
+    """A file announced by its sha256 before its bytes are sent"""
+    filename: str
+    size_bytes: int
+    sha256: str
+
+
+class UploadInitRequest(BaseModel):
+    """Pre-upload handshake for one or more files going to the same domain"""
+    domain: str = "general"
+    priority: str = "interactive"
+    files: List[UploadInitFile]
+
 
 def set_services(bp, ms, crawler_available=False):
     """Set service instances"""
@@ -46,10 +75,115 @@ def set_services(bp, ms, crawler_available=False):
     CRAWLER_AVAILABLE = crawler_available
 
 
-def detect_file_type_from_content(content: bytes, filename: str) -> tuple[str, bool]:
+def _copy_stream_to_path(reader: HashingReader, file_path: Path, chunk_size: int = 1024 * 1024):
+    """Copy a stream to disk a chunk at a time (blocking - run it in an executor)"""
+    with open(file_path, "wb") as f:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+def _link_stored_file(db: Session, source, file_id: str, filename: str, domain_id: str, user_id: str) -> int:
+    """Register an already stored file under another domain, copying its chunks if processed; returns chunks copied"""
+    source_metadata = source.metadata if isinstance(source.metadata, dict) else json.loads(source.metadata or "{}")
+    db.execute(
+        text("""
+            INSERT INTO files (
+                id, filename, original_filename, content_type, size_bytes, domain_id, organization_id,
+                uploaded_by, file_hash, storage_type, object_key, storage_url, file_path,
+                created_at, processed, processing_status, metadata
+            )
+            VALUES (
+                :id, :filename, :original_filename, :content_type, :size_bytes, :domain_id, :organization_id,
+                :uploaded_by, :file_hash, :storage_type, :object_key, :storage_url, :file_path,
+                :created_at, :processed, :processing_status, :metadata
+            )
+        """),
+        {
+            "id": file_id,
+            "filename": filename,
+            "original_filename": filename,
+            "content_type": source.content_type,
+            "size_bytes": source.size_bytes,
+            "domain_id": domain_id,
+            "organization_id": str(source.organization_id),
+            "uploaded_by": user_id,
+            "file_hash": source.file_hash,
+            "storage_type": source.storage_type,
+            "object_key": source.object_key,
+            "storage_url": source.storage_url,
+            "file_path": source.file_path,
+            "created_at": datetime.utcnow(),
+            "processed": bool(source.processed),
+            "processing_status": "completed" if source.processed else None,
+            "metadata": json.dumps({**source_metadata, "linked_from": str(source.id)})
+        }
+    )
+    
+    if not source.processed:
+        return 0
+    
+    # Same ids the chunker (or the embedding migrator, for other models' vectors) would give
+    # these rows under the new file, so a reprocess keeps them
+    rows = db.execute(
+        text("""
+            SELECT id, chunk_index, content_hash, embedding_model FROM embeddings
+            WHERE source_id = :source_id
+            ORDER BY chunk_index
+        """),
+        {"source_id": str(source.id)}
+    ).fetchall()
+    occurrences = {}
+    old_ids = []
+    new_ids = []
+    for row in rows:
+        if str(row.id) == model_vector_id(str(source.id), row.chunk_index, row.embedding_model):
+            new_id = model_vector_id(file_id, row.chunk_index, row.embedding_model)
+        elif row.content_hash:
+            occurrence = occurrences.get(row.content_hash, 0)
+            occurrences[row.content_hash] = occurrence + 1
+            new_id = str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{file_id}:{row.content_hash}:{occurrence}"))
+        else:
+            new_id = str(uuid.uuid4())
+        old_ids.append(str(row.id))
+        new_ids.append(new_id)
+    
+    if not new_ids:
+        return 0
+    
+    # Vectors are copied in the database; nothing is re-extracted or re-embedded
+    result = db.execute(
+        text("""
+            INSERT INTO embeddings (
+                id, source_id, domain_id, organization_id, source_type, chunk_index,
+                content_text, content_hash, embedding, metadata, embedding_model, created_at
+            )
+            SELECT m.new_id, :file_id, :domain_id, e.organization_id, e.source_type, e.chunk_index,
+                e.content_text, e.content_hash, e.embedding, e.metadata, e.embedding_model, NOW()
+            FROM embeddings e
+            JOIN unnest(CAST(:old_ids AS uuid[]), CAST(:new_ids AS uuid[])) AS m(old_id, new_id)
+                ON m.old_id = e.id
+            ON CONFLICT (source_id, chunk_index, embedding_model) DO NOTHING
+        """),
+        {
+            "file_id": file_id,
+            "domain_id": domain_id,
+            "old_ids": old_ids,
+            "new_ids": new_ids
+        }
+    )
+    return result.rowcount
+
+
+def detect_file_type_from_content(content: bytes, filename: str, complete: bool = True) -> tuple[str, bool]:
     """
     Detect file type using magic bytes (file signatures) for security
     Returns (content_type, is_valid)
+    
+    With ``complete=False`` ``content`` is only the start of the file: a character cut
+    off at the end is tolerated and JSON isn't parsed.
     """
     # File signatures (magic bytes) for supported types
     file_signatures = {
@@ -66,12 +200,19 @@ def detect_file_type_from_content(content: bytes, filename: str) -> tuple[str, b
     
     # For text-based files, try to decode as UTF-8
     try:
-        text_content = content.decode('utf-8')
+        if not complete:
+            # Drop a multi-byte character split at the end of the sample
+            import codecs
+            text_content = codecs.getincrementaldecoder('utf-8')().decode(content, final=False)
+        else:
+            text_content = content.decode('utf-8')
         
         # Determine text file type based on extension and content
         filename_lower = filename.lower()
         
         if filename_lower.endswith('.json'):
+            if not complete:
+                return 'application/json', True
             # Validate JSON structure
             import json
             try:
@@ -113,12 +254,18 @@ def detect_file_type_from_content(content: bytes, filename: str) -> tuple[str, b
 async def upload_file(
     file: UploadFile = File(...),
     domain: str = Form("general"),
+    priority: str = Form("interactive"),
+    sha256: Optional[str] = Form(None),
     current_user: dict = Depends(require_permission("files:write")),
     db: Session = Depends(get_db)
 ):
     """
     Production file upload endpoint with comprehensive validation and processing
     Consolidated from multiple redundant upload endpoints
+    
+    ``priority`` is the ingestion queue class: interactive (default), bulk or recrawl.
+    Bulk imports should send bulk so they don't hold up other users' uploads.
+    ``sha256`` is the hash announced to /upload/init; the upload is rejected if the bytes don't match it.
     """
     try:
         logger.info(f"File upload: user={current_user['id']}, domain={domain}, filename={file.filename}")
@@ -127,6 +274,9 @@ async def upload_file(
         if not file or not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
         
+        if priority not in BackgroundJobProcessor.PRIORITY_CLASSES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(BackgroundJobProcessor.PRIORITY_CLASSES)}")
+        
         # Check permissions
         if not PermissionManager.has_permission(db, current_user["id"], "files:write"):
             raise HTTPException(status_code=403, detail="Permission denied: files:write required")
@@ -155,20 +305,20 @@ async def upload_file(
         organization_id = str(org_result.organization_id)
         org_slug = org_result.slug
         
-        # Read and validate file content
-        content = await file.read()
-        file_size = len(content)
+        settings = get_settings()
+        max_size = settings.upload_max_size_mb * 1024 * 1024
         
-        # Validate file size (50MB limit)
-        max_size = 50 * 1024 * 1024  # 50MB
-        if file_size > max_size:
-            raise HTTPException(status_code=400, detail="File too large. Maximum size: 50MB")
+        # Validate file type from the first bytes; the rest is streamed to storage below
+        head = await file.read(UPLOAD_SNIFF_BYTES)
+        await file.seek(0)
         
-        if file_size == 0:
+        if not head:
             raise HTTPException(status_code=400, detail="Empty file not allowed")
         
         # Validate file type using content-based detection
-        detected_content_type, is_valid_type = detect_file_type_from_content(content, file.filename)
+        detected_content_type, is_valid_type = detect_file_type_from_content(
+            head, file.filename, complete=len(head) < UPLOAD_SNIFF_BYTES
+        )
         
         if not is_valid_type:
             raise HTTPException(
@@ -177,13 +327,9 @@ async def upload_file(
             )
         
         # Security checks
-        suspicious_patterns = ['.exe', '.bat', '.cmd', '.scr', '.vbs', '.js', '.jar', '.com', '.pif']
-        if any(pattern in file.filename.lower() for pattern in suspicious_patterns):
+        if any(pattern in file.filename.lower() for pattern in SUSPICIOUS_PATTERNS):
             raise HTTPException(status_code=400, detail="File type not allowed for security reasons")
         
-        # Generate file hash for deduplication
-        file_hash = hashlib.sha256(content).hexdigest()
-        
         # Get domain_id from domain UUID
         domain_result = db.execute(
             text("""
@@ -198,7 +344,97 @@ async def upload_file(
         
         domain_id = str(domain_result.id)
         domain_name = domain_result.domain_name
-
+        
+        # Create file record
+        file_id = str(uuid.uuid4())
+        
+        # Stream the file into storage, hashing it and enforcing the size limit as it goes
+        storage_url = None
+        object_key = None
+        storage_type = "local"
+        file_path = None
+        reader = HashingReader(file.file, max_size=max_size)
+        loop = asyncio.get_running_loop()
+        
+        try:
+            if minio_storage:
+                try:
+                    upload_result = await loop.run_in_executor(
+                        None,
+                        functools.partial(
+                            minio_storage.upload_stream,
+                            reader,
+                            organization_slug=org_slug,
+                            domain=domain_name,
+                            file_id=file_id,
+                            filename=file.filename,
+                            content_type=detected_content_type,
+                            metadata={
+                                "organization_id": organization_id,
+                                "domain": domain_name,
+                                "uploaded_by": current_user["id"],
+                                "original_filename": file.filename
+                            },
+                            part_size=max(5, settings.upload_part_size_mb) * 1024 * 1024
+                        )
+                    )
+                    
+                    if upload_result.get("success"):
+                        storage_type = "minio"
+                        object_key = upload_result["object_key"]
+                        storage_url = upload_result.get("url")
+                        logger.info(f"File uploaded to MinIO: {object_key}")
+                    else:
+                        raise Exception(upload_result.get("error", "Unknown MinIO error"))
+                    
+                except UploadTooLargeError:
+                    raise
+                except Exception as e:
+                    logger.error(f"MinIO upload failed: {str(e)}")
+                    # Fall back to local storage, streaming from the start again
+                    storage_type = "local"
+                    object_key = None
+                    storage_url = None
+                    await file.seek(0)
+                    reader = HashingReader(file.file, max_size=max_size)
+            
+            # Local storage fallback implementation
+            if storage_type == "local":
+                try:
+                    # Create local file storage directory
+                    storage_dir = Path(f"/app/storage/{org_slug}/{domain_name}")
+                    storage_dir.mkdir(parents=True, exist_ok=True)
+                    
+                    # Save file locally
+                    safe_filename = file.filename.replace(" ", "_").replace("/", "_")
+                    file_path = storage_dir / f"{file_id}_{safe_filename}"
+                    
+                    await loop.run_in_executor(None, _copy_stream_to_path, reader, file_path)
+                    
+                    storage_url = str(file_path)
+                    logger.info(f"File saved locally: {file_path}")
+                    
+                except UploadTooLargeError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Local storage also failed: {str(e)}")
+                    raise HTTPException(status_code=500, detail="Both MinIO and local storage failed")
+        
+        except UploadTooLargeError:
+            if file_path:
+                file_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=f"File too large. Maximum size: {settings.upload_max_size_mb}MB")
+        
+        file_size = reader.size
+        file_hash = reader.hexdigest()
+        
+        if sha256 and sha256.lower() != file_hash:
+            if object_key:
+                await loop.run_in_executor(None, minio_storage.delete_file, object_key)
+            elif file_path:
+                file_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail="File content does not match the announced sha256")
+        
         # Check for duplicates within organization
         existing_file = db.execute(
             text("""
@@ -210,6 +446,11 @@ async def upload_file(
         
         if existing_file:
             logger.info(f"Duplicate file detected: {file.filename} (existing: {existing_file.filename})")
+            # The copy just stored isn't needed
+            if object_key:
+                await loop.run_in_executor(None, minio_storage.delete_file, object_key)
+            elif file_path:
+                file_path.unlink(missing_ok=True)
             return FileUploadResponse(
                 id=str(existing_file.id),
                 filename=existing_file.filename,
@@ -218,69 +459,6 @@ async def upload_file(
                 processing_status="completed"
             )
         
-        # Create file record
-        file_id = str(uuid.uuid4())
-        
-        # Store file in MinIO if available
-        storage_url = None
-        object_key = None
-        storage_type = "local"
-        file_path = None
-        
-        if minio_storage:
-            try:
-                # Upload to MinIO with correct parameters
-                upload_result = await minio_storage.upload_file(
-                    file_content=content,
-                    organization_slug=org_slug,
-                    domain=domain_name,
-                    file_id=file_id,
-                    filename=file.filename,
-                    content_type=detected_content_type,
-                    metadata={
-                        "organization_id": organization_id,
-                        "domain": domain_name,
-                        "uploaded_by": current_user["id"],
-                        "original_filename": file.filename
-                    }
-                )
-                
-                if upload_result.get("success"):
-                    storage_type = "minio"
-                    object_key = upload_result["object_key"]
-                    storage_url = upload_result.get("url")
-                    logger.info(f"File uploaded to MinIO: {object_key}")
-                else:
-                    raise Exception(upload_result.get("error", "Unknown MinIO error"))
-                
-            except Exception as e:
-                logger.error(f"MinIO upload failed: {str(e)}")
-                # Fall back to local storage
-                storage_type = "local"
-                object_key = None
-                storage_url = None
-        
-        # Local storage fallback implementation
-        if storage_type == "local":
-            try:
-                # Create local file storage directory
-                storage_dir = Path(f"/app/storage/{org_slug}/{domain_name}")
-                storage_dir.mkdir(parents=True, exist_ok=True)
-                
-                # Save file locally
-                safe_filename = file.filename.replace(" ", "_").replace("/", "_")
-                file_path = storage_dir / f"{file_id}_{safe_filename}"
-                
-                with open(file_path, "wb") as f:
-                    f.write(content)
-                
-                storage_url = str(file_path)
-                logger.info(f"File saved locally: {file_path}")
-                
-            except Exception as e:
-                logger.error(f"Local storage also failed: {str(e)}")
-                raise HTTPException(status_code=500, detail="Both MinIO and local storage failed")
-        
         # Insert file record into database
         db.execute(
             text("""
@@ -320,7 +498,8 @@ async def upload_file(
         # Queue for background processing
         if background_job_processor:
             await background_job_processor.queue_file_processing(
-                file_id, content, detected_content_type, domain_name, organization_id
+                file_id, None, detected_content_type, domain_name, organization_id,
+                priority_class=priority
             )
         
         # Log the upload
@@ -354,6 +533,164 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+@router.post("/upload/init")
+async def init_upload(
+    request: UploadInitRequest,
+    current_user: dict = Depends(require_permission("files:write")),
+    db: Session = Depends(get_db)
+):
+    """
+    Pre-upload handshake: announce files by sha256 and size before sending any bytes
+    
+    Each file comes back with a status:
+    - duplicate: already in this domain
+    - linked: already stored in the organization; added to this domain with its chunks, nothing to send
+    - queued: already stored but not processed yet; added to this domain and queued, nothing to send
+    - upload_required: POST the bytes to upload_url, passing the same sha256
+    - rejected: refused up front (see error)
+    """
+    try:
+        if not request.files:
+            raise HTTPException(status_code=400, detail="No files announced")
+        
+        if len(request.files) > UPLOAD_INIT_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {UPLOAD_INIT_MAX_FILES} files per handshake")
+        
+        if request.priority not in BackgroundJobProcessor.PRIORITY_CLASSES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(BackgroundJobProcessor.PRIORITY_CLASSES)}")
+        
+        # Get user's organization for multi-tenant isolation
+        org_result = db.execute(
+            text("""
+                SELECT om.organization_id, o.slug
+                FROM organization_members om
+                JOIN organizations o ON om.organization_id = o.id
+                WHERE om.user_id = :user_id AND om.is_active = true
+                LIMIT 1
+            """),
+            {"user_id": current_user["id"]}
+        ).fetchone()
+        
+        if not org_result:
+            raise HTTPException(status_code=403, detail="User not associated with any organization")
+        
+        organization_id = str(org_result.organization_id)
+        
+        domain_result = db.execute(
+            text("""
+                SELECT id, domain_name FROM organization_domains 
+                WHERE organization_id = :organization_id AND id = :domain_id AND is_active = true
+            """),
+            {"organization_id": organization_id, "domain_id": request.domain}
+        ).fetchone()
+        
+        if not domain_result:
+            raise HTTPException(status_code=400, detail=f"Domain '{request.domain}' not found or not active")
+        
+        domain_id = str(domain_result.id)
+        domain_name = domain_result.domain_name
+        
+        settings = get_settings()
+        max_size = settings.upload_max_size_mb * 1024 * 1024
+        
+        results = []
+        to_queue = []
+        linked_count = 0
+        chunks_copied = 0
+        
+        for announced in request.files:
+            file_hash = announced.sha256.lower()
+            entry = {"filename": announced.filename, "sha256": file_hash}
+            results.append(entry)
+            
+            if len(file_hash) != 64 or any(c not in "0123456789abcdef" for c in file_hash):
+                entry.update(status="rejected", error="sha256 must be 64 hex characters")
+                continue
+            if announced.size_bytes <= 0:
+                entry.update(status="rejected", error="Empty file not allowed")
+                continue
+            if announced.size_bytes > max_size:
+                entry.update(status="rejected", error=f"File too large. Maximum size: {settings.upload_max_size_mb}MB")
+                continue
+            if any(pattern in announced.filename.lower() for pattern in SUSPICIOUS_PATTERNS):
+                entry.update(status="rejected", error="File type not allowed for security reasons")
+                continue
+            
+            existing_file = db.execute(
+                text("""
+                    SELECT id FROM files 
+                    WHERE file_hash = :file_hash AND organization_id = :organization_id AND domain_id = :domain_id
+                    LIMIT 1
+                """),
+                {"file_hash": file_hash, "organization_id": organization_id, "domain_id": domain_id}
+            ).fetchone()
+            
+            if existing_file:
+                entry.update(status="duplicate", id=str(existing_file.id))
+                continue
+            
+            # Only this organization's files: knowing a hash must not grant access to another tenant's content
+            source = db.execute(
+                text("""
+                    SELECT id, organization_id, content_type, size_bytes, file_hash, storage_type,
+                           object_key, storage_url, file_path, processed, metadata
+                    FROM files
+                    WHERE organization_id = :organization_id AND file_hash = :file_hash AND size_bytes = :size_bytes
+                    AND (object_key IS NOT NULL OR file_path IS NOT NULL)
+                    AND processing_status IS DISTINCT FROM 'failed'
+                    ORDER BY processed DESC, created_at ASC
+                    LIMIT 1
+                """),
+                {"organization_id": organization_id, "file_hash": file_hash, "size_bytes": announced.size_bytes}
+            ).fetchone()
+            
+            if not source:
+                entry.update(status="upload_required", upload_url="/files/upload")
+                continue
+            
+            file_id = str(uuid.uuid4())
+            copied = _link_stored_file(db, source, file_id, announced.filename, domain_id, current_user["id"])
+            linked_count += 1
+            chunks_copied += copied
+            
+            if source.processed:
+                entry.update(status="linked", id=file_id, chunks=copied)
+            else:
+                # Processed once the job runs; chunk dedup reuses the other copy's embeddings by hash
+                to_queue.append((file_id, source.content_type))
+                entry.update(status="queued", id=file_id)
+        
+        db.commit()
+        
+        if background_job_processor:
+            for file_id, content_type in to_queue:
+                await background_job_processor.queue_file_processing(
+                    file_id, None, content_type, domain_name, organization_id,
+                    priority_class=request.priority
+                )
+        
+        if linked_count:
+            AuditLogger.log_event(
+                db, "file_upload_linked", current_user["id"], "files", "create",
+                f"Linked {linked_count} stored files into domain {domain_name}",
+                {
+                    "file_ids": [entry["id"] for entry in results if entry.get("status") in ("linked", "queued")],
+                    "chunks_copied": chunks_copied,
+                    "domain": domain_name,
+                    "organization_id": organization_id
+                }
+            )
+        
+        return {"domain": domain_name, "files": results}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Upload handshake failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload handshake failed: {str(e)}")
+
+
 # ============================================================================
 # FILE MANAGEMENT ENDPOINTS
 # ============================================================================
@@ -584,8 +921,14 @@ async def delete_file(
         if not file_result:
             raise HTTPException(status_code=404, detail="File not found")
         
+        # Files linked through the upload handshake share one stored object; keep it while any still use it
+        shared = file_result.object_key and db.execute(
+            text("SELECT 1 FROM files WHERE object_key = :object_key AND id != :file_id LIMIT 1"),
+            {"object_key": file_result.object_key, "file_id": file_id}
+        ).fetchone()
+        
         # Delete file from storage
-        if file_result.storage_type == "minio" and minio_storage and file_result.object_key:
+        if file_result.storage_type == "minio" and minio_storage and file_result.object_key and not shared:
             storage_deleted = minio_storage.delete_file(file_result.object_key)
             if not storage_deleted:
                 logger.warning(f"Failed to delete file from storage: {file_result.object_key}")
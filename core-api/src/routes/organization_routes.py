@@ -726,6 +726,32 @@ async def remove_organization_member(
         raise HTTPException(status_code=500, detail=f"Failed to remove member: {str(e)}")
 
 
+# ============================================================================
+# EMBEDDING MODEL
+# ============================================================================
+
+@router.get("/{org_id}/embedding-migration")
+async def get_embedding_migration(
+    org_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Embedding model the organization searches and progress of its re-embedding to the current model"""
+    member = db.execute(
+        text("""
+            SELECT role FROM organization_members 
+            WHERE organization_id = :org_id AND user_id = :user_id AND is_active = true
+        """),
+        {"org_id": org_id, "user_id": current_user["id"]}
+    ).fetchone()
+    
+    if not member or member.role not in ['owner', 'admin']:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    from embedding_migrator import get_embedding_migrator
+    return get_embedding_migrator().get_migration_status(db, org_id)
+
+
 # ============================================================================
 # DOMAIN TEMPLATES
 # ============================================================================
@@ -12,6 +12,7 @@ import openai
 from openai import AsyncOpenAI
 
 from config import Settings
+from model_residency import get_model_residency
 
 
 class EmbeddingService:
@@ -22,6 +23,8 @@ class EmbeddingService:
         self.provider = settings.EMBEDDING_PROVIDER
         self.openai_client = None
         self.ollama_client = None
+        # Ollama embedding model: the current model when Ollama is the provider, else the fallback default
+        self.ollama_model = settings.embedding_current_model if self.provider == "ollama" else "nomic-embed-text"
         
     async def initialize(self):
         """Initialize the embedding service"""
@@ -31,36 +34,39 @@ class EmbeddingService:
         # Initialize HTTP client for Ollama
         self.ollama_client = httpx.AsyncClient(timeout=30.0)
         
-    async def generate_embedding(self, text: str) -> np.ndarray:
+    async def generate_embedding(self, text: str, allow_mock: bool = True) -> Optional[np.ndarray]:
         """
         Generate embedding for a single text
+        
+        Without ``allow_mock`` a text no provider could embed gives None instead of a mock
+        vector, so callers that store embeddings never store (or later reuse) one.
         """
         try:
             if self.provider == "openai" and self.openai_client:
                 return await self._generate_openai_embedding(text)
             elif self.provider == "ollama":
-                return await self._generate_ollama_embedding(text)
+                return await self._generate_ollama_embedding(text, allow_mock)
             else:
                 # Fallback to mock embedding for development
-                return self._generate_mock_embedding(text)
+                return self._mock_embedding_if_allowed(text, allow_mock)
         except Exception as e:
             print(f"Error generating embedding with {self.provider}: {e}")
             # Try fallback provider
             if self.provider == "openai":
                 try:
-                    return await self._generate_ollama_embedding(text)
+                    return await self._generate_ollama_embedding(text, allow_mock)
                 except:
-                    return self._generate_mock_embedding(text)
+                    return self._mock_embedding_if_allowed(text, allow_mock)
             else:
                 try:
                     if self.openai_client:
                         return await self._generate_openai_embedding(text)
                     else:
-                        return self._generate_mock_embedding(text)
+                        return self._mock_embedding_if_allowed(text, allow_mock)
                 except:
-                    return self._generate_mock_embedding(text)
+                    return self._mock_embedding_if_allowed(text, allow_mock)
     
-    async def generate_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
+    async def generate_embeddings_batch(self, texts: List[str], allow_mock: bool = True) -> List[Optional[np.ndarray]]:
         """
         Generate embeddings for multiple texts in batch
         """
@@ -68,7 +74,7 @@ class EmbeddingService:
             return await self._generate_openai_embeddings_batch(texts)
         else:
             # Process individually for Ollama or mock
-            tasks = [self.generate_embedding(text) for text in texts]
+            tasks = [self.generate_embedding(text, allow_mock) for text in texts]
             return await asyncio.gather(*tasks)
     
     async def _generate_openai_embedding(self, text: str) -> np.ndarray:
@@ -89,14 +95,17 @@ class EmbeddingService:
         )
         return [np.array(data.embedding, dtype=np.float32) for data in response.data]
     
-    async def _generate_ollama_embedding(self, text: str) -> np.ndarray:
+    async def _generate_ollama_embedding(self, text: str, allow_mock: bool = True) -> Optional[np.ndarray]:
         """Generate embedding using Ollama API"""
         try:
+            residency = get_model_residency()
+            residency.register("embedding", self.ollama_model)
             response = await self.ollama_client.post(
                 f"{self.settings.OLLAMA_BASE_URL}/api/embeddings",
                 json={
-                    "model": "nomic-embed-text",  # Default Ollama embedding model
-                    "prompt": text
+                    "model": self.ollama_model,
+                    "prompt": text,
+                    "keep_alive": residency.keep_alive("embedding")
                 }
             )
             response.raise_for_status()
@@ -105,7 +114,10 @@ class EmbeddingService:
         except Exception as e:
             print(f"Ollama embedding error: {e}")
             # Fallback to mock embedding
-            return self._generate_mock_embedding(text)
+            return self._mock_embedding_if_allowed(text, allow_mock)
+    
+    def _mock_embedding_if_allowed(self, text: str, allow_mock: bool) -> Optional[np.ndarray]:
+        return self._generate_mock_embedding(text) if allow_mock else None
     
     def _generate_mock_embedding(self, text: str) -> np.ndarray:
         """
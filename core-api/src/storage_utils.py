@@ -5,6 +5,7 @@ Provides S3-compatible object storage for uploaded documents with organization i
 
 import os
 import uuid
+import hashlib
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -18,6 +19,35 @@ from minio.commonconfig import Tags
 logger = logging.getLogger(__name__)
 
 
+class UploadTooLargeError(Exception):
+    """Raised mid-stream when an upload passes its size limit"""
+
+
+class HashingReader:
+    """File-like wrapper that hashes and counts bytes as they are read
+    
+    Used to stream an upload into storage without holding it in memory; reading
+    past ``max_size`` raises UploadTooLargeError, which aborts the upload.
+    """
+    
+    def __init__(self, stream: BinaryIO, max_size: Optional[int] = None):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise UploadTooLargeError(f"Upload exceeds {self.max_size} bytes")
+        self._sha256.update(data)
+        return data
+    
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
 class MinIOStorageManager:
     """MinIO storage manager with organization isolation"""
     
@@ -37,6 +67,8 @@ class MinIOStorageManager:
         
         # Default bucket for documents
         self.documents_bucket = "rag-documents"
+        # Extracted images, stored once per content hash
+        self.images_bucket = "rag-images"
         
         # Initialize buckets
         self._ensure_buckets_exist()
@@ -51,6 +83,11 @@ class MinIOStorageManager:
                 
                 # Set bucket policy for organization isolation
                 self._set_bucket_policy(self.documents_bucket)
+            
+            # Images are only served through the API image proxy, so no public policy
+            if not self.client.bucket_exists(self.images_bucket):
+                self.client.make_bucket(self.images_bucket)
+                logger.info(f"Created bucket: {self.images_bucket}")
                 
         except S3Error as e:
             logger.error(f"Error creating buckets: {e}")
@@ -152,6 +189,64 @@ class MinIOStorageManager:
                 "error": str(e)
             }
     
+    def upload_stream(
+        self,
+        reader: HashingReader,
+        organization_slug: str,
+        domain: str,
+        file_id: str,
+        filename: str,
+        content_type: str,
+        metadata: Optional[Dict[str, str]] = None,
+        part_size: int = 10 * 1024 * 1024
+    ) -> Dict[str, Any]:
+        """Stream a file to MinIO as a multipart upload, one part in memory at a time
+        
+        Blocking - run it in an executor. Size and sha256 come from ``reader`` once this
+        returns; UploadTooLargeError propagates after the partial upload is aborted.
+        """
+        object_key = self.generate_object_key(organization_slug, domain, file_id, filename)
+        
+        file_metadata = {
+            "organization": organization_slug,
+            "domain": domain,
+            "file_id": file_id,
+            "original_filename": filename,
+            "upload_date": datetime.utcnow().isoformat(),
+            "content_type": content_type
+        }
+        if metadata:
+            file_metadata.update(metadata)
+        
+        try:
+            result = self.client.put_object(
+                bucket_name=self.documents_bucket,
+                object_name=object_key,
+                data=reader,
+                length=-1,  # Unknown length: multipart upload in part_size pieces
+                part_size=part_size,
+                content_type=content_type,
+                metadata=file_metadata
+            )
+            
+            logger.info(f"Streamed file {filename} to MinIO: {object_key} ({reader.size} bytes)")
+            
+            return {
+                "success": True,
+                "object_key": object_key,
+                "bucket": self.documents_bucket,
+                "etag": result.etag,
+                "size": reader.size,
+                "url": self.get_file_url(object_key)
+            }
+            
+        except S3Error as e:
+            logger.error(f"Error streaming file to MinIO: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     def get_file_url(self, object_key: str, expires: timedelta = timedelta(hours=1)) -> str:
         """Get presigned URL for file access"""
         try:
@@ -188,6 +283,76 @@ class MinIOStorageManager:
             logger.error(f"Error downloading file from MinIO: {e}")
             return None
     
+    def download_to_file(self, object_key: str, file_path: str) -> bool:
+        """Download file from MinIO straight to a local path without buffering it in memory"""
+        try:
+            self.client.fget_object(
+                bucket_name=self.documents_bucket,
+                object_name=object_key,
+                file_path=file_path
+            )
+            return True
+            
+        except S3Error as e:
+            logger.error(f"Error downloading file from MinIO: {e}")
+            return False
+    
+    def image_object_key(self, content_hash: str) -> str:
+        """Object key of an image in the images bucket"""
+        return f"{content_hash[:2]}/{content_hash}"
+    
+    def put_image(self, content: bytes, content_type: str) -> Optional[Dict[str, Any]]:
+        """Store image bytes under their sha256, skipping the upload if the image is already stored
+        
+        Returns the reference to keep in metadata instead of the bytes.
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        object_key = self.image_object_key(content_hash)
+        try:
+            try:
+                self.client.stat_object(bucket_name=self.images_bucket, object_name=object_key)
+            except S3Error as e:
+                if e.code != "NoSuchKey":
+                    raise
+                from io import BytesIO
+                self.client.put_object(
+                    bucket_name=self.images_bucket,
+                    object_name=object_key,
+                    data=BytesIO(content),
+                    length=len(content),
+                    content_type=content_type
+                )
+            
+            return {
+                "content_hash": content_hash,
+                "object_key": object_key,
+                "content_type": content_type,
+                "size_bytes": len(content),
+                "stored_url": get_image_url(content_hash)
+            }
+            
+        except S3Error as e:
+            logger.error(f"Error storing image in MinIO: {e}")
+            return None
+    
+    def get_image(self, content_hash: str) -> Optional[tuple[bytes, str]]:
+        """Image bytes and content type for a content hash"""
+        try:
+            response = self.client.get_object(
+                bucket_name=self.images_bucket,
+                object_name=self.image_object_key(content_hash)
+            )
+            try:
+                return response.read(), response.headers.get("Content-Type", "application/octet-stream")
+            finally:
+                response.close()
+                response.release_conn()
+            
+        except S3Error as e:
+            if e.code != "NoSuchKey":
+                logger.error(f"Error downloading image from MinIO: {e}")
+            return None
+    
     def delete_file(self, object_key: str) -> bool:
         """Delete file from MinIO"""
         try:
@@ -314,5 +479,10 @@ class MinIOStorageManager:
             }
 
 
+def get_image_url(content_hash: str) -> str:
+    """Stable API URL for a stored image (unlike presigned URLs, safe to keep in metadata)"""
+    return f"/api/images/content/{content_hash}"
+
+
 # Global instance
 minio_storage = MinIOStorageManager() 
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Telemetry Writer - Batched background writes for analytics rows
+Keeps classification and RAG execution inserts off the request path
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+# Columns written per table; rows carry organization_id + domain (name), domain_id is resolved by the writer
+TELEMETRY_TABLES = {
+    "classification_results": [
+        "id", "query", "intent", "confidence", "domain_id", "organization_id", "classification_method",
+        "reasoning", "metadata", "user_id", "session_id", "created_at"
+    ],
+    "rag_executions": [
+        "id", "query", "domain_id", "mode", "intent", "confidence",
+        "response_type", "source_count", "processing_time_ms",
+        "user_id", "session_id", "organization_id", "created_at"
+    ]
+}
+
+
+class TelemetryWriter:
+    """Bounded in-process queue flushed to Postgres in multi-row INSERT batches
+
+    ``record()`` never blocks or touches the database: when the queue is full the row
+    is dropped and counted instead.
+    """
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200, flush_interval: float = 1.0,
+                 domain_cache_ttl: float = 300.0):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.domain_cache_ttl = domain_cache_ttl
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._domain_ids: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+        self.written_count: Dict[str, int] = {}
+        self.dropped_count: Dict[str, int] = {}
+        self.failed_count: Dict[str, int] = {}
+        self.unknown_domain_count = 0
+        self.batch_count = 0
+
+    def record(self, table: str, row: Dict) -> bool:
+        """Queue a row for ``table``; returns False if it was dropped"""
+        if self._queue is None or self._task is None or self._task.done():
+            try:
+                self.start()
+            except RuntimeError:
+                # No running event loop - nothing will flush this row
+                self.dropped_count[table] = self.dropped_count.get(table, 0) + 1
+                return False
+
+        try:
+            self._queue.put_nowait((table, row))
+        except asyncio.QueueFull:
+            dropped = self.dropped_count.get(table, 0) + 1
+            self.dropped_count[table] = dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Telemetry queue full, dropped {dropped} {table} rows so far")
+            return False
+        return True
+
+    def start(self):
+        """Start the background flush task"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task after writing whatever is still queued"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._queue is not None and not self._queue.empty():
+            await self._flush(self._drain(self._queue.qsize()))
+
+    async def _run(self):
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            # Give the batch a moment to fill before writing
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.flush_interval)
+            batch = [first] + self._drain(self.batch_size - 1)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(f"Telemetry flush failed: {e}")
+
+    def _drain(self, limit: int) -> List[Tuple[str, Dict]]:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return items
+
+    async def _flush(self, batch: List[Tuple[str, Dict]]):
+        rows_by_table: Dict[str, List[Dict]] = {}
+        for table, row in batch:
+            rows_by_table.setdefault(table, []).append(row)
+
+        loop = asyncio.get_running_loop()
+        for table, rows in rows_by_table.items():
+            await loop.run_in_executor(None, self._write_rows, table, rows)
+
+    def _write_rows(self, table: str, rows: List[Dict]):
+        """Resolve domain ids and insert all rows for a table, in one statement when they are all valid"""
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            resolved = []
+            for row in rows:
+                try:
+                    domain_id = self._resolve_domain_id(db, row.get("organization_id"), row.get("domain"))
+                except Exception as e:
+                    db.rollback()
+                    self.failed_count[table] = self.failed_count.get(table, 0) + 1
+                    logger.error(f"Failed to resolve domain for a {table} row: {e}")
+                    continue
+                if domain_id is None:
+                    self.unknown_domain_count += 1
+                    continue
+                resolved.append({**row, "domain_id": domain_id})
+
+            if resolved:
+                self._insert_rows(db, table, resolved)
+        finally:
+            db.close()
+
+    def _insert_rows(self, db, table: str, rows: List[Dict]):
+        """Insert ``rows`` in one statement; if that fails, bisect so only the bad rows are lost"""
+        columns = TELEMETRY_TABLES[table]
+        params = {}
+        values_sql = []
+        for i, row in enumerate(rows):
+            placeholders = []
+            for column in columns:
+                params[f"{column}_{i}"] = row.get(column)
+                placeholders.append(f":{column}_{i}")
+            values_sql.append(f"({', '.join(placeholders)})")
+
+        try:
+            db.execute(
+                text(f"""
+                    INSERT INTO {table} ({', '.join(columns)})
+                    VALUES {', '.join(values_sql)}
+                    ON CONFLICT (id) DO NOTHING
+                """),
+                params
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if len(rows) == 1:
+                self.failed_count[table] = self.failed_count.get(table, 0) + 1
+                logger.error(f"Failed to write {table} row {rows[0].get('id')}: {e}")
+                return
+            middle = len(rows) // 2
+            self._insert_rows(db, table, rows[:middle])
+            self._insert_rows(db, table, rows[middle:])
+            return
+
+        self.batch_count += 1
+        self.written_count[table] = self.written_count.get(table, 0) + len(rows)
+
+    def _resolve_domain_id(self, db, organization_id: Optional[str], domain: Optional[str]) -> Optional[str]:
+        """Active domain id for an organization's domain name, cached for ``domain_cache_ttl`` seconds"""
+        key = (str(organization_id), domain)
+        cached = self._domain_ids.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.domain_cache_ttl:
+            return cached[0]
+
+        result = db.execute(
+            text("""
+                SELECT id FROM organization_domains
+                WHERE organization_id = :organization_id AND domain_name = :domain_name AND is_active = true
+            """),
+            {"organization_id": organization_id, "domain_name": domain}
+        ).fetchone()
+        if not result:
+            # Deleted or deactivated - forget it so the row isn't attributed to a stale id
+            self._domain_ids.pop(key, None)
+            return None
+        self._domain_ids[key] = (str(result.id), time.monotonic())
+        return self._domain_ids[key][0]
+
+    def get_stats(self) -> Dict:
+        """Queue depth plus written / dropped / failed counters"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "batch_count": self.batch_count,
+            "written": dict(self.written_count),
+            "dropped": dict(self.dropped_count),
+            "failed": dict(self.failed_count),
+            "unknown_domain": self.unknown_domain_count
+        }
+
+
+# Global instance
+_telemetry_writer: Optional[TelemetryWriter] = None
+
+
+def get_telemetry_writer() -> TelemetryWriter:
+    """Get the global telemetry writer (singleton)"""
+    global _telemetry_writer
+    if _telemetry_writer is None:
+        settings = get_settings()
+        _telemetry_writer = TelemetryWriter(
+            max_queue_size=settings.telemetry_queue_size,
+            batch_size=settings.telemetry_batch_size,
+            flush_interval=settings.telemetry_flush_interval,
+            domain_cache_ttl=settings.telemetry_domain_cache_ttl
+        )
+    return _telemetry_writer
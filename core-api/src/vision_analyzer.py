@@ -2,15 +2,23 @@
 Vision Analyzer Service - Analyze images for better contextual descriptions
 """
 
+import asyncio
 import base64
-import requests
 from typing import Dict, List, Optional
 import logging
 from PIL import Image
 import io
 
+from ollama_client import get_ollama_client
+from model_residency import get_model_residency
+
 logger = logging.getLogger(__name__)
 
+
+class VisionModelBusy(Exception):
+    """Raised when the heavy-model gate wasn't entered in time; no analysis was attempted"""
+
+
 class VisionAnalyzer:
     """Analyze images to provide better contextual descriptions"""
     
@@ -18,12 +26,17 @@ class VisionAnalyzer:
         self.ollama_base_url = ollama_base_url
         self.vision_model = "llama3.2-vision:11b"  # Multimodal model
         self.available = False
-        self._check_vision_model()
+        self.status = "initializing"  # initializing | ready | pulling | unavailable
+        self._pull_task: Optional[asyncio.Task] = None
     
-    def _check_vision_model(self):
+    async def initialize(self):
+        """Check for a vision model; a missing one is pulled in the background"""
+        await self._check_vision_model()
+    
+    async def _check_vision_model(self):
         """Check if vision model is available"""
         try:
-            response = requests.get(f"{self.ollama_base_url}/api/tags", timeout=5)
+            response = await get_ollama_client().get(f"{self.ollama_base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 available_models = [model["name"] for model in models]
@@ -41,21 +54,28 @@ class VisionAnalyzer:
                     if model in available_models:
                         self.vision_model = model
                         self.available = True
+                        self.status = "ready"
+                        get_model_residency().register("vision", self.vision_model)
                         logger.info(f"Vision model available: {self.vision_model}")
                         return
                 
-                # Try to pull a lightweight vision model
-                logger.info("No vision model found. Attempting to pull moondream:1.8b...")
-                self._pull_vision_model("moondream:1.8b")
+                # Try to pull a lightweight vision model without holding up the caller
+                if self._pull_task is None or self._pull_task.done():
+                    logger.info("No vision model found. Attempting to pull moondream:1.8b...")
+                    self.status = "pulling"
+                    self._pull_task = asyncio.get_running_loop().create_task(self._pull_vision_model("moondream:1.8b"))
+            else:
+                self.status = "unavailable"
                 
         except Exception as e:
             logger.error(f"Error checking vision model: {e}")
             self.available = False
+            self.status = "unavailable"
     
-    def _pull_vision_model(self, model_name: str):
+    async def _pull_vision_model(self, model_name: str):
         """Pull a vision model if none available"""
         try:
-            response = requests.post(
+            response = await get_ollama_client().post(
                 f"{self.ollama_base_url}/api/pull",
                 json={"name": model_name},
                 timeout=600  # 10 minutes for model download
@@ -64,13 +84,31 @@ class VisionAnalyzer:
             if response.status_code == 200:
                 self.vision_model = model_name
                 self.available = True
+                self.status = "ready"
+                get_model_residency().register("vision", self.vision_model)
                 logger.info(f"Successfully pulled vision model: {model_name}")
+            else:
+                self.status = "unavailable"
             
         except Exception as e:
             logger.error(f"Failed to pull vision model {model_name}: {e}")
+            self.status = "unavailable"
+    
+    def get_status(self) -> Dict:
+        """Readiness state for the health endpoint"""
+        return {"status": self.status, "model": self.vision_model if self.available else None}
     
-    def analyze_image(self, image_data: bytes, context_hint: str = "") -> Dict[str, str]:
-        """Analyze an image and return contextual description"""
+    async def analyze_image(self, image_data: bytes, context_hint: str = "", timeout: float = 45.0,
+                            fallback: bool = True, gate_timeout: Optional[float] = None) -> Dict[str, str]:
+        """Analyze an image and return contextual description (bounded by ``timeout`` seconds)
+        
+        ``timeout`` starts once the vision model is free; waiting for in-flight chat
+        generations is bounded separately by ``gate_timeout`` (None: no bound) and raises
+        VisionModelBusy when exceeded.
+        
+        With ``fallback=False`` failures raise instead of returning a generic description,
+        so callers that cache results don't cache the placeholder.
+        """
         if not self.available:
             return {
                 "description": "Image analysis not available",
@@ -108,20 +146,7 @@ Context hint: {context_hint}
 Provide a clear, accurate description that distinguishes between interface screenshots and document images."""
             
             # Send to vision model
-            response = requests.post(
-                f"{self.ollama_base_url}/api/generate",
-                json={
-                    "model": self.vision_model,
-                    "prompt": prompt,
-                    "images": [image_b64],
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,  # Very low temperature for consistent analysis
-                        "max_tokens": 300
-                    }
-                },
-                timeout=45
-            )
+            response = await self._post_analysis(prompt, image_b64, timeout, gate_timeout)
             
             if response.status_code == 200:
                 result = response.json()
@@ -131,9 +156,21 @@ Provide a clear, accurate description that distinguishes between interface scree
                 analysis = self._parse_vision_response_strict(description)
                 logger.info(f"Vision analysis complete: {analysis['content_type']} - {description[:100]}...")
                 return analysis
+            if not fallback:
+                raise RuntimeError(f"Vision model returned HTTP {response.status_code}")
             
+        except VisionModelBusy:
+            logger.warning(f"Vision model still busy with chat after {gate_timeout}s")
+            if not fallback:
+                raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Vision analysis exceeded {timeout}s deadline")
+            if not fallback:
+                raise
         except Exception as e:
             logger.error(f"Vision analysis failed: {e}")
+            if not fallback:
+                raise
         
         # Fallback analysis
         return {
@@ -143,6 +180,35 @@ Provide a clear, accurate description that distinguishes between interface scree
             "content_type": "interface"
         }
     
+    async def _post_analysis(self, prompt: str, image_b64: str, timeout: float, gate_timeout: Optional[float]):
+        residency = get_model_residency()
+        entered = False
+        try:
+            # Waits for in-flight chat generations so the vision model doesn't evict the chat model mid-answer
+            async with residency.use("vision", timeout=gate_timeout):
+                entered = True
+                return await asyncio.wait_for(
+                    get_ollama_client().post(
+                        f"{self.ollama_base_url}/api/generate",
+                        json={
+                            "model": self.vision_model,
+                            "prompt": prompt,
+                            "images": [image_b64],
+                            "stream": False,
+                            "keep_alive": residency.keep_alive("vision"),
+                            "options": {
+                                "temperature": 0.1,  # Very low temperature for consistent analysis
+                                "max_tokens": 300
+                            }
+                        }
+                    ),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            if not entered:
+                raise VisionModelBusy(f"Vision model gate not entered within {gate_timeout}s")
+            raise
+    
     def _parse_vision_response_strict(self, description: str) -> Dict[str, str]:
         """Parse vision model response with strict content type detection"""
         description_lower = description.lower()
@@ -237,7 +303,7 @@ Provide a clear, accurate description that distinguishes between interface scree
             "content_type": content_type
         }
     
-    def enhance_image_metadata(self, images_data: List[Dict]) -> List[Dict]:
+    async def enhance_image_metadata(self, images_data: List[Dict]) -> List[Dict]:
         """Enhance existing image metadata with vision analysis"""
         if not self.available:
             return images_data
@@ -248,14 +314,19 @@ Provide a clear, accurate description that distinguishes between interface scree
             enhanced_img = img_data.copy()
             
             try:
-                # Get image data (assuming it's stored as base64 or URL)
-                if 'data' in img_data and img_data['data'].startswith('data:image'):
-                    # Extract base64 data
+                # Get image data from the image store (or a legacy inline data URI)
+                image_bytes = None
+                if img_data.get('content_hash'):
+                    from storage_utils import minio_storage
+                    stored = await asyncio.get_running_loop().run_in_executor(None, minio_storage.get_image, img_data['content_hash'])
+                    image_bytes = stored[0] if stored else None
+                elif 'data' in img_data and img_data['data'].startswith('data:image'):
                     b64_data = img_data['data'].split(',')[1]
                     image_bytes = base64.b64decode(b64_data)
-                    
+                
+                if image_bytes:
                     # Analyze the image
-                    analysis = self.analyze_image(image_bytes, img_data.get('alt_text', ''))
+                    analysis = await self.analyze_image(image_bytes, img_data.get('alt_text', ''))
                     
                     # Enhance metadata
                     enhanced_img.update({
@@ -344,9 +415,12 @@ Provide a clear, accurate description that distinguishes between interface scree
         logger.info(f"Selected image for query '{query}': {best_image.get('alt_text', 'Unknown')} (score: {best_score})")
         return best_image
 
-# Global instance
-vision_analyzer = VisionAnalyzer()
+# Global instance (created lazily; no Ollama calls until initialize())
+_vision_analyzer: Optional[VisionAnalyzer] = None
 
 def get_vision_analyzer() -> VisionAnalyzer:
     """Get the global vision analyzer instance"""
-    return vision_analyzer 
\ No newline at end of file
+    global _vision_analyzer
+    if _vision_analyzer is None:
+        _vision_analyzer = VisionAnalyzer()
+    return _vision_analyzer
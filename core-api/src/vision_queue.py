@@ -0,0 +1,498 @@
+"""
+Vision Queue - Image analysis as its own ingestion stage
+Documents and pages queue their stored images by content hash and become searchable
+right away; a background worker describes each distinct image once, caches the result
+permanently in ``image_analyses`` and then writes a description embedding per tenant domain.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from config import get_settings
+from embedding_migrator import LOCAL_EMBEDDING_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Namespace for description embedding ids: one row per (organization, domain, image content)
+IMAGE_DESCRIPTION_NAMESPACE = uuid.UUID("7f6d3c2a-9b1e-4c5d-8a7f-2e4b6c8d0a13")
+
+# Model tag written with description embeddings (the API's SentenceTransformer)
+DESCRIPTION_EMBEDDING_MODEL = LOCAL_EMBEDDING_MODEL
+
+# Vision content types that mean the image is a UI screenshot
+SCREENSHOT_CONTENT_TYPES = ['login_page', 'dashboard', 'form', 'settings', 'navigation']
+
+
+def apply_image_analysis(img_info: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Image metadata enriched with a vision analysis (description, tags, better alt text)"""
+    enhanced = {
+        **img_info,
+        'enhanced_description': analysis['description'],
+        'content_type_detected': analysis['content_type'],
+        'context_tags': analysis['context_tags'],
+        'ui_elements': analysis['ui_elements'],
+        'vision_analyzed': True,
+        'vision_analyzed_at': analysis.get('completed_at') or datetime.utcnow().isoformat()
+    }
+
+    if analysis['content_type'] != 'unknown':
+        content_type_name = analysis['content_type'].replace('_', ' ').title()
+        description = analysis['description']
+        description_preview = description[:80] + "..." if len(description) > 80 else description
+        enhanced['alt_text'] = f"{content_type_name}: {description_preview}"
+
+    if analysis['content_type'] in SCREENSHOT_CONTENT_TYPES or 'interface' in analysis.get('context_tags', []):
+        enhanced['type'] = 'screenshot'
+    else:
+        enhanced['type'] = 'image'
+    return enhanced
+
+
+class VisionAnalysisQueue:
+    """Postgres-backed queue of images waiting for vision analysis
+
+    ``image_analyses`` holds one row per image content hash and doubles as the permanent
+    result cache; ``image_analysis_requests`` records which tenant domains are waiting for a
+    description of which image. Claims use ``FOR UPDATE SKIP LOCKED`` so several API
+    processes can share the queue.
+    """
+
+    def __init__(self, concurrency: int = 1, poll_interval: float = 15.0, max_attempts: int = 3,
+                 lease_seconds: int = 300, gate_timeout: float = 120.0):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.gate_timeout = gate_timeout
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.queued_count = 0
+        self.analyzed_count = 0
+        self.failed_count = 0
+        self.deferred_count = 0
+        self.cache_hit_count = 0
+        self.descriptions_written = 0
+
+    def enqueue(self, db, content_hash: str, organization_id: str, domain_id: Optional[str],
+                context_hint: str = "", source_metadata: Optional[Dict[str, Any]] = None):
+        """Ask for a description of an image for a tenant's domain; the caller commits
+
+        Images already analysed are not analysed again; the domain's description
+        embedding is written from the cached result. Without a domain the image is
+        still analysed, but there is nowhere to write a description.
+        """
+        db.execute(
+            text("""
+                INSERT INTO image_analyses (content_hash, status, context_hint, created_at)
+                VALUES (:content_hash, 'pending', :context_hint, NOW())
+                ON CONFLICT (content_hash) DO NOTHING
+            """),
+            {"content_hash": content_hash, "context_hint": context_hint}
+        )
+        if domain_id:
+            db.execute(
+                text("""
+                    INSERT INTO image_analysis_requests (id, content_hash, organization_id, domain_id, metadata, created_at)
+                    VALUES (:id, :content_hash, :organization_id, :domain_id, :metadata, NOW())
+                    ON CONFLICT (content_hash, organization_id, domain_id) DO NOTHING
+                """),
+                {
+                    "id": str(uuid.uuid4()),
+                    "content_hash": content_hash,
+                    "organization_id": str(organization_id),
+                    "domain_id": str(domain_id),
+                    "metadata": json.dumps(source_metadata or {})
+                }
+            )
+        self.queued_count += 1
+        self.wake()
+
+    def enqueue_images(self, db, images: Iterable[Dict[str, Any]], organization_id: str, domain_id: Optional[str],
+                       source_metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Queue every stored image (one with a ``content_hash``) that hasn't been analysed yet"""
+        queued = 0
+        for img_info in images:
+            if img_info.get('content_hash') and not img_info.get('vision_analyzed'):
+                self.enqueue(db, img_info['content_hash'], organization_id, domain_id,
+                             context_hint=img_info.get('alt_text', ''), source_metadata=source_metadata)
+                queued += 1
+        return queued
+
+    def get_cached(self, db, content_hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Completed analyses for the given image hashes"""
+        content_hashes = list(set(content_hashes))
+        if not content_hashes:
+            return {}
+        rows = db.execute(
+            text("""
+                SELECT content_hash, description, content_type_detected, context_tags, ui_elements, completed_at
+                FROM image_analyses
+                WHERE content_hash = ANY(:content_hashes) AND status = 'done'
+            """),
+            {"content_hashes": content_hashes}
+        ).fetchall()
+        self.cache_hit_count += len(rows)
+        return {
+            row.content_hash: {
+                "description": row.description,
+                "content_type": row.content_type_detected,
+                "context_tags": row.context_tags or [],
+                "ui_elements": row.ui_elements or [],
+                "completed_at": row.completed_at.isoformat() if row.completed_at else None
+            }
+            for row in rows
+        }
+
+    def start(self):
+        """Start the background worker"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background worker; unfinished analyses are retried after their lease expires"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def wake(self):
+        """Check for work now instead of at the next poll (safe to call from any thread)"""
+        if self._wakeup is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        from vision_analyzer import get_vision_analyzer
+
+        loop = asyncio.get_running_loop()
+        analyzer = get_vision_analyzer()
+        while True:
+            try:
+                self._wakeup.clear()
+                if analyzer.status == "initializing":
+                    await analyzer.initialize()
+
+                # Cached results first: they only need an embedding row
+                written = await loop.run_in_executor(None, self._fulfil_requests, 200)
+                claimed = []
+                if analyzer.available:
+                    claimed = await loop.run_in_executor(None, self._claim, self.concurrency)
+                    if claimed:
+                        await asyncio.gather(*(self._analyze(row.content_hash, row.context_hint or "") for row in claimed))
+
+                if claimed or written:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in vision analysis queue: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def _claim(self, limit: int) -> list:
+        """Lease up to ``limit`` images waiting for analysis"""
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self._reap_exhausted_analyses(db)
+            rows = db.execute(
+                text("""
+                    WITH claimable AS (
+                        SELECT content_hash FROM image_analyses
+                        WHERE (
+                            status = 'pending'
+                            OR (status = 'running' AND started_at < NOW() - make_interval(secs => :lease_seconds))
+                        )
+                        AND attempts < :max_attempts
+                        ORDER BY created_at ASC
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE image_analyses a
+                    SET status = 'running', attempts = a.attempts + 1, started_at = NOW()
+                    FROM claimable c
+                    WHERE a.content_hash = c.content_hash
+                    RETURNING a.content_hash, a.context_hint
+                """),
+                {"limit": limit, "max_attempts": self.max_attempts, "lease_seconds": self.lease_seconds}
+            ).fetchall()
+            db.commit()
+            return rows
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error claiming images for analysis: {e}")
+            return []
+        finally:
+            db.close()
+
+    def _reap_exhausted_analyses(self, db):
+        """Fail images whose worker died on the last allowed attempt
+
+        They can't be claimed again, so without this they (and the requests waiting
+        on them) would stay open forever.
+        """
+        reaped = db.execute(
+            text("""
+                UPDATE image_analyses
+                SET status = 'failed', error_message = 'Worker lost on final attempt'
+                WHERE status = 'running'
+                AND attempts >= :max_attempts
+                AND started_at < NOW() - make_interval(secs => :lease_seconds)
+            """),
+            {"max_attempts": self.max_attempts, "lease_seconds": self.lease_seconds}
+        ).rowcount
+        if reaped:
+            self.failed_count += reaped
+            logger.warning(f"Failed {reaped} image analyses abandoned on their final attempt")
+            self.wake()  # Their requests can be closed now
+
+    async def _analyze(self, content_hash: str, context_hint: str):
+        """Describe one image and embed the description, recording the result or the failure"""
+        from storage_utils import minio_storage
+        from vision_analyzer import VisionModelBusy, get_vision_analyzer
+
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(None, minio_storage.get_image, content_hash)
+            if not image:
+                raise RuntimeError("Image not found in object storage")
+
+            try:
+                analysis = await get_vision_analyzer().analyze_image(
+                    image[0], context_hint, fallback=False, gate_timeout=self.gate_timeout
+                )
+            except VisionModelBusy:
+                # Chat kept the model busy: try again later without using up an attempt
+                self.deferred_count += 1
+                await loop.run_in_executor(None, self._store_deferral, content_hash)
+                return
+            embedding = None
+            if analysis['description']:
+                embedding = await loop.run_in_executor(None, self._embed_description, analysis['description'])
+            await loop.run_in_executor(None, self._store_result, content_hash, analysis, embedding)
+            self.analyzed_count += 1
+        except Exception as e:
+            logger.warning(f"Vision analysis of image {content_hash[:12]} failed: {e}")
+            self.failed_count += 1
+            await loop.run_in_executor(None, self._store_failure, content_hash, str(e))
+
+    def _embed_description(self, description: str) -> Optional[List[float]]:
+        from main import embeddings_model
+
+        if embeddings_model is None:
+            return None
+        return embeddings_model.encode([description])[0].tolist()
+
+    def _store_result(self, content_hash: str, analysis: Dict[str, Any], embedding: Optional[List[float]]):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("""
+                    UPDATE image_analyses
+                    SET status = 'done', description = :description, content_type_detected = :content_type,
+                        context_tags = :context_tags, ui_elements = :ui_elements,
+                        embedding = :embedding, embedding_model = :embedding_model,
+                        error_message = NULL, completed_at = NOW()
+                    WHERE content_hash = :content_hash
+                """),
+                {
+                    "content_hash": content_hash,
+                    "description": analysis['description'],
+                    "content_type": analysis['content_type'],
+                    "context_tags": json.dumps(analysis['context_tags']),
+                    "ui_elements": json.dumps(analysis['ui_elements']),
+                    "embedding": json.dumps(embedding) if embedding is not None else None,
+                    "embedding_model": DESCRIPTION_EMBEDDING_MODEL if embedding is not None else None
+                }
+            )
+            db.commit()
+        finally:
+            db.close()
+        self.wake()  # Requests for this image can be fulfilled now
+
+    def _store_deferral(self, content_hash: str):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("""
+                    UPDATE image_analyses
+                    SET status = 'pending', attempts = GREATEST(attempts - 1, 0)
+                    WHERE content_hash = :content_hash AND status = 'running'
+                """),
+                {"content_hash": content_hash}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to defer vision analysis of {content_hash[:12]}: {e}")
+        finally:
+            db.close()
+
+    def _store_failure(self, content_hash: str, error_message: str):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("""
+                    UPDATE image_analyses
+                    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+                        error_message = :error_message
+                    WHERE content_hash = :content_hash
+                """),
+                {"content_hash": content_hash, "error_message": error_message, "max_attempts": self.max_attempts}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to record vision analysis failure for {content_hash[:12]}: {e}")
+        finally:
+            db.close()
+
+    def _fulfil_requests(self, limit: int) -> int:
+        """Write description embeddings for requests whose image has been analysed; returns rows written"""
+        from database import SessionLocal
+        from chunking import content_hash as text_hash
+        from embedding_writer import EmbeddingBulkWriter
+        from storage_utils import get_image_url
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                text("""
+                    SELECT r.id, r.content_hash, r.organization_id, r.domain_id, r.metadata,
+                           a.status, a.description, a.content_type_detected, a.embedding, a.embedding_model
+                    FROM image_analysis_requests r
+                    JOIN image_analyses a ON a.content_hash = r.content_hash
+                    WHERE a.status IN ('done', 'failed')
+                    ORDER BY r.created_at ASC
+                    LIMIT :limit
+                    FOR UPDATE OF r SKIP LOCKED
+                """),
+                {"limit": limit}
+            ).fetchall()
+            if not rows:
+                return 0
+
+            writer = EmbeddingBulkWriter(
+                [
+                    "id", "organization_id", "domain_id", "source_type", "source_id", "chunk_index",
+                    "content_text", "content_hash", "embedding", "metadata", "embedding_model", "created_at"
+                ],
+                on_conflict="""
+                    ON CONFLICT (source_id, chunk_index, embedding_model) DO UPDATE SET content_text = EXCLUDED.content_text,
+                        content_hash = EXCLUDED.content_hash, embedding = EXCLUDED.embedding,
+                        metadata = EXCLUDED.metadata
+                """
+            )
+            legacy_ids: Dict[str, List[str]] = {}
+            for row in rows:
+                # Failed analyses and images without a usable embedding just drop the request
+                if row.status != 'done' or row.embedding is None or row.domain_id is None:
+                    continue
+                embedding = row.embedding if isinstance(row.embedding, list) else json.loads(row.embedding)
+                source_metadata = row.metadata if isinstance(row.metadata, dict) else json.loads(row.metadata or "{}")
+                description_id = str(uuid.uuid5(
+                    IMAGE_DESCRIPTION_NAMESPACE, f"{row.organization_id}:{row.domain_id}:{row.content_hash}"
+                ))
+                # Rows written before ids included the domain are replaced by this one
+                legacy_ids.setdefault(str(row.domain_id), []).append(
+                    str(uuid.uuid5(IMAGE_DESCRIPTION_NAMESPACE, f"{row.organization_id}:{row.content_hash}"))
+                )
+                writer.add({
+                    "id": description_id,
+                    "organization_id": str(row.organization_id),
+                    "domain_id": str(row.domain_id),
+                    "source_type": "image_description",
+                    "source_id": description_id,
+                    "chunk_index": 0,
+                    "content_text": row.description,
+                    "content_hash": text_hash(row.description),
+                    "embedding": json.dumps(embedding),
+                    "metadata": json.dumps({
+                        **source_metadata,
+                        "content_type": "image_description",
+                        "description": row.description,
+                        "content_type_detected": row.content_type_detected,
+                        "image_content_hash": row.content_hash,
+                        "stored_image_url": get_image_url(row.content_hash)
+                    }),
+                    "embedding_model": row.embedding_model,
+                    "created_at": datetime.utcnow()
+                })
+
+            for domain_id, ids in legacy_ids.items():
+                db.execute(
+                    text("""
+                        DELETE FROM embeddings
+                        WHERE id = ANY(:ids) AND domain_id = :domain_id AND source_type = 'image_description'
+                    """),
+                    {"ids": ids, "domain_id": domain_id}
+                )
+            written = writer.write(db)
+            db.execute(
+                text("DELETE FROM image_analysis_requests WHERE id = ANY(:ids)"),
+                {"ids": [str(row.id) for row in rows]}
+            )
+            db.commit()
+            self.descriptions_written += written
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write image description embeddings: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """Counters for the health endpoint"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "queued": self.queued_count,
+            "analyzed": self.analyzed_count,
+            "failed": self.failed_count,
+            "deferred": self.deferred_count,
+            "cache_hits": self.cache_hit_count,
+            "descriptions_written": self.descriptions_written
+        }
+
+
+# Global instance
+_vision_queue: Optional[VisionAnalysisQueue] = None
+
+
+def get_vision_queue() -> VisionAnalysisQueue:
+    """Get the global vision analysis queue (singleton)"""
+    global _vision_queue
+    if _vision_queue is None:
+        settings = get_settings()
+        _vision_queue = VisionAnalysisQueue(
+            concurrency=settings.vision_queue_concurrency,
+            poll_interval=settings.vision_queue_poll_interval,
+            max_attempts=settings.vision_queue_max_attempts,
+            lease_seconds=settings.vision_queue_lease_seconds,
+            gate_timeout=settings.vision_queue_gate_timeout
+        )
+    return _vision_queue
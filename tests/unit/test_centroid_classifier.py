@@ -0,0 +1,138 @@
+"""
+Unit tests for embedding-centroid intent classification
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from classifiers import EmbeddingCentroidClassifier
+
+MODEL = "nomic-embed-text"
+
+# One axis per intent, so an example's vector says which intent it belongs to
+AXES = {"bug": [1.0, 0.0, 0.0], "feature": [0.0, 1.0, 0.0], "training": [0.0, 0.0, 1.0]}
+EXAMPLES = {intent: [f"{intent} example {i}" for i in range(3)] for intent in AXES}
+
+
+async def stub_embed_texts(embedding_model, texts):
+    return [AXES[text.split()[0]] for text in texts]
+
+
+def make_classifier(embed_texts=stub_embed_texts, **kwargs):
+    classifier = EmbeddingCentroidClassifier(EXAMPLES, retry_interval=0.01, **kwargs)
+    classifier.embed_texts = embed_texts
+    return classifier
+
+
+def built_classifier(**kwargs):
+    classifier = make_classifier(**kwargs)
+    asyncio.run(classifier._build_intent_centroids(MODEL))
+    return classifier
+
+
+class TestBuild:
+    """Centroids are built once from the example queries, off the query path"""
+
+    def test_examples_are_embedded_in_one_batch(self):
+        calls = []
+
+        async def embed_texts(embedding_model, texts):
+            calls.append((embedding_model, len(texts)))
+            return await stub_embed_texts(embedding_model, texts)
+
+        classifier = built_classifier(embed_texts=embed_texts)
+        assert calls == [(MODEL, 9)]
+        assert set(classifier._intent_centroids) == set(AXES)
+
+    def test_query_before_build_is_skipped_and_starts_it(self):
+        async def run():
+            classifier = make_classifier()
+            result, ranked = await classifier.classify_intent([1.0, 0.0, 0.0], MODEL)
+            assert (result, ranked) == (None, [])
+            await classifier._build_task
+            result, _ = await classifier.classify_intent([1.0, 0.0, 0.0], MODEL)
+            assert result.intent == "bug"
+        asyncio.run(run())
+
+    def test_failed_build_retries_without_caching_anything(self):
+        attempts = []
+
+        async def flaky(embedding_model, texts):
+            attempts.append(embedding_model)
+            if len(attempts) < 3:
+                raise RuntimeError("embedding model not loaded")
+            return await stub_embed_texts(embedding_model, texts)
+
+        async def run():
+            classifier = make_classifier(embed_texts=flaky)
+            classifier.start_background_build(MODEL)
+            await asyncio.sleep(0)
+            assert classifier._intent_centroids is None
+            await classifier._build_task
+            assert len(attempts) == 3
+            assert classifier._intent_model == MODEL
+        asyncio.run(run())
+
+    def test_other_model_query_is_skipped(self):
+        classifier = built_classifier()
+
+        async def run():
+            result, ranked = await classifier.classify_intent([1.0, 0.0, 0.0], "mxbai-embed-large")
+            await classifier.stop_background_build()
+            return result, ranked
+
+        assert asyncio.run(run()) == (None, [])
+
+
+class TestRanking:
+    """Nearest centroid wins when it is clearly ahead"""
+
+    def test_nearest_centroid_ranks_first(self):
+        classifier = built_classifier()
+        ranked = classifier._rank([0.2, 0.9, 0.1], classifier._intent_centroids)
+        assert [intent for intent, _ in ranked] == ["feature", "bug", "training"]
+
+    def test_mismatched_dimensions_are_ignored(self):
+        classifier = built_classifier()
+        assert classifier._rank([1.0, 0.0], classifier._intent_centroids) == []
+
+    def test_small_margin_falls_back(self):
+        classifier = built_classifier(min_margin=0.05)
+        result, ranked = asyncio.run(classifier.classify_intent([1.0, 0.98, 0.0], MODEL))
+        assert result is None
+        assert ranked[0][0] == "bug"
+
+    def test_low_similarity_falls_back(self):
+        classifier = built_classifier(min_similarity=0.5)
+        result, ranked = asyncio.run(classifier.classify_intent([0.4, 0.1, -0.9], MODEL))
+        assert ranked[0][0] == "bug"
+        assert result is None
+
+    def test_clear_winner_is_classified(self):
+        classifier = built_classifier()
+        result, _ = asyncio.run(classifier.classify_intent([0.1, 0.0, 1.0], MODEL))
+        assert result.intent == "training"
+        assert result.method == "embedding"
+
+
+class TestConfidence:
+    """Margins map to confidences that only trigger workflows when intents are well separated"""
+
+    def test_minimum_margin_stays_below_workflow_threshold(self):
+        classifier = make_classifier(min_margin=0.05)
+        assert classifier.confidence_for_margin(0.05) == pytest.approx(0.5)
+        assert classifier.confidence_for_margin(0.1) < 0.7
+
+    def test_confidence_grows_with_margin_and_is_capped(self):
+        classifier = make_classifier(min_margin=0.05)
+        assert classifier.confidence_for_margin(0.2) > classifier.confidence_for_margin(0.1)
+        assert classifier.confidence_for_margin(1.0) == 0.95
+
+    def test_classified_result_uses_the_mapping(self):
+        classifier = built_classifier()
+        query = np.array([0.1, 0.0, 1.0])
+        result, ranked = asyncio.run(classifier.classify_intent(query, MODEL))
+        margin = ranked[0][1] - ranked[1][1]
+        assert result.confidence == pytest.approx(classifier.confidence_for_margin(margin))
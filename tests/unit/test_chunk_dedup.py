@@ -0,0 +1,86 @@
+"""
+Unit tests for chunk deduplication planning and boilerplate filtering
+"""
+
+import pytest
+
+from chunk_dedup import ChunkDeduplicator
+from chunking import Block, Chunk, content_hash
+
+
+def make_chunk(chunk_id, index, text):
+    return Chunk(id=chunk_id, index=index, text=text, token_count=len(text.split()), content_hash=content_hash(text))
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    dedup = ChunkDeduplicator(boilerplate_min_sources=3, min_block_chars=10)
+    monkeypatch.setattr(dedup, "reusable_embeddings", lambda db, org, model, hashes: {})
+    return dedup
+
+
+class TestPlan:
+    """Splitting chunks into unchanged, reusable and to-embed"""
+
+    def test_all_new_on_first_run(self, dedup):
+        chunks = [make_chunk("a", 0, "first"), make_chunk("b", 1, "second")]
+        plan = dedup.plan(None, "org", "model", chunks, existing={})
+        assert [chunk.id for chunk in plan["new"]] == ["a", "b"]
+        assert plan["unchanged"] == []
+        assert plan["moved_ids"] == []
+
+    def test_same_id_and_position_is_unchanged(self, dedup):
+        chunks = [make_chunk("a", 0, "first"), make_chunk("b", 1, "second")]
+        plan = dedup.plan(None, "org", "model", chunks, existing={"a": 0, "b": 1})
+        assert plan["new"] == []
+        assert [chunk.id for chunk in plan["unchanged"]] == ["a", "b"]
+
+    def test_moved_chunk_is_rewritten_and_old_row_removed(self, dedup):
+        chunks = [make_chunk("new", 0, "inserted"), make_chunk("a", 1, "first")]
+        plan = dedup.plan(None, "org", "model", chunks, existing={"a": 0})
+        assert [chunk.id for chunk in plan["new"]] == ["new", "a"]
+        assert plan["moved_ids"] == ["a"]
+
+    def test_reuse_is_looked_up_for_new_chunks_only(self, dedup, monkeypatch):
+        looked_up = []
+
+        def reusable(db, org, model, hashes):
+            looked_up.extend(hashes)
+            return {content_hash("second"): "[0.1]"}
+
+        monkeypatch.setattr(dedup, "reusable_embeddings", reusable)
+        chunks = [make_chunk("a", 0, "first"), make_chunk("b", 1, "second")]
+        plan = dedup.plan(None, "org", "model", chunks, existing={"a": 0})
+        assert looked_up == [content_hash("second")]
+        assert plan["reuse"] == {content_hash("second"): "[0.1]"}
+
+    def test_counters(self, dedup, monkeypatch):
+        monkeypatch.setattr(dedup, "reusable_embeddings", lambda db, org, model, hashes: {content_hash("second"): "[0.1]"})
+        chunks = [make_chunk("a", 0, "first"), make_chunk("b", 1, "second"), make_chunk("c", 2, "third")]
+        dedup.plan(None, "org", "model", chunks, existing={"a": 0})
+        stats = dedup.get_stats()
+        assert (stats["unchanged"], stats["reused"], stats["embedded"]) == (1, 1, 1)
+
+
+class TestFilterBoilerplate:
+    """Dropping blocks repeated across a tenant's scraped pages"""
+
+    def test_boilerplate_blocks_are_dropped(self, dedup, monkeypatch):
+        nav = Block("paragraph", "Home | Products | Contact us")
+        body = Block("paragraph", "The actual content of this page")
+        monkeypatch.setattr(dedup, "_update_chunk_store", lambda org, source, hashes: {content_hash(nav.text)})
+        assert dedup.filter_boilerplate([nav, body], "org", "page") == [body]
+        assert dedup.get_stats()["boilerplate_blocks_dropped"] == 1
+
+    def test_headings_and_short_blocks_are_never_recorded(self, dedup, monkeypatch):
+        recorded = []
+        monkeypatch.setattr(dedup, "_update_chunk_store", lambda org, source, hashes: recorded.extend(hashes) or set())
+        blocks = [Block("heading", "A long enough heading", 1), Block("paragraph", "short"), Block("paragraph", "long enough paragraph")]
+        assert dedup.filter_boilerplate(blocks, "org", "page") == blocks
+        assert recorded == [content_hash("long enough paragraph")]
+
+    def test_page_without_blocks_still_clears_its_record(self, dedup, monkeypatch):
+        calls = []
+        monkeypatch.setattr(dedup, "_update_chunk_store", lambda org, source, hashes: calls.append((org, source, hashes)) or set())
+        dedup.filter_boilerplate([], "org", "page")
+        assert calls == [("org", "page", [])]
@@ -0,0 +1,114 @@
+"""
+Unit tests for structure-aware chunking, streaming and chunk id stability
+"""
+
+import json
+
+import pytest
+
+from chunking import Block, StructuredChunker, blocks_from_text
+
+
+def make_document(sections=6, paragraphs=4):
+    blocks = []
+    for section in range(sections):
+        blocks.append(Block("heading", f"Section {section}", 1))
+        for paragraph in range(paragraphs):
+            blocks.append(Block("paragraph", f"Paragraph {paragraph} of section {section}. " * 6))
+    return blocks
+
+
+@pytest.fixture
+def chunker():
+    # No tokenizer: tokens are estimated from length, so tests never download anything
+    return StructuredChunker(max_tokens=120, min_tokens=30)
+
+
+def summary(chunks):
+    return [(chunk.id, chunk.index, chunk.text, chunk.heading) for chunk in chunks]
+
+
+class TestPacking:
+    """Chunks respect the budget and keep their section"""
+
+    def test_chunks_fit_the_budget(self, chunker):
+        chunks = chunker.chunk(make_document(), "doc")
+        assert chunks
+        assert all(chunk.token_count <= chunker.max_tokens for chunk in chunks)
+        assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+
+    def test_oversized_paragraph_is_split(self, chunker):
+        chunks = chunker.chunk([Block("paragraph", "A short sentence here. " * 100)], "doc")
+        assert len(chunks) > 1
+        assert all(chunk.token_count <= chunker.max_tokens for chunk in chunks)
+
+    def test_chunk_starting_mid_section_carries_heading(self, chunker):
+        chunks = chunker.chunk(make_document(sections=1, paragraphs=8), "doc")
+        assert len(chunks) > 1
+        assert all(chunk.heading == "Section 0" for chunk in chunks)
+        assert all(chunk.text.startswith("Section 0") for chunk in chunks)
+
+    def test_blocks_from_text_detects_markdown_headings(self):
+        blocks = blocks_from_text("# Title\n\nSome text.\n\n## Part\n\n- one\n- two")
+        assert [(block.kind, block.level) for block in blocks][:2] == [("heading", 1), ("paragraph", 0)]
+
+
+class TestStreaming:
+    """Feeding a document in pieces, or resuming from saved state, gives the same chunks"""
+
+    @pytest.mark.parametrize("piece_size", [1, 3, 7])
+    def test_feeding_in_pieces_matches_one_pass(self, chunker, piece_size):
+        blocks = make_document()
+        stream = chunker.stream("doc")
+        chunks = []
+        for start in range(0, len(blocks), piece_size):
+            chunks.extend(stream.feed(blocks[start:start + piece_size]))
+        chunks.extend(stream.finish())
+        assert summary(chunks) == summary(chunker.chunk(blocks, "doc"))
+
+    def test_restore_resumes_where_the_stream_stopped(self, chunker):
+        blocks = make_document()
+        middle = len(blocks) // 2
+
+        first = chunker.stream("doc")
+        emitted = first.feed(blocks[:middle])
+        state = json.loads(json.dumps(first.get_state()))
+
+        resumed = chunker.stream("doc")
+        resumed.restore(state, [chunk.content_hash for chunk in emitted])
+        rest = resumed.feed(blocks[middle:]) + resumed.finish()
+
+        assert summary(emitted + rest) == summary(chunker.chunk(blocks, "doc"))
+
+    def test_restore_keeps_repeat_ids_unique(self, chunker):
+        blocks = [Block("paragraph", "Repeated footer text. " * 18)] * 4
+        first = chunker.stream("doc")
+        emitted = first.feed(blocks[:2])
+        resumed = chunker.stream("doc")
+        resumed.restore(first.get_state(), [chunk.content_hash for chunk in emitted])
+        rest = resumed.feed(blocks[2:]) + resumed.finish()
+        ids = [chunk.id for chunk in emitted + rest]
+        assert len(ids) == len(set(ids))
+
+
+class TestChunkIds:
+    """Ids depend on the source and the text, not on the chunk's position"""
+
+    def test_ids_are_deterministic(self, chunker):
+        assert summary(chunker.chunk(make_document(), "doc")) == summary(chunker.chunk(make_document(), "doc"))
+
+    def test_ids_are_scoped_to_the_source(self, chunker):
+        first = chunker.chunk(make_document(), "doc-1")
+        second = chunker.chunk(make_document(), "doc-2")
+        assert {chunk.id for chunk in first}.isdisjoint(chunk.id for chunk in second)
+
+    def test_unchanged_sections_keep_their_ids_after_an_insert(self, chunker):
+        original = chunker.chunk(make_document(), "doc")
+        edited_blocks = [Block("heading", "Preface", 1), Block("paragraph", "A new introduction. " * 10)] + make_document()
+        edited = chunker.chunk(edited_blocks, "doc")
+        assert {chunk.id for chunk in original} <= {chunk.id for chunk in edited}
+
+    def test_repeated_text_gets_distinct_ids(self, chunker):
+        chunks = chunker.chunk([Block("paragraph", "Repeated footer text. " * 18)] * 3, "doc")
+        assert len({chunk.content_hash for chunk in chunks}) == 1
+        assert len({chunk.id for chunk in chunks}) == len(chunks)
@@ -0,0 +1,89 @@
+"""
+Unit tests for the keyword and pattern matchers used by the intent classifier
+"""
+
+import re
+
+import pytest
+
+from classifiers import IntentClassifier, KeywordMatcher, PatternMatcher
+
+QUERIES = [
+    "",
+    "how do i create a job template",
+    "I'm getting an error when I try to save",
+    "the export is not working and keeps crashing",
+    "can you add dark mode? it would be great",
+    "would like to request a new feature: bulk edit",
+    "what is the status of my order",
+    "tell me about the pricing plans",
+    "stack trace attached:\nexception in thread main",
+    "steps to create and clone a job",
+    "showcase unknown newline\nhelp with setup",
+    "nothing relevant here",
+    "hohow tototutorial",
+]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return IntentClassifier()
+
+
+def naive_keywords(table, text):
+    hits = {}
+    for category, keywords in table.items():
+        matched = [keyword for keyword in keywords if keyword.lower() in text]
+        if matched:
+            hits[category] = matched
+    return hits
+
+
+def naive_patterns(table, text):
+    hits = {}
+    for category, patterns in table.items():
+        matched = [pattern for pattern in patterns if re.search(pattern, text)]
+        if matched:
+            hits[category] = matched
+    return hits
+
+
+class TestKeywordMatcher:
+    """Same hits as ``keyword in text``"""
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_intent_keywords_match_substring_checks(self, classifier, query):
+        table = {intent: data["keywords"] for intent, data in classifier.intent_patterns.items()}
+        text = query.lower()
+        assert classifier.keyword_matcher.match_categories(text) == naive_keywords(table, text)
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_context_indicators_match_substring_checks(self, classifier, query):
+        text = query.lower()
+        assert classifier.context_matcher.match_categories(text) == naive_keywords(classifier.context_indicators, text)
+
+    def test_overlapping_and_nested_keywords(self):
+        table = {"a": ["he", "she", "hers"], "b": ["his", "he"]}
+        matcher = KeywordMatcher(table)
+        for text in ["ushers", "this", "shhe", "hershe", "h"]:
+            assert matcher.match_categories(text) == naive_keywords(table, text)
+
+    def test_empty_keywords_are_ignored(self):
+        assert KeywordMatcher({"a": [""]}).match_categories("anything") == {}
+
+
+class TestPatternMatcher:
+    """Same hits as ``re.search`` per pattern"""
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_intent_patterns_match_individual_searches(self, classifier, query):
+        table = {intent: data["patterns"] for intent, data in classifier.intent_patterns.items()}
+        text = query.lower()
+        assert classifier.pattern_matcher.match_categories(text) == naive_patterns(table, text)
+
+    def test_pattern_after_a_newline_is_found(self):
+        matcher = PatternMatcher({"a": [r"help.*with.*"]})
+        assert matcher.match_categories("first line\nhelp with this") == {"a": [r"help.*with.*"]}
+
+    def test_no_patterns(self):
+        assert PatternMatcher({}).match_categories("anything") == {}
@@ -0,0 +1,122 @@
+"""
+Unit tests for the embedding migrator's row predicates
+"""
+
+import sqlite3
+
+import pytest
+
+from embedding_migrator import (
+    LOCAL_EMBEDDING_MODEL,
+    MISSING_VECTOR_SQL,
+    STALE_VECTOR_SQL,
+    model_vector_id,
+)
+
+ORG = "org-1"
+OLD = "nomic-embed-text"
+NEW = "mxbai-embed-large"
+
+
+@pytest.fixture
+def db():
+    """In-memory embeddings table holding the columns the predicates read"""
+    connection = sqlite3.connect(":memory:")
+    connection.execute("""
+        CREATE TABLE embeddings (
+            id TEXT PRIMARY KEY, organization_id TEXT, source_type TEXT, source_id TEXT,
+            chunk_index INTEGER, content_text TEXT, content_hash TEXT, embedding_model TEXT
+        )
+    """)
+    yield connection
+    connection.close()
+
+
+def add(db, row_id, model, source_id="doc-1", chunk_index=0, content_hash="h0",
+        source_type="chunk", content_text="text", organization_id=ORG):
+    db.execute(
+        "INSERT INTO embeddings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (row_id, organization_id, source_type, source_id, chunk_index, content_text, content_hash, model)
+    )
+
+
+def missing(db, model):
+    rows = db.execute(
+        f"SELECT e.id FROM embeddings e WHERE {MISSING_VECTOR_SQL} ORDER BY e.id",
+        {"organization_id": ORG, "model": model}
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def stale(db, model):
+    rows = db.execute(
+        f"SELECT e.id FROM embeddings e WHERE {STALE_VECTOR_SQL} ORDER BY e.id",
+        {"organization_id": ORG, "model": model}
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+class TestMissingVectors:
+    """Chunk positions the migrator still has to embed"""
+
+    def test_position_without_target_vector_is_missing(self, db):
+        add(db, "a", OLD)
+        assert missing(db, NEW) == ["a"]
+
+    def test_position_with_target_vector_is_not_missing(self, db):
+        add(db, "a", OLD)
+        add(db, "b", NEW)
+        assert missing(db, NEW) == []
+
+    def test_changed_text_is_missing_again(self, db):
+        add(db, "a", OLD, content_hash="h1")
+        add(db, "b", NEW, content_hash="h0")
+        assert missing(db, NEW) == ["a"]
+
+    def test_image_descriptions_keep_their_model(self, db):
+        add(db, "img", LOCAL_EMBEDDING_MODEL, source_type="image_description")
+        assert missing(db, OLD) == []
+        assert missing(db, NEW) == []
+
+    def test_chat_messages_are_not_migrated(self, db):
+        add(db, "chat", LOCAL_EMBEDDING_MODEL, source_id=None, chunk_index=None, source_type=None)
+        assert missing(db, OLD) == []
+
+    def test_other_tenants_are_ignored(self, db):
+        add(db, "a", OLD, organization_id="org-2")
+        assert missing(db, NEW) == []
+
+
+class TestStaleVectors:
+    """Rows the migrator deletes once the tenant has switched"""
+
+    def test_superseded_row_is_stale(self, db):
+        add(db, "a", OLD)
+        add(db, "b", NEW)
+        assert stale(db, NEW) == ["a"]
+
+    def test_row_without_replacement_is_kept(self, db):
+        add(db, "a", OLD)
+        add(db, "b", NEW, chunk_index=1)
+        assert stale(db, NEW) == []
+
+    def test_row_with_different_text_is_kept(self, db):
+        add(db, "a", OLD, content_hash="h1")
+        add(db, "b", NEW, content_hash="h0")
+        assert stale(db, NEW) == []
+
+    def test_image_descriptions_are_never_pruned(self, db):
+        add(db, "img", LOCAL_EMBEDDING_MODEL, source_id="img-1", source_type="image_description")
+        add(db, "img-new", NEW, source_id="img-1", source_type="image_description")
+        assert stale(db, NEW) == []
+
+    def test_predicates_do_not_overlap(self, db):
+        add(db, "a", OLD)
+        add(db, "b", OLD, chunk_index=1)
+        add(db, "c", NEW, chunk_index=1)
+        assert set(missing(db, NEW)).isdisjoint(stale(db, NEW))
+
+
+def test_model_vector_id_is_stable_per_model():
+    assert model_vector_id("doc-1", 0, OLD) == model_vector_id("doc-1", 0, OLD)
+    assert model_vector_id("doc-1", 0, OLD) != model_vector_id("doc-1", 0, NEW)
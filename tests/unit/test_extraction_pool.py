@@ -0,0 +1,56 @@
+"""
+Unit tests for extraction pool isolation between concurrent files
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from extraction_pool import ExtractionError, ExtractionPool
+
+
+def _sleep_and_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(max_workers=2, timeout_seconds=3.0, memory_limit_mb=0)
+    yield pool
+    pool.shutdown()
+
+
+def test_timeout_only_kills_the_runaway_file(pool):
+    async def run():
+        # Warm both workers so spawn start-up doesn't count against the timeout
+        await asyncio.gather(pool._run("a", _sleep_and_return, 0, 1), pool._run("b", _sleep_and_return, 0, 2))
+        pool.timeout_seconds = 1.0
+
+        async def neighbour():
+            # Still parsing when the runaway file is killed
+            await asyncio.sleep(0.6)
+            return await pool._run("neighbour.pdf", _sleep_and_return, 0.8, "done")
+
+        runaway = pool._run("runaway.pdf", _sleep_and_return, 30, None)
+        return await asyncio.gather(runaway, neighbour(), return_exceptions=True)
+
+    pool.timeout_seconds = 30.0
+    runaway, neighbour = asyncio.run(run())
+    assert isinstance(runaway, ExtractionError)
+    assert neighbour == "done"
+    assert (pool.timeout_count, pool.crash_count) == (1, 0)
+
+
+def test_slot_is_reusable_after_a_timeout(pool):
+    async def run():
+        pool.timeout_seconds = 0.5
+        with pytest.raises(ExtractionError):
+            await pool._run("runaway.pdf", _sleep_and_return, 30, None)
+        pool.timeout_seconds = 30.0
+        return await asyncio.gather(*(pool._run(f"{i}.pdf", _sleep_and_return, 0, i) for i in range(4)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3]
+    assert pool.timeout_count == 1
+    assert pool.crash_count == 0
@@ -0,0 +1,115 @@
+"""
+Unit tests for the LLM generation scheduler's fair queue and load shedding
+"""
+
+import asyncio
+
+import pytest
+
+from generation_scheduler import GenerationRejected, GenerationScheduler
+
+
+def make_scheduler(weights=None, **kwargs):
+    scheduler = GenerationScheduler(**kwargs)
+    scheduler._fetch_weights = lambda: dict(weights or {})
+    return scheduler
+
+
+async def grant_order(scheduler, requests):
+    """Queue ``requests`` (organization ids) behind a held slot and return the order they are granted in"""
+    order = []
+    await scheduler.acquire("holder")
+    await scheduler._weights_task  # Weights are loaded before anyone queues
+
+    async def waiter(organization_id):
+        await scheduler.acquire(organization_id, max_wait=60)
+        order.append(organization_id)
+        await asyncio.sleep(0)
+        scheduler.release(organization_id, 0.1)
+
+    tasks = []
+    for organization_id in requests:
+        tasks.append(asyncio.create_task(waiter(organization_id)))
+        await asyncio.sleep(0)
+    scheduler.release("holder", 0.1)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestFairQueue:
+    """Slots are granted in virtual finish tag order"""
+
+    def test_free_slot_is_granted_immediately(self):
+        async def run():
+            scheduler = make_scheduler(max_concurrent=1)
+            assert await scheduler.acquire("org-a") == 0.0
+            assert scheduler.get_stats()["in_flight"] == 1
+        asyncio.run(run())
+
+    def test_backlogged_tenant_does_not_starve_others(self):
+        order = asyncio.run(grant_order(
+            make_scheduler(max_concurrent=1, max_wait_seconds=60),
+            ["a", "a", "a", "b"]
+        ))
+        assert order.index("b") <= 1
+
+    def test_equal_weights_alternate(self):
+        order = asyncio.run(grant_order(
+            make_scheduler(max_concurrent=1, max_wait_seconds=60),
+            ["a", "a", "b", "b"]
+        ))
+        assert order == ["a", "b", "a", "b"]
+
+    def test_heavier_tenant_gets_larger_share(self):
+        order = asyncio.run(grant_order(
+            make_scheduler({"a": 2.0}, max_concurrent=1, max_wait_seconds=60),
+            ["a", "a", "a", "a", "b", "b"]
+        ))
+        assert order == ["a", "a", "b", "a", "a", "b"]
+
+
+class TestShedding:
+    """Requests whose wait would exceed their deadline are rejected"""
+
+    def test_rejects_when_estimated_wait_exceeds_deadline(self):
+        async def run():
+            scheduler = make_scheduler(max_concurrent=1)
+            await scheduler.acquire("org-a")
+            with pytest.raises(GenerationRejected):
+                await scheduler.acquire("org-b", max_wait=0.5)
+            assert scheduler.get_stats()["shed_count"] == 1
+            assert scheduler.queue_depth == 0
+        asyncio.run(run())
+
+    def test_rejects_when_actual_wait_exceeds_deadline(self):
+        async def run():
+            scheduler = make_scheduler(max_concurrent=1)
+            scheduler._avg_generation_seconds = 0.01
+            await scheduler.acquire("org-a")
+            with pytest.raises(GenerationRejected):
+                await scheduler.acquire("org-b", max_wait=0.05)
+            assert scheduler.get_stats()["timeout_count"] == 1
+            assert scheduler.queue_depth == 0
+        asyncio.run(run())
+
+    def test_slot_is_released_after_block(self):
+        async def run():
+            scheduler = make_scheduler(max_concurrent=1)
+            async with scheduler.slot("org-a"):
+                assert scheduler.get_stats()["in_flight"] == 1
+            assert scheduler.get_stats()["in_flight"] == 0
+            assert scheduler.get_stats()["completed_count"] == 1
+        asyncio.run(run())
+
+    def test_weights_fall_back_when_loading_fails(self):
+        async def run():
+            scheduler = GenerationScheduler(max_concurrent=1)
+
+            def fail():
+                raise RuntimeError("database unavailable")
+
+            scheduler._fetch_weights = fail
+            await scheduler.acquire("org-a")
+            await asyncio.sleep(0.01)
+            assert scheduler.weights == {}
+        asyncio.run(run())
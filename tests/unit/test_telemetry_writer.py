@@ -0,0 +1,88 @@
+"""
+Unit tests for the telemetry writer's batch insert and domain cache
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from telemetry_writer import TelemetryWriter
+
+
+@pytest.fixture
+def db():
+    """In-memory sqlite session with a rag_executions table that rejects NULL queries"""
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE rag_executions (
+                id TEXT PRIMARY KEY, query TEXT NOT NULL, domain_id TEXT, mode TEXT, intent TEXT,
+                confidence REAL, response_type TEXT, source_count INTEGER, processing_time_ms INTEGER,
+                user_id TEXT, session_id TEXT, organization_id TEXT, created_at TEXT
+            )
+        """))
+        connection.execute(text("""
+            CREATE TABLE organization_domains (
+                id TEXT PRIMARY KEY, organization_id TEXT, domain_name TEXT, is_active BOOLEAN
+            )
+        """))
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def written_ids(db):
+    return [row[0] for row in db.execute(text("SELECT id FROM rag_executions ORDER BY id")).fetchall()]
+
+
+def make_row(row_id, query="question"):
+    return {"id": row_id, "query": query, "domain_id": "d1", "organization_id": "org"}
+
+
+class TestInsertRows:
+    """A bad row only costs itself, not its batch"""
+
+    def test_valid_batch_is_one_statement(self, db):
+        writer = TelemetryWriter()
+        writer._insert_rows(db, "rag_executions", [make_row("a"), make_row("b")])
+        assert written_ids(db) == ["a", "b"]
+        assert writer.batch_count == 1
+
+    def test_bad_row_is_isolated(self, db):
+        writer = TelemetryWriter()
+        rows = [make_row("a"), make_row("b"), make_row("c", query=None), make_row("d"), make_row("e")]
+        writer._insert_rows(db, "rag_executions", rows)
+        assert written_ids(db) == ["a", "b", "d", "e"]
+        assert writer.failed_count == {"rag_executions": 1}
+        assert writer.written_count == {"rag_executions": 4}
+
+
+class TestResolveDomainId:
+    """Domain ids come from active domains and are cached for a limited time"""
+
+    def add_domain(self, db, domain_id, is_active=True):
+        db.execute(
+            text("INSERT INTO organization_domains VALUES (:id, 'org', 'support', :is_active)"),
+            {"id": domain_id, "is_active": is_active}
+        )
+        db.commit()
+
+    def test_inactive_domain_is_not_resolved(self, db):
+        self.add_domain(db, "d1", is_active=False)
+        assert TelemetryWriter()._resolve_domain_id(db, "org", "support") is None
+
+    def test_cached_id_expires(self, db):
+        self.add_domain(db, "d1")
+        writer = TelemetryWriter(domain_cache_ttl=0)
+        assert writer._resolve_domain_id(db, "org", "support") == "d1"
+        db.execute(text("DELETE FROM organization_domains"))
+        self.add_domain(db, "d2")
+        assert writer._resolve_domain_id(db, "org", "support") == "d2"
+
+    def test_cached_id_is_reused_within_ttl(self, db):
+        self.add_domain(db, "d1")
+        writer = TelemetryWriter(domain_cache_ttl=300)
+        assert writer._resolve_domain_id(db, "org", "support") == "d1"
+        db.execute(text("DELETE FROM organization_domains"))
+        db.commit()
+        assert writer._resolve_domain_id(db, "org", "support") == "d1"